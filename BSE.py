@@ -48,6 +48,11 @@
 import sys
 import math
 import random
+import os
+
+# the schedule of pending customer orders is shared with the dark pool
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dark_pool'))
+from pending_orders import Pending_Orders
 
 
 bse_sys_minprice = 1  # minimum price in the system, in cents/pennies
@@ -1069,7 +1074,7 @@ def customer_orders(time, last_update, traders, trader_stats, os, pending, verbo
         # if there are no pending orders
         if len(pending) < 1:
                 # list of pending (to-be-issued) customer orders is empty, so generate a new one
-                new_pending = []
+                new_pending = Pending_Orders()
 
                 # add the demand side (buyers) customer orders to the list of pending orders
                 issuetimes = getissuetimes(n_buyers, os['timemode'], os['interval'], shuffle_times, True)
@@ -1080,7 +1085,7 @@ def customer_orders(time, last_update, traders, trader_stats, os, pending, verbo
                         tname = 'B%02d' % t
                         orderprice = getorderprice(t, sched, n_buyers, mode, issuetime)
                         order = Order(tname, ordertype, orderprice, 1, issuetime, -3.14)
-                        new_pending.append(order)
+                        new_pending.push(order)
                         
                 # add the supply side (sellers) customer orders to the list of pending orders
                 issuetimes = getissuetimes(n_sellers, os['timemode'], os['interval'], shuffle_times, True)
@@ -1091,27 +1096,23 @@ def customer_orders(time, last_update, traders, trader_stats, os, pending, verbo
                         tname = 'S%02d' % t
                         orderprice = getorderprice(t, sched, n_sellers, mode, issuetime)
                         order = Order(tname, ordertype, orderprice, 1, issuetime, -3.14)
-                        new_pending.append(order)
+                        new_pending.push(order)
         # if there are some pending orders
         else:
                 # there are pending future orders: issue any whose timestamp is in the past
-                new_pending = []
-                for order in pending:
-                        if order.time < time:
-                                # this order should have been issued by now
-                                # issue it to the trader
-                                tname = order.tid
-                                response = traders[tname].add_order(order, verbose)
-                                if verbose: print('Customer order: %s %s' % (response, order) )
-                                # if issuing the order causes the trader to cancel their current order then add
-                                # the traders name to the cancellations list
-                                if response == 'LOB_Cancel' :
-                                    cancellations.append(tname)
-                                    if verbose: print('Cancellations: %s' % (cancellations))
-                                # and then don't add it to new_pending (i.e., delete it)
-                        else:
-                                # this order stays on the pending list
-                                new_pending.append(order)
+                # only the orders now due are taken off the schedule
+                new_pending = pending
+                for order in pending.pop_due(time):
+                        # this order should have been issued by now
+                        # issue it to the trader
+                        tname = order.tid
+                        response = traders[tname].add_order(order, verbose)
+                        if verbose: print('Customer order: %s %s' % (response, order) )
+                        # if issuing the order causes the trader to cancel their current order then add
+                        # the traders name to the cancellations list
+                        if response == 'LOB_Cancel' :
+                            cancellations.append(tname)
+                            if verbose: print('Cancellations: %s' % (cancellations))
         return [new_pending, cancellations]
 
 
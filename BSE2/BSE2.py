@@ -48,12 +48,17 @@
 import sys
 import math
 import random
+import os
 import csv
 from datetime import datetime
 
 from BSE2_msg_classes import Assignment, Order, Exch_msg
 from BSE_trader_agents import Trader_ISHV
 
+# the schedule of pending customer orders is shared with the dark pool
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'dark_pool'))
+from pending_orders import Pending_Orders
+
 # from BSE2_unittests import test_all
 # from BSE2_dev import proc_OXO proc_ICE
 
@@ -1391,7 +1396,7 @@ def customer_orders(time, last_update, traders, trader_stats, os, pending, base_
 
         if len(pending) < 1:
                 # list of pending (to-be-issued) customer orders is empty, so generate a new one
-                new_pending = []
+                new_pending = Pending_Orders()
 
                 # demand side (buyers)
                 issuetimes = getissuetimes(n_buyers, os['timemode'], os['interval'], shuffle_times, True)
@@ -1406,7 +1411,7 @@ def customer_orders(time, last_update, traders, trader_stats, os, pending, base_
                         # order = Order(tname, ordertype, orderstyle, orderprice, orderqty, issuetime, None, oid)
                         order = Assignment("CUS", tname, ordertype, orderstyle, orderprice, orderqty, issuetime, None, oid)
                         oid += 1
-                        new_pending.append(order)
+                        new_pending.push(order)
                         
                 # supply side (sellers)
                 issuetimes = getissuetimes(n_sellers, os['timemode'], os['interval'], shuffle_times, True)
@@ -1421,24 +1426,20 @@ def customer_orders(time, last_update, traders, trader_stats, os, pending, base_
                         # order = Order(tname, ordertype, orderstyle, orderprice, orderqty, issuetime, None, oid)
                         order = Assignment("CUS", tname, ordertype, orderstyle, orderprice, orderqty, issuetime, None, oid)
                         oid += 1
-                        new_pending.append(order)
+                        new_pending.push(order)
         else:
                 # there are pending future orders: issue any whose timestamp is in the past
-                new_pending = []
-                for order in pending:
-                        if order.time < time:
-                                # this order should have been issued by now
-                                # issue it to the trader
-                                tname = order.trad_id
-                                response = traders[tname].add_cust_order(order, verbose)
-                                if verbose: print('Customer order: %s %s' % (response, order))
-                                if response == 'LOB_Cancel' :
-                                    cancellations.append(tname)
-                                    if verbose: print('Cancellations: %s' % (cancellations))
-                                # and then don't add it to new_pending (i.e., delete it)
-                        else:
-                                # this order stays on the pending list
-                                new_pending.append(order)
+                # only the orders now due are taken off the schedule
+                new_pending = pending
+                for order in pending.pop_due(time):
+                        # this order should have been issued by now
+                        # issue it to the trader
+                        tname = order.trad_id
+                        response = traders[tname].add_cust_order(order, verbose)
+                        if verbose: print('Customer order: %s %s' % (response, order))
+                        if response == 'LOB_Cancel' :
+                            cancellations.append(tname)
+                            if verbose: print('Cancellations: %s' % (cancellations))
         return [new_pending, cancellations, oid]
 
 
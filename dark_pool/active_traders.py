@@ -0,0 +1,32 @@
+# Active_Traders is the set of traders that may have work to do, such as a customer order to work. It is kept as a list
+# together with a dictionary giving the position of each trader in it, so that traders can be added and removed, and
+# one chosen at random, in constant time
+class Active_Traders:
+
+    def __init__(self):
+        self.trader_ids = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.trader_ids)
+
+    def __contains__(self, trader_id):
+        return trader_id in self.positions
+
+    # add a trader to the set, if it isn't already in it
+    def add(self, trader_id):
+        if trader_id not in self.positions:
+            self.positions[trader_id] = len(self.trader_ids)
+            self.trader_ids.append(trader_id)
+
+    # remove a trader from the set. The last trader in the list is moved into its place
+    def remove(self, trader_id):
+        position = self.positions.pop(trader_id)
+        last = self.trader_ids.pop()
+        if last != trader_id:
+            self.trader_ids[position] = last
+            self.positions[last] = position
+
+    # choose a trader uniformly at random, using the given random number generator
+    def choose(self, rng):
+        return self.trader_ids[rng.randint(0, len(self.trader_ids) - 1)]
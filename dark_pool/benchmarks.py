@@ -0,0 +1,103 @@
+from orders import *
+from orderbook_half import *
+from orderbook import *
+
+import random
+import time
+
+# Benchmarks for the dark pool data structures. Each benchmark prints the size of the problem and the average time
+# taken per operation so that the different engines can be compared. Run with: python benchmarks.py
+
+
+# time a function call and return the number of seconds it took
+def timed(function, *args):
+    start = time.time()
+    function(*args)
+    return time.time() - start
+
+
+# fill one side of the book with n resting orders. The orders are created in priority order (largest first, then
+# earliest first) so that filling the book is cheap and the time is spent in the operations being measured
+def populate_book_half(book_half, n, rng):
+    book = book_half('Sell')
+    quantity = n
+    for i in range(0, n):
+        # give roughly every tenth order the same quantity as the previous one so that there are ties on size
+        if rng.random() < 0.9:
+            quantity -= 1
+        book.book_add(Order(float(i), 'S%07d' % i, 'Sell', quantity + n, 50, None))
+    return book
+
+
+# a cancel-heavy flow: each operation cancels a random resting order and, half of the time, the same trader
+# immediately sends a replacement order (an overwrite)
+def cancel_flow(book, n, n_operations, rng):
+    for i in range(0, n_operations):
+        tid = 'S%07d' % rng.randint(0, n - 1)
+        if rng.random() < 0.5:
+            book.book_del(tid)
+        else:
+            book.book_add(Order(float(n + i), tid, 'Sell', rng.randint(n, 2 * n), 50, None))
+
+
+# benchmark cancels and overwrites on a book of n resting orders
+def benchmark_cancels(book_half, n, n_operations):
+    rng = random.Random(0)
+    book = populate_book_half(book_half, n, rng)
+    seconds = timed(cancel_flow, book, n, n_operations, rng)
+    print('%-22s n=%8d  %6d cancels/overwrites  %10.2f us/op' % (book_half.__name__, n, n_operations,
+        1000000.0 * seconds / n_operations))
+
+
+# fill an order book with n buy orders and n sell orders. Most pairs are blocked by the MES of the orders, so that
+# an uncross has to check many pairs of orders before each trade. Only the given fraction of the orders have a
+# limit price which lets them trade at a price of 50
+def populate_order_book(orderbook, n, eligible_fraction, rng):
+    for i in range(0, n):
+        quantity = rng.randint(1, 1000)
+        if rng.random() < eligible_fraction:
+            limit_price = 50
+        else:
+            limit_price = 49
+        orderbook.add_order(Order(float(i), 'B%07d' % i, 'Buy', quantity, limit_price, rng.randint(1, quantity)), False)
+        quantity = rng.randint(1, 1000)
+        if rng.random() < eligible_fraction:
+            limit_price = 50
+        else:
+            limit_price = 51
+        orderbook.add_order(Order(float(i), 'S%07d' % i, 'Sell', quantity, limit_price, rng.randint(1, quantity)), False)
+
+
+# benchmark a single uncross of an order book with n orders on each side using the given matching engine
+def benchmark_uncross(book_half, matching_engine, n, eligible_fraction):
+    rng = random.Random(0)
+    orderbook = Orderbook(book_half)
+    orderbook.matching_engine = matching_engine
+    populate_order_book(orderbook, n, eligible_fraction, rng)
+    start = time.time()
+    trades = orderbook.execute_trades(0.0, 50)
+    seconds = time.time() - start
+    print('%-12s n=%8d  eligible=%3d%%  %6d trades  %10.3f s/uncross' % (matching_engine, n, 100 * eligible_fraction,
+        len(trades), seconds))
+
+
+# run all of the benchmarks
+def run_benchmarks():
+    print('Cancel-heavy flows:')
+    for n in [10000, 100000, 1000000]:
+        benchmark_cancels(Orderbook_half, n, 10000)
+        benchmark_cancels(Orderbook_half_bisect, n, 10000)
+    print('')
+    print('Uncross:')
+    for n in [200, 500]:
+        for eligible_fraction in [1.0, 0.1]:
+            benchmark_uncross(Orderbook_half_bisect, 'reference', n, eligible_fraction)
+            benchmark_uncross(Orderbook_half_bisect, 'incremental', n, eligible_fraction)
+    # a large book with few orders that can trade, where the incremental engine checks every pair of those orders
+    # rather than building its indexes
+    benchmark_uncross(Orderbook_half_bisect, 'incremental', 2000, 0.01)
+    print('')
+
+
+if __name__ == "__main__":
+    run_benchmarks()
@@ -1,18 +1,25 @@
 from orders import *
 from orderbook_half import *
+from quantity_index import *
+from column_spill import *
+from event_scores import *
 
 import math
+import struct
+
+# the version of the binary composite reputational scores history format written by CRS_history_binary_dump
+CRS_HISTORY_BINARY_VERSION = 1
 
 # Block Indication Book class for a single instrument. The class holds and performs operations with 
 # received block indications
 class Block_Indication_Book:
 
-    # constructer function for the Block_Indication_Book class
-    def __init__(self):
+    # constructer function for the Block_Indication_Book class. book_half is the class used for each side of the book
+    def __init__(self, book_half=Orderbook_half):
         # The buy side contains all of the block indications to buy
-        self.buy_side = Orderbook_half('Buy')
+        self.buy_side = book_half('Buy')
         # The sell side contains all of the block indications to sell
-        self.sell_side = Orderbook_half('Sell')
+        self.sell_side = book_half('Sell')
         # The Minimum Indication Value (MIV) is the quantity that a block indication must be greater
         # than in order to be accepted
         self.MIV = 500
@@ -24,7 +31,8 @@ class Block_Indication_Book:
         self.OSR_id = 0
         # The composite_reputational_scores dictionary contains the composite reputational score for each trader. 
         self.composite_reputational_scores = {}
-        # The event_reputation_scores dictionary contains the last 50 event reputational scores for each trader.
+        # The event_reputation_scores dictionary contains the last 50 event reputational scores for each trader, as
+        # Event_Scores, which also keep the sums needed for the composite reputational score
         self.event_reputational_scores = {}
         # the initial composite reputational score given to each trader
         self.initial_reputational_score = 80
@@ -39,6 +47,20 @@ class Block_Indication_Book:
         self.tape = []
         # The entire history of each trader's score
         self.composite_reputational_scores_history = {}
+        # when the history is being streamed: the output file, the long format output file if there is one, the spill
+        # files holding the scores written out so far, the number of scores the history can hold before they are
+        # written out and the number it holds now
+        self.CRS_history_stream = None
+        self.CRS_history_long_fname = None
+        self.CRS_history_spill = None
+        self.CRS_history_buffer_size = 0
+        self.CRS_history_buffered = 0
+        # whether the history has been streamed, in which case the scores are no longer all held in memory
+        self.CRS_history_streamed = False
+        # the engine used by find_all_matching_block_indications, either 'reference' or 'single_pass'
+        self.matching_engine = 'reference'
+        # the number of index nodes the single pass engine looked at the last time it was run
+        self.index_nodes_examined = 0
 
     
     # Add a block indication to the exchange
@@ -47,8 +69,9 @@ class Block_Indication_Book:
         # if a new trader, then give it an initial reputational score
         if self.composite_reputational_scores.get(BI.trader_id) == None:
             self.composite_reputational_scores[BI.trader_id] = self.initial_reputational_score
-            self.event_reputational_scores[BI.trader_id] = [self.initial_reputational_score for i in range(0,50)]
-            self.composite_reputational_scores_history[BI.trader_id] = [(0, self.initial_reputational_score)]
+            self.event_reputational_scores[BI.trader_id] = Event_Scores([self.initial_reputational_score for i in range(0,50)])
+            self.composite_reputational_scores_history[BI.trader_id] = []
+            self.add_to_CRS_history(BI.trader_id, 0, self.initial_reputational_score)
 
         # the quantity of the order must be greater than the MIV
         # the trader must also have a composite reputational score lower than the RST
@@ -86,6 +109,13 @@ class Block_Indication_Book:
         else:
             return False
 
+    # return the block indication a trader has resting in the book, or None if they don't have one
+    def get_block_indication(self, trader_id):
+        BI = self.buy_side.traders.get(trader_id)
+        if BI == None:
+            BI = self.sell_side.traders.get(trader_id)
+        return BI
+
     # detete all block indications made by a given trader
     def book_del(self, trader_id):
         self.buy_side.book_del(trader_id)
@@ -188,14 +218,88 @@ class Block_Indication_Book:
         # if no match was found then return None
         return None
 
-    # attempt to find two matching block indications
+    # find all matching block indications, using the matching engine selected for this book. The single pass engine
+    # returns the number of pairs of block indications that it examined
     def find_all_matching_block_indications(self, price):
+        if self.matching_engine == 'single_pass':
+            return self.find_all_matching_block_indications_single_pass(price)
+        else:
+            return self.find_all_matching_block_indications_reference(price)
+
+    # attempt to find two matching block indications
+    def find_all_matching_block_indications_reference(self, price):
 
         match_id = self.find_matching_block_indications(price)
 
         while match_id != None:
             match_id = self.find_matching_block_indications(price)
 
+    # find all matching block indications in a single pass over the buy side. Matching a pair only removes those two
+    # block indications, so the buy block indications before a match still cannot match anything and there is no
+    # need to start again from the top. This gives the same matches, in the same order, as the reference engine.
+    # Returns the number of pairs of block indications that were examined. The number of index nodes that were looked
+    # at to find those pairs is kept in index_nodes_examined
+    def find_all_matching_block_indications_single_pass(self, price):
+
+        [pairs, sell_index] = self.pair_block_indications(price)
+        self.index_nodes_examined = sell_index.examined
+
+        for (buy_BI, sell_BI) in pairs:
+
+            # Add the matched BIs to the matches dictionary
+            self.matches[self.match_id] = {
+                "buy_BI": buy_BI,
+                "sell_BI": sell_BI,
+                "buy_QBO": None,
+                "sell_QBO": None
+            }
+
+            # increment the book's match_id counter
+            self.match_id += 1
+
+            # delete these block indications from the block indication book
+            self.del_block_indication(0, buy_BI, False)
+            self.del_block_indication(0, sell_BI, False)
+
+        # return the number of pairs examined
+        return sell_index.compared
+
+    # work out which pairs of block indications would be matched at the given price, in the order they would be
+    # matched, without changing the book. Block indications that can't trade at the price are left out before any
+    # pairs are checked, and the sell side is indexed by size so that a matching sell block indication is found
+    # without checking each one in turn. Returns the list of (buy, sell) pairs and the index of the sell side
+    def pair_block_indications(self, price):
+
+        # get the block indications which can trade at this price
+        buy_BIs = self.buy_side.price_eligible_orders(price)
+        sell_index = Quantity_Index(self.sell_side.price_eligible_orders(price), 'quantity')
+        pairs = []
+
+        # starting with the buy side first
+        for buy_BI in buy_BIs:
+
+            # find the first sell block indication whose size matches the buy block indication
+            sell_BI = sell_index.first(buy_BI.MES, buy_BI.quantity)
+            if sell_BI != None:
+                pairs.append((buy_BI, sell_BI))
+
+                # the sell block indication can't be matched again
+                sell_index.remove(sell_BI)
+
+        return [pairs, sell_index]
+
+    # return the matches that find_all_matching_block_indications would make at the given price, without changing the
+    # book. Each match gives the two block indications and the largest quantity they could trade with each other
+    def probe_block_indication_matches(self, price):
+        matches = []
+        for (buy_BI, sell_BI) in self.pair_block_indications(price)[0]:
+            matches.append({
+                "buy_BI": buy_BI,
+                "sell_BI": sell_BI,
+                "quantity": min(buy_BI.quantity, sell_BI.quantity)
+            })
+        return matches
+
     # return a match given the ID
     def get_block_indication_match(self, match_id):
         return self.matches.get(match_id)
@@ -305,12 +409,12 @@ class Block_Indication_Book:
     def marketable(self, BI, QBO):
         return self.marketable_price(BI, QBO) and self.marketable_size(BI, QBO)
 
-    # calculate the reputational score of a trader for a single event. If the QBO is not marketable, then the
-    # event reputation score is 0. If the QBO is marketable then score will be between 50 and 100
+    # calculate the reputational score of a trader for a single event. If the QBO is not marketable, or there is no
+    # QBO, then the event reputation score is 0. If the QBO is marketable then score will be between 50 and 100
     def calculate_event_reputational_score(self, BI, QBO):
 
-        # Check that the QBO is marketable
-        if self.marketable(BI, QBO):
+        # Check that the QBO is marketable. A trader who did not send a QBO in time has QBO None
+        if QBO != None and self.marketable(BI, QBO):
 
             event_reputational_score = 100
 
@@ -330,11 +434,9 @@ class Block_Indication_Book:
         else:
             event_reputational_score = 0
 
-        # Add this event reputational score to the dictionary containing the last 50 event reputational scores
-        # for each trader
-        self.event_reputational_scores[BI.trader_id].insert(0,event_reputational_score)
-        # make sure that the list only contains the last 50 event reputational scores
-        self.event_reputational_scores[BI.trader_id] = self.event_reputational_scores[BI.trader_id][:50]
+        # Add this event reputational score to the last 50 event reputational scores for the trader. The oldest
+        # score is dropped if there are already 50
+        self.event_reputational_scores[BI.trader_id].add(event_reputational_score)
 
         # return the score
         return event_reputational_score
@@ -344,14 +446,9 @@ class Block_Indication_Book:
     # the next most recent 49, and so on
     def calculate_composite_reputational_score(self, tid):
 
-        # The current weighting
-        weighting = 50
-        # The sum of the event reputational scores multiplied by their weighting
-        total = 0.0
-
-        for i in range(0, 50):
-            total += weighting * self.event_reputational_scores[tid][i]
-            weighting -= 1
+        # The sum of the event reputational scores multiplied by their weighting, which is kept up to date as scores
+        # are added
+        total = float(self.event_reputational_scores[tid].weighted_total)
 
         # Calculate the composite reputational score rounded to the nearest integer
         composite_reputational_score = round(total / 1275.0)
@@ -380,15 +477,52 @@ class Block_Indication_Book:
         self.composite_reputational_scores[sell_BI.trader_id] = seller_composite_reputational_score
 
         # add the scores to the trader history
-        self.composite_reputational_scores_history[buy_BI.trader_id].append((time, buyer_composite_reputational_score))
-        self.composite_reputational_scores_history[sell_BI.trader_id].append((time, seller_composite_reputational_score))
+        self.add_to_CRS_history(buy_BI.trader_id, time, buyer_composite_reputational_score)
+        self.add_to_CRS_history(sell_BI.trader_id, time, seller_composite_reputational_score)
+
+    # add a composite reputational score to a trader's history. If the history is being streamed and is full, then
+    # the scores are written out to the spill files
+    def add_to_CRS_history(self, trader_id, time, score):
+        self.composite_reputational_scores_history[trader_id].append((time, score))
+        if self.CRS_history_stream != None:
+            self.CRS_history_buffered += 1
+            if self.CRS_history_buffered >= self.CRS_history_buffer_size:
+                self.spill_CRS_history()
+
+    # write the scores in the history out to the spill files and empty the history. Only the spill files of traders
+    # with new scores are written to
+    def spill_CRS_history(self):
+        for trader in self.composite_reputational_scores_history.keys():
+            if len(self.composite_reputational_scores_history[trader]) == 0:
+                continue
+            self.CRS_history_spill.append(trader, ['%.2f, %d,' % (time, score) for (time, score) in
+                                                   self.composite_reputational_scores_history[trader]])
+            self.composite_reputational_scores_history[trader] = []
+        self.CRS_history_buffered = 0
 
     # delete a match from the matches dictonary given the match ID
     def delete_match(self, match_id):
         del(self.matches[match_id])
 
+    # write the column names of the composite reputational scores history, given the number of scores for each trader
+    def write_CRS_history_header(self, dumpfile, counts):
+        for trader in sorted(counts.keys()):
+            dumpfile.write('%s: %d scores,,' % (trader, counts[trader]))
+        dumpfile.write('\n')
+        for i in range(0, len(counts)):
+            dumpfile.write('time,score,')
+        dumpfile.write('\n')
+
+    # check that the whole composite reputational scores history is held in memory before it is written out. Once it
+    # has been streamed the scores written to the spill files have been removed from the history, so writing it out
+    # would only give the scores since the last spill
+    def check_CRS_history_in_memory(self):
+        if self.CRS_history_streamed:
+            raise ValueError('the composite reputational scores history has been streamed and is not held in memory')
+
     # write the composite reputational scores history to an output file
     def CRS_history_dump(self, fname, fmode, tmode):
+        self.check_CRS_history_in_memory()
         dumpfile = open(fname, fmode)
 
         # find the length of the longest list of scores
@@ -399,16 +533,15 @@ class Block_Indication_Book:
                 highest_length = this_length
 
         # write the column names
-        for trader in sorted(self.composite_reputational_scores_history.keys()):
-            dumpfile.write('%s: %d scores,,' % (trader, len(self.composite_reputational_scores_history[trader])))
-        dumpfile.write('\n')
-        for i in range(0, len(self.composite_reputational_scores_history)):
-            dumpfile.write('time,score,')
-        dumpfile.write('\n')
+        counts = {}
+        for trader in self.composite_reputational_scores_history.keys():
+            counts[trader] = len(self.composite_reputational_scores_history[trader])
+        self.write_CRS_history_header(dumpfile, counts)
 
         # write each row containing a time and score for each trader
+        traders = sorted(self.composite_reputational_scores_history.keys())
         for i in range(0, highest_length):
-            for trader in sorted(self.composite_reputational_scores_history.keys()):
+            for trader in traders:
                 if i < len(self.composite_reputational_scores_history[trader]):
                     (time, score) = self.composite_reputational_scores_history[trader][i]
                     dumpfile.write('%.2f, %d,' % (time, score))
@@ -422,6 +555,91 @@ class Block_Indication_Book:
         if tmode == 'wipe':
             self.tape = []
 
+    # write the composite reputational scores history to an output file in long format: one line for each score
+    # giving the trader, the time and the score. Traders are in order and each trader's scores are in the order they
+    # were given, so the file only has as many lines as there are scores, with no padding. While the history is being
+    # streamed, the rest of the history is written to the spill files and the lines are read back from them
+    def CRS_history_long_dump(self, fname, fmode, tmode):
+        if self.CRS_history_stream == None:
+            self.check_CRS_history_in_memory()
+        dumpfile = open(fname, fmode)
+
+        # write the column names
+        dumpfile.write('trader, time, score\n')
+
+        # write a line for each score, straight from the history or from the spill files. Each line of a spill file
+        # holds the time and score followed by a comma
+        if self.CRS_history_stream != None:
+            self.spill_CRS_history()
+            for trader in sorted(self.CRS_history_spill.counts.keys()):
+                for value in self.CRS_history_spill.read_column(trader):
+                    dumpfile.write('%s, %s\n' % (trader, value[:-1]))
+        else:
+            for trader in sorted(self.composite_reputational_scores_history.keys()):
+                for (time, score) in self.composite_reputational_scores_history[trader]:
+                    dumpfile.write('%s, %.2f, %d\n' % (trader, time, score))
+
+        dumpfile.close()
+
+        if tmode == 'wipe':
+            self.tape = []
+
+    # write the composite reputational scores history to a compact binary file, which can be read back with
+    # read_CRS_history_binary. All numbers are little-endian. The file starts with 'CRSH', the format version and the
+    # number of traders as unsigned 32-bit integers. Then for each trader, in order, there is the length of their id as
+    # an unsigned 16-bit integer, the id, the number of scores as an unsigned 32-bit integer, the times of the scores
+    # as doubles and the scores as signed 16-bit integers
+    def CRS_history_binary_dump(self, fname, tmode):
+        self.check_CRS_history_in_memory()
+        dumpfile = open(fname, 'wb')
+        traders = sorted(self.composite_reputational_scores_history.keys())
+        dumpfile.write(struct.pack('<4sII', b'CRSH', CRS_HISTORY_BINARY_VERSION, len(traders)))
+        for trader in traders:
+            history = self.composite_reputational_scores_history[trader]
+            trader_id = trader.encode('utf-8')
+            dumpfile.write(struct.pack('<H', len(trader_id)))
+            dumpfile.write(trader_id)
+            dumpfile.write(struct.pack('<I', len(history)))
+            dumpfile.write(struct.pack('<%dd' % len(history), *[time for (time, score) in history]))
+            dumpfile.write(struct.pack('<%dh' % len(history), *[int(score) for (time, score) in history]))
+        dumpfile.close()
+
+        if tmode == 'wipe':
+            self.tape = []
+
+    # start streaming the composite reputational scores history. Each trader's scores are written to their own spill
+    # file whenever the history holds buffer_size scores, and the output file is put together from the spill files
+    # by end_CRS_history_stream. It is the same as the file CRS_history_dump would have written. If long_fname is
+    # given, then the history is also written there in long format, as CRS_history_long_dump would have written it
+    def start_CRS_history_stream(self, fname, fmode, buffer_size, long_fname=None):
+        self.CRS_history_stream = (fname, fmode)
+        self.CRS_history_long_fname = long_fname
+        self.CRS_history_streamed = True
+        self.CRS_history_spill = Column_Spill()
+        self.CRS_history_buffer_size = buffer_size
+        self.CRS_history_buffered = 0
+
+    # write the rest of the history to the spill files and put the output file together one row at a time
+    def end_CRS_history_stream(self):
+        self.spill_CRS_history()
+        (fname, fmode) = self.CRS_history_stream
+        dumpfile = open(fname, fmode)
+        counts = self.CRS_history_spill.counts
+        self.write_CRS_history_header(dumpfile, counts)
+
+        # write each row containing a time and score for each trader
+        self.CRS_history_spill.write_columns(dumpfile, ',,')
+        dumpfile.close()
+
+        # write the long format file
+        if self.CRS_history_long_fname != None:
+            self.CRS_history_long_dump(self.CRS_history_long_fname, fmode, 'keep')
+
+        # delete the spill files
+        self.CRS_history_spill.remove()
+        self.CRS_history_stream = None
+        self.CRS_history_spill = None
+
     # write the composite reputational scores history to an output file
     def ERS_dump(self, fname, fmode, tmode):
         dumpfile = open(fname, fmode)
@@ -491,3 +709,31 @@ class Block_Indication_Book:
             if self.matches[key]["sell_QBO"]:
                 print(self.matches[key]["sell_QBO"])
         print("")
+
+
+# read a composite reputational scores history written by Block_Indication_Book.CRS_history_binary_dump. Returns a
+# dictionary mapping each trader to their list of (time, score) pairs, like composite_reputational_scores_history
+def read_CRS_history_binary(fname):
+    dumpfile = open(fname, 'rb')
+    data = dumpfile.read()
+    dumpfile.close()
+
+    (magic, version, n_traders) = struct.unpack_from('<4sII', data, 0)
+    if magic != b'CRSH' or version != CRS_HISTORY_BINARY_VERSION:
+        raise ValueError('%s is not a composite reputational scores history file' % fname)
+    offset = struct.calcsize('<4sII')
+
+    history = {}
+    for i in range(0, n_traders):
+        (length,) = struct.unpack_from('<H', data, offset)
+        offset += 2
+        trader = data[offset:offset + length].decode('utf-8')
+        offset += length
+        (n_scores,) = struct.unpack_from('<I', data, offset)
+        offset += 4
+        times = struct.unpack_from('<%dd' % n_scores, data, offset)
+        offset += 8 * n_scores
+        scores = struct.unpack_from('<%dh' % n_scores, data, offset)
+        offset += 2 * n_scores
+        history[trader] = list(zip(times, scores))
+    return history
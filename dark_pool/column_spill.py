@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+
+# Column_Spill keeps the columns of a wide output file on disk while a session runs. Each trader's values are appended
+# to their own spill file, one value per line, so that the wide file can be put together row by row at the end
+# without holding every column in memory. At most group_size spill files are open at once: with more traders than
+# that, the columns are put together group_size at a time into new spill files, which are then put together in the
+# same way
+class Column_Spill:
+
+    def __init__(self, group_size=64):
+        # the directory holding the spill files
+        self.directory = tempfile.mkdtemp()
+        # the most spill files open at once when the columns are put together
+        self.group_size = group_size
+        # the number of values written for each trader
+        self.counts = {}
+        # the number given to each trader's spill file, as trader ids are not necessarily safe to use as file names
+        self.file_numbers = {}
+        # the number of spill files made by putting groups of columns together
+        self.n_merged = 0
+
+    # the name of the spill file for a trader
+    def spill_file(self, trader):
+        if self.file_numbers.get(trader) == None:
+            self.file_numbers[trader] = len(self.file_numbers)
+        return os.path.join(self.directory, '%d' % self.file_numbers[trader])
+
+    # append some values to a trader's column. Nothing is written if there are no values
+    def append(self, trader, values):
+        if len(values) == 0:
+            return
+        spill_file = open(self.spill_file(trader), 'a')
+        for value in values:
+            spill_file.write('%s\n' % value)
+        spill_file.close()
+        self.counts[trader] = self.counts.get(trader, 0) + len(values)
+
+    # read back the values appended to a trader's column, in the order they were appended
+    def read_column(self, trader):
+        if self.counts.get(trader, 0) == 0:
+            return
+        column_file = open(self.spill_file(trader), 'r')
+        for line in column_file:
+            yield line[:-1]
+        column_file.close()
+
+    # write the rows of some parts to an output file. Each part is a spill file and the number of columns in it. A
+    # row holds the next line of each part in turn, or blank for each of its columns once a part has run out
+    def write_rows(self, parts, outfile, blank):
+        part_files = [open(fname, 'r') for (fname, width) in parts]
+        while True:
+            lines = [part_file.readline() for part_file in part_files]
+            if lines.count('') == len(lines):
+                break
+            for i in range(0, len(lines)):
+                if lines[i] != '':
+                    outfile.write(lines[i][:-1])
+                else:
+                    outfile.write(blank * parts[i][1])
+            outfile.write('\n')
+        for part_file in part_files:
+            part_file.close()
+
+    # write the wide file's rows to an output file, with each trader's values in order of trader and blank in place
+    # of the values of a trader whose column has run out
+    def write_columns(self, outfile, blank):
+        parts = [(self.spill_file(trader), 1) for trader in sorted(self.counts.keys())]
+
+        # put the columns together a group at a time until there are few enough parts to open at once
+        while len(parts) > self.group_size:
+            merged = []
+            for i in range(0, len(parts), self.group_size):
+                group = parts[i:i + self.group_size]
+                fname = os.path.join(self.directory, 'merged%d' % self.n_merged)
+                self.n_merged += 1
+                merged_file = open(fname, 'w')
+                self.write_rows(group, merged_file, blank)
+                merged_file.close()
+                merged.append((fname, sum([width for (name, width) in group])))
+            parts = merged
+
+        self.write_rows(parts, outfile, blank)
+
+    # delete the spill files
+    def remove(self):
+        shutil.rmtree(self.directory)
@@ -4,11 +4,17 @@ from orderbook import *
 from block_indication_book import *
 from exchange import *;
 from trader import *;
+from uncross_scheduler import *
+from event_queue import *
+from pending_orders import *
+from active_traders import *
 
 import sys
 import math
 import random
 import copy
+import os
+import multiprocessing
 
 bse_sys_minprice = 1  # minimum price in the system, in cents/pennies
 bse_sys_maxprice = 1000  # maximum price in the system, in cents/pennies
@@ -100,6 +106,8 @@ def populate_market(traders_spec, traders, shuffle, verbose):
                         tname = 'B%02d' % n_buyers  # buyer i.d. string
                         traders[tname] = trader_type(ttype, tname)
                         traders[tname].BI_threshold = traders_spec['BI_threshold']
+                        if 'QBO_fraction' in traders_spec:
+                                traders[tname].QBO_fraction = traders_spec['QBO_fraction']
                         n_buyers = n_buyers + 1
 
         if n_buyers < 1:
@@ -115,6 +123,8 @@ def populate_market(traders_spec, traders, shuffle, verbose):
                         tname = 'S%02d' % n_sellers  # buyer i.d. string
                         traders[tname] = trader_type(ttype, tname)
                         traders[tname].BI_threshold = traders_spec['BI_threshold']
+                        if 'QBO_fraction' in traders_spec:
+                                traders[tname].QBO_fraction = traders_spec['QBO_fraction']
                         n_sellers = n_sellers + 1
 
         if n_sellers < 1:
@@ -160,7 +170,11 @@ def populate_market(traders_spec, traders, shuffle, verbose):
 # the interface on this is a bit of a mess... could do with refactoring
 
 # the os dictionary parameter now contains a 'quantity_range' item
-def customer_orders(time, last_update, traders, trader_stats, os, pending, verbose):
+# if os['generator'] is 'numpy', each replenishment cycle is made all at once by schedule_generator.generate_schedule,
+# which needs NumPy, instead of one trader at a time. Its generator is seeded from random, so a session can still be
+# repeated with random.seed, but it draws different numbers, so the orders are not the same as without it
+# if an issued list is given, the trader id of each trader issued a customer order is added to it
+def customer_orders(time, last_update, traders, trader_stats, os, pending, verbose, issued=None):
 
 
         def sysmin_check(price):
@@ -288,10 +302,17 @@ def customer_orders(time, last_update, traders, trader_stats, os, pending, verbo
 
         cancellations = []
 
+        # if there are no pending orders and the whole cycle is to be made at once
+        if len(pending) < 1 and os.get('generator') == 'numpy':
+                import schedule_generator
+                rng = schedule_generator.numpy.random.RandomState(random.getrandbits(32))
+                batch = schedule_generator.generate_schedule(time, n_buyers, n_sellers, os, rng, shuffle_times,
+                                                             bse_sys_minprice, bse_sys_maxprice)
+                new_pending = Pending_Orders(schedule_generator.schedule_customer_orders(batch))
         # if there are no pending orders
-        if len(pending) < 1:
+        elif len(pending) < 1:
                 # list of pending (to-be-issued) customer orders is empty, so generate a new one
-                new_pending = []
+                new_pending = Pending_Orders()
 
                 # add the demand side (buyers) customer orders to the list of pending orders
                 issuetimes = getissuetimes(n_buyers, os['timemode'], os['interval'], shuffle_times, True)
@@ -306,7 +327,7 @@ def customer_orders(time, last_update, traders, trader_stats, os, pending, verbo
                         quantity_max = os['quantity_range'][1]
                         quantity = random.randint(quantity_min,quantity_max)
                         customer_order = Customer_Order(issuetime, tname, ordertype, orderprice, quantity)
-                        new_pending.append(customer_order)
+                        new_pending.push(customer_order)
                         
                 # add the supply side (sellers) customer orders to the list of pending orders
                 issuetimes = getissuetimes(n_sellers, os['timemode'], os['interval'], shuffle_times, True)
@@ -321,52 +342,126 @@ def customer_orders(time, last_update, traders, trader_stats, os, pending, verbo
                         quantity_max = os['quantity_range'][1]
                         quantity = random.randint(quantity_min,quantity_max)
                         customer_order = Customer_Order(issuetime, tname, ordertype, orderprice, quantity)
-                        new_pending.append(customer_order)
+                        new_pending.push(customer_order)
         # if there are some pending orders
         else:
                 # there are pending future orders: issue any whose timestamp is in the past
-                new_pending = []
-                for order in pending:
-                        if order.time < time:
-                                # this order should have been issued by now
-                                # issue it to the trader
-                                tname = order.trader_id
-                                response = traders[tname].add_order(order, verbose)
-                                if verbose: print('Customer order: %s %s' % (response, order) )
-                                # if issuing the order causes the trader to cancel their current order then add
-                                # the traders name to the cancellations list
-                                if response == 'LOB_Cancel' :
-                                    cancellations.append(tname)
-                                    if verbose: print('Cancellations: %s' % (cancellations))
-                                # and then don't add it to new_pending (i.e., delete it)
-                        else:
-                                # this order stays on the pending list
-                                new_pending.append(order)
+                # only the orders now due are taken off the schedule
+                new_pending = pending
+                for order in pending.pop_due(time):
+                        # this order should have been issued by now
+                        # issue it to the trader
+                        tname = order.trader_id
+                        response = traders[tname].add_order(order, verbose)
+                        if verbose: print('Customer order: %s %s' % (response, order) )
+                        if issued != None:
+                            issued.append(tname)
+                        # if issuing the order causes the trader to cancel their current order then add
+                        # the traders name to the cancellations list
+                        if response == 'LOB_Cancel' :
+                            cancellations.append(tname)
+                            if verbose: print('Cancellations: %s' % (cancellations))
         return [new_pending, cancellations]
 
-# one session in the market
-# This was modified to work with the dark pool
-def market_session(sess_id, starttime, endtime, trader_spec, order_schedule, dumpfile, dump_each_trade):
-
-    # variables which dictate what information is printed to the output
-    verbose = False
-    traders_verbose = False
-    orders_verbose = False
-    lob_verbose = False
-    process_verbose = False
-    respond_verbose = False
-    bookkeep_verbose = False
-
-
-    # initialise the exchange
-    exchange = Exchange()
-    exchange.block_indication_book.MIV = 800
-
-
-    # create a bunch of traders
-    traders = {}
-    trader_stats = populate_market(trader_spec, traders, True, traders_verbose)
-
+# add a trader's quote to the exchange. Returns whether it added new orders to the order book and whether it added
+# new block indications, as an unchanged resubmission leaves the books as they were
+def submit_quote(exchange, traders, tid, order, process_verbose):
+
+    new_orders = False
+    new_block_indications = False
+
+    # add the order to the exchange. An unchanged resubmission leaves the order book as it was
+    if isinstance(order, Order):
+        result = exchange.add_order(order, process_verbose)
+        if result[1] != 'Unchanged':
+            new_orders = True
+
+    # add block indication to the exchange. A resubmitted block indication leaves the book as it was, so there are no
+    # new matches
+    elif isinstance(order, Block_Indication):
+        result = exchange.add_block_indication(order, process_verbose)
+        if result[1] != 'Unchanged':
+            new_block_indications = True
+    traders[tid].n_quotes = 1
+
+    return [new_orders, new_block_indications]
+
+# uncross the exchange: match the block indications if there are new ones and execute the trades in the order book if
+# there are new orders in it, as the books were left with nothing to match after the last uncross. Returns the trades
+def uncross_exchange(exchange, traders, time, new_orders, new_block_indications, bookkeep_verbose):
+
+    # find block indication matches. Matched pairs of firm orders are crossed with each other directly, and only what
+    # is left of them is added to the order book
+    trades = []
+    if new_block_indications:
+        [trades, resting] = exchange.match_block_indications_and_get_firm_orders(time, traders, 50)
+        new_orders = new_orders or resting
+
+    # execute all possible trades
+    if new_orders:
+        trades = trades + exchange.execute_trades(time, 50)
+
+    # trades occurred, so the counterparties update order lists and blotters
+    for trade in trades:
+        traders[trade['buyer']].bookkeep(trade, bookkeep_verbose)
+        traders[trade['seller']].bookkeep(trade, bookkeep_verbose)
+
+    return trades
+
+# Market_Step does the work the kernels share at a point in time: withdrawing the quotes of traders whose customer
+# orders have been replaced, asking a trader for a quote and adding it to the exchange, and uncrossing the exchange when
+# the uncross scheduler says it is due. The order book is left with no possible trades after each uncross, so there
+# can only be new trades if new orders are added to it, and new block indication matches if new block indications are
+# added. Market_Step keeps track of both between uncrosses
+class Market_Step:
+
+    def __init__(self, exchange, traders, uncross_scheduler, verbose, process_verbose, bookkeep_verbose):
+        self.exchange = exchange
+        self.traders = traders
+        self.uncross_scheduler = uncross_scheduler
+        self.verbose = verbose
+        self.process_verbose = process_verbose
+        self.bookkeep_verbose = bookkeep_verbose
+        # whether orders and block indications have been added since the last uncross
+        self.new_orders = False
+        self.new_block_indications = False
+
+    # kill the last quotes of the given traders
+    def kill_quotes(self, time, kills):
+        if self.verbose and len(kills) > 0: print('Kills: %s' % (kills))
+        for kill in kills:
+            if self.verbose: print('lastquote=%s' % self.traders[kill].lastquote)
+            if self.traders[kill].lastquote != None:
+                if self.verbose: print('Killing order %s' % (str(self.traders[kill].lastquote)))
+                self.exchange.del_order(time, self.traders[kill].lastquote, self.verbose)
+
+    # get a quote (or None) from a trader and, if they give one, add it to the exchange. Returns the quote
+    def quote(self, time, tid):
+        order = self.traders[tid].getorder(time)
+        if self.verbose: print('Trader Quote: %s' % (order))
+        if order != None:
+            [added_orders, added_block_indications] = submit_quote(self.exchange, self.traders, tid, order,
+                                                                   self.process_verbose)
+            self.new_orders = self.new_orders or added_orders
+            self.new_block_indications = self.new_block_indications or added_block_indications
+            self.uncross_scheduler.submission()
+        return order
+
+    # uncross the exchange if it is due. Returns whether it was uncrossed
+    def uncross_if_due(self, time):
+        if not self.uncross_scheduler.due(time):
+            return False
+        uncross_exchange(self.exchange, self.traders, time, self.new_orders, self.new_block_indications,
+                         self.bookkeep_verbose)
+        self.uncross_scheduler.uncrossed(time)
+        self.new_orders = False
+        self.new_block_indications = False
+        return True
+
+# run a session by stepping through time. At each timestep the customer orders due are issued, and a randomly chosen
+# trader is asked for a quote. Returns the time at the end of the session
+def run_timesteps(sess_id, starttime, endtime, exchange, traders, trader_stats, order_schedule, uncross_scheduler,
+                  verbose, orders_verbose, process_verbose, bookkeep_verbose):
 
     # timestep set so that can process all traders in one second
     # NB minimum interarrival time of customer orders may be much less than this!! 
@@ -381,7 +476,7 @@ def market_session(sess_id, starttime, endtime, trader_spec, order_schedule, dum
     # this list contains all the pending customer orders that are yet to happen
     pending_cust_orders = []
 
-    print('\n%s;  ' % (sess_id))
+    market_step = Market_Step(exchange, traders, uncross_scheduler, verbose, process_verbose, bookkeep_verbose)
 
     while time < endtime:
 
@@ -399,43 +494,254 @@ def market_session(sess_id, starttime, endtime, trader_spec, order_schedule, dum
                                          order_schedule, pending_cust_orders, orders_verbose)
 
         # if any newly-issued customer orders mean quotes on the LOB need to be cancelled, kill them
-        if len(kills) > 0 :
-            if verbose : print('Kills: %s' % (kills))
-            for kill in kills :
-                if verbose : print('lastquote=%s' % traders[kill].lastquote)
-                if traders[kill].lastquote != None :
-                    if verbose : print('Killing order %s' % (str(traders[kill].lastquote)))
-                    exchange.del_order(time, traders[kill].lastquote, verbose)
-
+        market_step.kill_quotes(time, kills)
 
-        # get a limit-order quote (or None) from a randomly chosen trader
+        # get a limit-order quote (or None) from a randomly chosen trader, and add it to the exchange
         tid = list(traders.keys())[random.randint(0, len(traders) - 1)]
-        order = traders[tid].getorder(time)
+        market_step.quote(time, tid)
 
-        if verbose: print('Trader Quote: %s' % (order))
+        # uncross the exchange if it is due
+        market_step.uncross_if_due(time)
 
-        # if the randomly selected trader gives us a quote, then add it to the exchange
-        if order != None:
+        time = time + timestep
 
-            # add the order to the exchange
-            if isinstance(order, Order):
-                result = exchange.add_order(order, process_verbose)
+    return time
+
+# the number of the first timestep at or after time t, where timestep i is at starttime + i * timestep. The answer is
+# checked against the time of the timestep itself, as run_active_timesteps works it out, so rounding in the division
+# can't put it out by one
+def step_at(t, starttime, timestep):
+    step = max(int(math.ceil((t - starttime) / timestep)), 0)
+    while step > 0 and starttime + (step - 1) * timestep >= t:
+        step -= 1
+    while starttime + step * timestep < t:
+        step += 1
+    return step
+
+# the number of the first timestep strictly after time t
+def step_after(t, starttime, timestep):
+    step = step_at(t, starttime, timestep)
+    while starttime + step * timestep <= t:
+        step += 1
+    return step
+
+# the number of timesteps from this one to the next pick of one of n_active active traders, out of n_traders, which
+# may be this one. A pick lands on an active trader with a probability of n_active/n_traders, so the number of
+# timesteps before it is geometric. Returns None if there are no active traders
+def steps_to_pick(n_active, n_traders):
+    if n_active == 0:
+        return None
+    p = n_active / float(n_traders)
+    if p >= 1.0:
+        return 0
+    return int(math.log(1.0 - random.random()) / math.log(1.0 - p))
+
+# run a session by stepping through time in the same way as run_timesteps, but only ask traders with work to do for
+# a quote. At each timestep run_timesteps picks one of the n traders at random, and a trader with no customer order,
+# or with nothing of it left, gives no quote. Here the traders which may have work are kept in an Active_Traders set.
+# Picking from all n traders and ignoring idle ones is the same as, at each timestep, picking one of the set with a
+# probability of (size of the set)/n, so the number of timesteps to the next pick is drawn from a geometric
+# distribution and the timesteps in between are skipped. The timesteps where customer orders fall due or an uncross is
+# on the timetable are still visited. The set can hold traders that have since become idle; they are removed when
+# they are picked, and that pick is wasted just as it would have been before. Returns the time at the end of the
+# session
+def run_active_timesteps(sess_id, starttime, endtime, exchange, traders, trader_stats, order_schedule,
+                         uncross_scheduler, verbose, orders_verbose, process_verbose, bookkeep_verbose):
 
-            # add block indication to the exchange and find matches
-            elif isinstance(order, Block_Indication):
-                result = exchange.add_block_indication(order, process_verbose)
-                exchange.match_block_indications_and_get_firm_orders(time, traders, 50)
-            traders[tid].n_quotes = 1
+    # timestep set so that can process all traders in one second
+    timestep = 1.0 / float(trader_stats['n_buyers'] + trader_stats['n_sellers'])
+    n_traders = len(traders)
 
-            # execute all possible trades
-            trades = exchange.execute_trades(time, 50)
+    end_step = step_at(endtime, starttime, timestep)
+    step = 0
+    time = starttime
+    pending_cust_orders = []
+    active = Active_Traders()
+    next_pick = None
+    market_step = Market_Step(exchange, traders, uncross_scheduler, verbose, process_verbose, bookkeep_verbose)
 
-            # trades occurred, so the counterparties update order lists and blotters
-            for trade in trades:
-                traders[trade['buyer']].bookkeep(trade, bookkeep_verbose)
-                traders[trade['seller']].bookkeep(trade, bookkeep_verbose)
+    while step < end_step:
+
+        if verbose: print('%s; t=%08.2f' % (sess_id, time))
+
+        # issue the customer orders due. The traders they are issued to have work to do, and the chance of picking
+        # an active trader changes, so the next pick is drawn again
+        issued = []
+        [pending_cust_orders, kills] = customer_orders(time, -1.0, traders, trader_stats, order_schedule,
+                                                       pending_cust_orders, orders_verbose, issued)
+        if len(issued) > 0:
+            for tname in issued:
+                active.add(tname)
+            next_pick = step + steps_to_pick(len(active), n_traders)
+
+        # if any newly-issued customer orders mean quotes on the LOB need to be cancelled, kill them
+        market_step.kill_quotes(time, kills)
+
+        # get a quote from a randomly chosen active trader. A trader with no quote to give has no work left
+        if next_pick == step:
+            tid = active.choose(random)
+            if market_step.quote(time, tid) == None:
+                active.remove(tid)
+            picks = steps_to_pick(len(active), n_traders)
+            if picks == None:
+                next_pick = None
+            else:
+                next_pick = step + 1 + picks
+
+        # uncross the exchange if it is due
+        market_step.uncross_if_due(time)
+
+        # skip to the next timestep where something happens: a pick, customer orders falling due (a new batch is
+        # made at the next timestep once all have been issued) or an uncross on the timetable
+        next_step = end_step
+        if next_pick != None:
+            next_step = min(next_step, next_pick)
+        if len(pending_cust_orders) == 0:
+            next_step = min(next_step, step + 1)
+        else:
+            next_step = min(next_step, step_after(pending_cust_orders.next_time(), starttime, timestep))
+        if uncross_scheduler.next_uncross != None:
+            next_step = min(next_step, step_at(uncross_scheduler.next_uncross, starttime, timestep))
+        step = max(next_step, step + 1)
+        time = starttime + step * timestep
+
+    return time
+
+# run a session as a series of events, jumping straight from one event to the next. The events are:
+#     arrivals  a customer order is issued to a trader. When the last customer order of a batch has arrived the next
+#               batch is made, in the same way as customer_orders does when there are no pending orders
+#     cancels   a trader's quote is withdrawn because a new customer order replaces the one it was for
+#     wake-ups  a trader with a customer order to work sends a quote, and wakes up again wake_interval later until the
+#               customer order is done. A new customer order wakes the trader straight away, and any wake-up scheduled
+#               before it is then ignored
+#     uncrosses the uncross scheduler's timetable, for the periodic and random modes
+# Traders with nothing to do have no events, so the work done depends on the number of events rather than on the
+# length of the session. In the timestep kernel each trader is asked for a quote about once a second, so the default
+# wake_interval is one second. Returns the time at the end of the session
+def run_events(sess_id, starttime, endtime, exchange, traders, trader_stats, order_schedule, uncross_scheduler,
+               wake_interval, verbose, orders_verbose, process_verbose, bookkeep_verbose):
+
+    events = Event_Queue()
+
+    # the number of customer orders of the current batch yet to arrive
+    arrivals_left = 0
+    # the number of wake-ups each trader has been given, so that those replaced by a newer one can be ignored
+    wakes = {}
+    market_step = Market_Step(exchange, traders, uncross_scheduler, verbose, process_verbose, bookkeep_verbose)
+
+    # make the first batch of customer orders and put the first uncross on the timetable
+    time = starttime
+    [pending, kills] = customer_orders(time, -1.0, traders, trader_stats, order_schedule, [], orders_verbose)
+    for order in pending:
+        events.push(order.time, Event_Queue.ARRIVAL, order)
+    arrivals_left = len(pending)
+    if uncross_scheduler.next_uncross != None:
+        events.push(uncross_scheduler.next_uncross, Event_Queue.UNCROSS)
+
+    while len(events) > 0 and events.next_time() < endtime:
+
+        [time, kind, data] = events.pop()
+
+        if verbose: print('%s; t=%08.2f event=%d' % (sess_id, time, kind))
+
+        # issue the customer order to the trader, withdraw the trader's quote if it has been replaced and wake the
+        # trader up to work the new order
+        if kind == Event_Queue.ARRIVAL:
+            tid = data.trader_id
+            response = traders[tid].add_order(data, orders_verbose)
+            if orders_verbose: print('Customer order: %s %s' % (response, data))
+            if response == 'LOB_Cancel':
+                events.push(time, Event_Queue.CANCEL, tid)
+            wakes[tid] = wakes.get(tid, 0) + 1
+            events.push(time, Event_Queue.WAKE, [tid, wakes[tid]])
+
+            # make the next batch once this one has all arrived
+            arrivals_left -= 1
+            if arrivals_left == 0:
+                [pending, kills] = customer_orders(time, -1.0, traders, trader_stats, order_schedule, [],
+                                                   orders_verbose)
+                for order in pending:
+                    events.push(order.time, Event_Queue.ARRIVAL, order)
+                arrivals_left = len(pending)
+
+        # kill the trader's last quote
+        elif kind == Event_Queue.CANCEL:
+            market_step.kill_quotes(time, [data])
+
+        # get a quote from the trader, unless a newer wake-up has replaced this one. A trader who gives a quote has
+        # work left, so is woken up again
+        elif kind == Event_Queue.WAKE:
+            [tid, wake] = data
+            if wake == wakes[tid] and market_step.quote(time, tid) != None:
+                events.push(time + wake_interval, Event_Queue.WAKE, [tid, wake])
+
+        # uncross the exchange if it is due, and put the next uncross on the timetable
+        if market_step.uncross_if_due(time):
+            if uncross_scheduler.next_uncross != None:
+                events.push(uncross_scheduler.next_uncross, Event_Queue.UNCROSS)
+
+    return endtime
+
+# one session in the market
+# This was modified to work with the dark pool
+# If stream_buffer_size is given, then the tape and the composite reputational score history are written out as the
+# session goes along, keeping at most that many events and scores in memory, instead of all at the end.
+# uncross_scheduler is an Uncross_Scheduler which says when the exchange is uncrossed. By default it is uncrossed
+# after every submission.
+# kernel is either 'timestep', which steps through time asking a random trader for a quote at each step, 'active',
+# which does the same but only picks from the traders with work to do (see run_active_timesteps), or 'event', which
+# jumps from one scheduled event to the next (see run_events).
+# The output files are written to output_dir.
+# venue_settings is a dictionary of settings of the block indication book, such as MIV, RST and
+# initial_reputational_score, which replace the defaults
+def market_session(sess_id, starttime, endtime, trader_spec, order_schedule, dumpfile, dump_each_trade,
+                   stream_buffer_size=None, uncross_scheduler=None, kernel='timestep', wake_interval=1.0,
+                   output_dir='output', venue_settings=None):
+
+    # variables which dictate what information is printed to the output
+    verbose = False
+    traders_verbose = False
+    orders_verbose = False
+    lob_verbose = False
+    process_verbose = False
+    respond_verbose = False
+    bookkeep_verbose = False
 
-        time = time + timestep
+
+    # initialise the exchange
+    exchange = Exchange(Orderbook_half_bisect)
+    exchange.order_book.matching_engine = 'incremental'
+    exchange.block_indication_book.matching_engine = 'single_pass'
+    exchange.block_indication_book.MIV = 800
+    if venue_settings != None:
+        for name in venue_settings:
+            setattr(exchange.block_indication_book, name, venue_settings[name])
+    if stream_buffer_size != None:
+        exchange.start_output_streams(os.path.join(output_dir, 'transactions.csv'),
+                                      os.path.join(output_dir, 'CRS_history.csv'), 'w', stream_buffer_size)
+
+
+    # create a bunch of traders
+    traders = {}
+    trader_stats = populate_market(trader_spec, traders, True, traders_verbose)
+
+    # start the uncross schedule
+    if uncross_scheduler == None:
+        uncross_scheduler = Uncross_Scheduler()
+    uncross_scheduler.start(starttime)
+
+    print('\n%s;  ' % (sess_id))
+
+    # run the session
+    if kernel == 'event':
+        time = run_events(sess_id, starttime, endtime, exchange, traders, trader_stats, order_schedule,
+                          uncross_scheduler, wake_interval, verbose, orders_verbose, process_verbose, bookkeep_verbose)
+    elif kernel == 'active':
+        time = run_active_timesteps(sess_id, starttime, endtime, exchange, traders, trader_stats, order_schedule,
+                                    uncross_scheduler, verbose, orders_verbose, process_verbose, bookkeep_verbose)
+    else:
+        time = run_timesteps(sess_id, starttime, endtime, exchange, traders, trader_stats, order_schedule,
+                             uncross_scheduler, verbose, orders_verbose, process_verbose, bookkeep_verbose)
 
     # print the final order and block indications
     print("Final orders and block indications:")
@@ -443,16 +749,73 @@ def market_session(sess_id, starttime, endtime, trader_spec, order_schedule, dum
     exchange.print_block_indications()
     exchange.print_matches()
 
-    # end of an experiment -- dump the tape
-    exchange.tape_dump('output/transactions.csv', 'w', 'keep')
-    # dump the traders' reputational score history
-    exchange.CRS_history_dump('output/CRS_history.csv', 'w', 'keep')
-    exchange.ERS_dump('output/ERS.csv', 'w', 'keep')
+    # end of an experiment -- dump the tape and the traders' reputational score history
+    if stream_buffer_size != None:
+        exchange.end_output_streams()
+    else:
+        exchange.tape_dump(os.path.join(output_dir, 'transactions.csv'), 'w', 'keep')
+        exchange.CRS_history_dump(os.path.join(output_dir, 'CRS_history.csv'), 'w', 'keep')
+    exchange.ERS_dump(os.path.join(output_dir, 'ERS.csv'), 'w', 'keep')
 
     # write trade_stats for this experiment NB end-of-session summary only
     trade_stats(sess_id, traders, dumpfile, time)
 
 
+# run one trial of a set of trials, in its own directory and with its own seed. The arguments are given as one list so
+# that the trial can be run by a process pool. Returns the trial's directory
+def run_trial(args):
+    [trial_id, seed, trial_dir, starttime, endtime, trader_spec, order_schedule, session_args] = args
+    random.seed(seed)
+    if not os.path.isdir(trial_dir):
+        os.makedirs(trial_dir)
+    dumpfile = open(os.path.join(trial_dir, 'avg_balance_dark.csv'), 'w')
+    market_session(trial_id, starttime, endtime, trader_spec, order_schedule, dumpfile, False, output_dir=trial_dir,
+                   **session_args)
+    dumpfile.close()
+    return trial_dir
+
+# the seed of each of n_trials trials. They are drawn from a generator seeded with the given seed, so that a set of
+# trials can be repeated, and each trial gets its own random number stream however the trials are shared out
+def trial_seeds(seed, n_trials):
+    rng = random.Random(seed)
+    return [rng.getrandbits(64) for trial in range(0, n_trials)]
+
+# write the summaries of the trials, in the given order, into one file. This is the same as the file the trials would
+# have written one after another
+def merge_trial_summaries(trial_dirs, fname):
+    dumpfile = open(fname, 'w')
+    for trial_dir in trial_dirs:
+        trial_file = open(os.path.join(trial_dir, 'avg_balance_dark.csv'))
+        dumpfile.write(trial_file.read())
+        trial_file.close()
+    dumpfile.close()
+
+# run n_trials sessions across a pool of processes. Trial i is run with the i-th of trial_seeds(seed, n_trials) and
+# writes its output files to output_dir/trialNNNN, and the summaries are then merged into
+# output_dir/avg_balance_dark.csv. processes is the number of processes, by default the number of cores; with one
+# process the trials are run in this process. session_args are passed on to market_session. Returns the trial
+# directories
+def run_trials(n_trials, starttime, endtime, trader_spec, order_schedule, output_dir='output', seed=0, processes=None,
+               session_args={}):
+    seeds = trial_seeds(seed, n_trials)
+    jobs = []
+    for trial in range(1, n_trials + 1):
+        trial_id = 'trial%04d' % trial
+        jobs.append([trial_id, seeds[trial - 1], os.path.join(output_dir, trial_id), starttime, endtime, trader_spec,
+                     order_schedule, session_args])
+
+    if processes == 1:
+        trial_dirs = [run_trial(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(processes)
+        trial_dirs = pool.map(run_trial, jobs)
+        pool.close()
+        pool.join()
+
+    merge_trial_summaries(trial_dirs, os.path.join(output_dir, 'avg_balance_dark.csv'))
+    return trial_dirs
+
+
 def experiment1():
 
     start_time = 0.0
@@ -475,19 +838,12 @@ def experiment1():
     traders_spec = {'sellers':sellers_spec, 'buyers':buyers_spec, 'BI_threshold':800}
 
     n_trials = 1
-    tdump=open('output/avg_balance_dark.csv','w')
-    trial = 1
+    # each trial is run in its own directory, in parallel when there is more than one
     if n_trials > 1:
-            dump_all = False
+        processes = None
     else:
-            dump_all = True
-            
-    while (trial<(n_trials+1)):
-            trial_id = 'trial%04d' % trial
-            market_session(trial_id, start_time, end_time, traders_spec, order_sched, tdump, dump_all)
-            tdump.flush()
-            trial = trial + 1
-    tdump.close()
+        processes = 1
+    run_trials(n_trials, start_time, end_time, traders_spec, order_sched, processes=processes)
 
     sys.exit('Done Now')
 
@@ -513,19 +869,12 @@ def experiment2():
     traders_spec = {'sellers':sellers_spec, 'buyers':buyers_spec, 'BI_threshold':900}
 
     n_trials = 1
-    tdump=open('output/avg_balance_dark.csv','w')
-    trial = 1
+    # each trial is run in its own directory, in parallel when there is more than one
     if n_trials > 1:
-            dump_all = False
+        processes = None
     else:
-            dump_all = True
-            
-    while (trial<(n_trials+1)):
-            trial_id = 'trial%04d' % trial
-            market_session(trial_id, start_time, end_time, traders_spec, order_sched, tdump, dump_all)
-            tdump.flush()
-            trial = trial + 1
-    tdump.close()
+        processes = 1
+    run_trials(n_trials, start_time, end_time, traders_spec, order_sched, processes=processes)
 
     sys.exit('Done Now')
 
@@ -0,0 +1,39 @@
+import heapq
+
+# Event_Queue holds the events of a discrete-event market session in a heap, so that the next event can be found
+# without stepping through the time in between. Events are taken off in order of time, then of kind, so that at the
+# same time customer orders arrive before the cancellations they cause, which come before the traders' quotes and the
+# uncross. Events of the same time and kind come off in the order they were put on
+class Event_Queue:
+
+    # the kinds of event, in the order they happen at the same time
+    ARRIVAL = 0
+    CANCEL = 1
+    WAKE = 2
+    UNCROSS = 3
+
+    def __init__(self):
+        self.heap = []
+        # increased for every event added, so that no two entries in the heap are the same
+        self.sequence = 0
+
+    # the number of events in the queue
+    def __len__(self):
+        return len(self.heap)
+
+    # add an event of the given kind at the given time. data is whatever the event needs, such as a customer order or
+    # a trader id
+    def push(self, time, kind, data=None):
+        heapq.heappush(self.heap, (time, kind, self.sequence, data))
+        self.sequence += 1
+
+    # remove the next event and return its time, kind and data
+    def pop(self):
+        (time, kind, sequence, data) = heapq.heappop(self.heap)
+        return [time, kind, data]
+
+    # the time of the next event, or None if the queue is empty
+    def next_time(self):
+        if len(self.heap) == 0:
+            return None
+        return self.heap[0][0]
@@ -0,0 +1,51 @@
+# Event_Scores holds a trader's most recent event reputational scores, up to a fixed number of them, in a ring buffer.
+# Indexing gives the scores most recent first, like a list. Alongside the scores it keeps their plain sum and their
+# weighted sum, where the most recent score has a weighting of size, the next most recent size-1, and so on, so that
+# the composite reputational score can be found without going through every score.
+#
+# When a new score e is added every other score moves down one place and its weighting goes down by one, which takes
+# the plain sum S off the weighted sum W. The oldest score's weighting goes from 1 to 0 as it drops out, so
+#     W' = size * e + W - S        S' = S + e - (the score that dropped out)
+# The scores are whole numbers, so both sums are exact and the composite score is the same as summing term by term
+class Event_Scores:
+
+    # scores is a list of scores, most recent first
+    def __init__(self, scores, size=50):
+        self.size = size
+        # the ring buffer, the slot holding the most recent score and the number of scores held
+        self.scores = [None] * size
+        self.start = 0
+        self.count = 0
+        self.total = 0
+        self.weighted_total = 0
+        # add the scores oldest first
+        for score in reversed(scores[:size]):
+            self.add(score)
+
+    # add a new score, dropping the oldest one if the buffer is full
+    def add(self, score):
+        self.weighted_total += self.size * score - self.total
+        self.total += score
+        # the new score goes in the slot before the current most recent one, which when the buffer is full is the slot
+        # holding the oldest score
+        self.start = (self.start - 1) % self.size
+        if self.count == self.size:
+            self.total -= self.scores[self.start]
+        else:
+            self.count += 1
+        self.scores[self.start] = score
+
+    # the number of scores held
+    def __len__(self):
+        return self.count
+
+    # the i-th most recent score
+    def __getitem__(self, i):
+        if i < 0 or i >= self.count:
+            raise IndexError('event score index out of range')
+        return self.scores[(self.start + i) % self.size]
+
+    # iterate over the scores, most recent first
+    def __iter__(self):
+        for i in range(0, self.count):
+            yield self.scores[(self.start + i) % self.size]
@@ -5,23 +5,76 @@ from block_indication_book import *
 # Exchange class. This class is used to bring together the Orderbook class and the Block_Indication_Book class.
 class Exchange:
 
-    # constructor method
-    def __init__(self):
+    # constructor method. book_half is the class used for each side of both books
+    def __init__(self, book_half=Orderbook_half):
         # order_book will hold all of the orders made by traders
-        self.order_book = Orderbook()
+        self.order_book = Orderbook(book_half)
         # block_indication_book will hold all of the block indications made by traders 
-        self.block_indication_book = Block_Indication_Book()
+        self.block_indication_book = Block_Indication_Book(book_half)
+        # a dictionary mapping each trader to the half of a book that their live order or block indication rests in,
+        # and the order or block indication itself. A trader has at most one of these across both books
+        self.locations = {}
+        # the simulated time a trader has to answer an OSR with a QBO, unless the trader has a QBO_deadline of their
+        # own. A trader who would answer later than this is not asked for a QBO. None means that every QBO is waited
+        # for
+        self.QBO_deadline = None
+
+    # return the (book half, order) location of the order or block indication a trader has resting in either book,
+    # or None if they don't have one. Orders and block indications are also removed by trades, matches and
+    # cancellations inside the books, so an entry is only returned if the order is still resting where it was put
+    def get_location(self, trader_id):
+        location = self.locations.get(trader_id)
+        if location != None:
+            (book_half, order) = location
+            if book_half.traders.get(trader_id) is order:
+                return location
+            del(self.locations[trader_id])
+        return None
+
+    # record where a newly added order or block indication rests
+    def set_location(self, book, order):
+        if order.otype == 'Buy':
+            self.locations[order.trader_id] = (book.buy_side, order)
+        else:
+            self.locations[order.trader_id] = (book.sell_side, order)
+
+    # delete the order or block indication a trader had resting, wherever it rests, now that a new one has been added
+    # to the given book. If it rested in the same half of the same book, then adding the new one has already replaced
+    # it
+    def del_replaced(self, location, book, order):
+        if order.otype == 'Buy':
+            new_book_half = book.buy_side
+        else:
+            new_book_half = book.sell_side
+        if location[0] is not new_book_half:
+            location[0].book_del(order.trader_id)
+
+    # check whether a new order or block indication has the same terms as the one the trader already has resting.
+    # The quantity of the new one is compared with the quantity the resting one has left to trade
+    def same_terms(self, resting, new, quantity_left):
+        return resting.otype == new.otype and quantity_left == new.quantity and \
+            resting.limit_price == new.limit_price and resting.MES == new.MES
 
     # add an order to the exchange
     def add_order(self, order, verbose):
         # Make sure that what is being added is actually an order
         if(isinstance(order, Order)):
+            location = self.get_location(order.trader_id)
+            # If the trader is resubmitting the order they already have in the order book, then leave the resting
+            # order where it is so that it keeps its time priority. Nothing in the books changes, so there is nothing
+            # new to match
+            if location != None:
+                (book_half, resting) = location
+                if isinstance(resting, Order) and resting.BDS == order.BDS and \
+                        self.same_terms(resting, order, resting.quantity_remaining):
+                    return [resting.id, 'Unchanged']
             # Add the order to the exchange
             [order_id, response] = self.order_book.add_order(order, verbose)
-            # If the trader already has a block indication on the exchange, then delete it
-            if self.block_indication_book.trader_has_block_indication(order.trader_id):
-                self.block_indication_book.book_del(order.trader_id)
+            # If the trader already has an order or a block indication on the exchange, then delete it
+            if location != None:
+                self.del_replaced(location, self.order_book, order)
                 response = 'Overwrite'
+            self.set_location(self.order_book, order)
             # Return the order id and the response
             return [order_id, response]
         else:
@@ -31,12 +84,24 @@ class Exchange:
     def add_block_indication(self, BI, verbose):
         # Make sure that what is being added is actually a block indication
         if(isinstance(BI, Block_Indication)):
+            location = self.get_location(BI.trader_id)
+            # If the trader is resubmitting the block indication they already have in the book, and it would still be
+            # accepted, then leave the resting block indication where it is
+            if location != None:
+                (book_half, resting) = location
+                if isinstance(resting, Block_Indication) and self.same_terms(resting, BI, resting.quantity) and \
+                        BI.quantity >= self.block_indication_book.MIV and \
+                        self.block_indication_book.composite_reputational_scores.get(BI.trader_id) >= \
+                        self.block_indication_book.RST:
+                    return [resting.id, 'Unchanged']
             # Add the block indication to the exchange
             [BI_id, response] = self.block_indication_book.add_block_indication(BI, verbose)
-            # If the trader already has an order in the order book, then delete it
-            if response != "Block Indication Rejected" and self.order_book.trader_has_order(BI.trader_id):
-                self.order_book.book_del(BI.trader_id)
-                response = 'Overwrite'
+            if response != "Block Indication Rejected":
+                # If the trader already has an order or a block indication on the exchange, then delete it
+                if location != None:
+                    self.del_replaced(location, self.block_indication_book, BI)
+                    response = 'Overwrite'
+                self.set_location(self.block_indication_book, BI)
             # Return the block indication ID and the response
             return [BI_id, response]
         else:
@@ -85,40 +150,103 @@ class Exchange:
         self.add_order(buy_order, False)
         self.add_order(sell_order, False)
 
+        # return the firm orders
+        return [buy_order, sell_order]
+
+    # cross a pair of firm orders made from matched QBOs directly against each other, without looking at the rest of
+    # the order book. If they match at the given price then they trade with each other in the same way as in
+    # execute_trades, and only what is left of them stays in the order book. Returns the trade, or None if they
+    # don't match
+    def cross_firm_orders(self, time, buy_order, sell_order, price):
+        if self.order_book.check_match(buy_order, sell_order, price):
+            match_info = {
+                "buy_order": buy_order,
+                "sell_order": sell_order,
+                "price": price
+            }
+            return self.order_book.execute_trade(time, match_info)
+        return None
+
 
     # match block indications that are lying in the exchange and then convert those block indications 
-    # into firm orders
+    # into firm orders. The OSRs for every match are sent out at the same time and the QBOs are gathered together,
+    # so a trader who is slow to answer only holds up their own match. Each trader answers after their
+    # response_delay, and a match is settled once both of its QBOs have arrived or the traders' QBO deadlines have
+    # passed.
+    # Matches are settled in the order they finish, and matches finishing at the same time in match order, so the
+    # results only depend on the traders' delays and not on how the QBOs were gathered. Every match is settled during
+    # this uncross, so the reputational scores and trades are stamped with the time of the uncross, keeping the tape in
+    # order of time; each QBO keeps the time it arrived. The two firm orders from a match are crossed with each other
+    # straight away. Returns the trades made and whether any firm orders were left
+    # resting in the order book, as only then can there be new trades with the rest of the order book
     def match_block_indications_and_get_firm_orders(self, time, traders, price):
         
         # find all block indication matches
         self.block_indication_book.find_all_matching_block_indications(price)
 
-        # go through all matches
+        # send an OSR to each trader in every match and gather the QBOs
+        negotiations = []
         for match_id in self.block_indication_book.matches.keys():
-
-            # get the block indications that were matched
-            full_match = self.block_indication_book.get_block_indication_match(match_id)
-            buy_BI = full_match["buy_BI"]
-            sell_BI = full_match["sell_BI"]
-
-            # send an OSR to each traders and get back a QBO
             OSRs = self.block_indication_book.create_order_submission_requests(match_id)
-            buy_QBO = traders[buy_BI.trader_id].get_qualifying_block_order(time, OSRs["buy_OSR"])
-            sell_QBO = traders[sell_BI.trader_id].get_qualifying_block_order(time, OSRs["sell_OSR"])
-
-            # add the QBOs to the exchange
-            self.block_indication_book.add_qualifying_block_order(buy_QBO, False)
-            self.block_indication_book.add_qualifying_block_order(sell_QBO, False)
-
-            # update the reputational scores of the traders in the match
+            [buy_QBO, buy_time] = self.get_qualifying_block_order(time, traders, OSRs["buy_OSR"])
+            [sell_QBO, sell_time] = self.get_qualifying_block_order(time, traders, OSRs["sell_OSR"])
+            negotiations.append((max(buy_time, sell_time), len(negotiations), match_id, buy_QBO, sell_QBO))
+
+        # settle the matches in the order they finished
+        trades = []
+        resting = False
+        for (finish_time, position, match_id, buy_QBO, sell_QBO) in sorted(negotiations):
+
+            # add the QBOs that arrived in time to the exchange
+            if buy_QBO != None:
+                self.block_indication_book.add_qualifying_block_order(buy_QBO, False)
+            if sell_QBO != None:
+                self.block_indication_book.add_qualifying_block_order(sell_QBO, False)
+
+            # update the reputational scores of the traders in the match. A trader with no QBO gets an event
+            # reputational score of 0
             self.block_indication_book.update_composite_reputational_scores(time, match_id)
 
-            # add the firm orders to the order book.
-            self.add_firm_orders_to_order_book(match_id)
+            # add the firm orders to the order book, if both traders sent a QBO, and cross them with each other
+            if buy_QBO != None and sell_QBO != None:
+                [buy_order, sell_order] = self.add_firm_orders_to_order_book(match_id)
+                trade = self.cross_firm_orders(time, buy_order, sell_order, price)
+                if trade != None:
+                    trades.append(trade)
+                if buy_order.quantity_remaining > 0 or sell_order.quantity_remaining > 0:
+                    resting = True
             
             # delete the block indication match from the matches dictionary
             self.block_indication_book.delete_match(match_id)
 
+        return [trades, resting]
+
+    # send an OSR to a trader and get back their QBO. The trader's own QBO deadline is used if they have one, and
+    # otherwise the exchange's. A trader whose answer would arrive after their deadline is not asked at all. Returns
+    # the QBO, or None if there is none, and the time the match stops waiting for it
+    def get_qualifying_block_order(self, time, traders, OSR):
+        trader = traders[OSR.trader_id]
+        deadline = trader.QBO_deadline
+        if deadline == None:
+            deadline = self.QBO_deadline
+        if deadline != None and trader.response_delay > deadline:
+            return [None, time + deadline]
+        arrival_time = time + trader.response_delay
+        return [trader.get_qualifying_block_order(arrival_time, OSR), arrival_time]
+
+
+    # stream the order book's tape and the composite reputational scores history to their output files as the
+    # session goes along. At most buffer_size events and buffer_size scores are kept in memory. If
+    # CRS_history_long_fname is given, then the history is also written there in long format
+    def start_output_streams(self, tape_fname, CRS_history_fname, fmode, buffer_size, CRS_history_long_fname=None):
+        self.order_book.start_tape_stream(tape_fname, fmode, buffer_size)
+        self.block_indication_book.start_CRS_history_stream(CRS_history_fname, fmode, buffer_size,
+                                                            CRS_history_long_fname)
+
+    # finish writing the streamed output files
+    def end_output_streams(self):
+        self.order_book.end_tape_stream()
+        self.block_indication_book.end_CRS_history_stream()
 
     # write the order_book's tape to the output file
     def tape_dump(self, fname, fmode, tmode):
@@ -128,20 +256,53 @@ class Exchange:
     def CRS_history_dump(self, fname, fmode, tmode):
         self.block_indication_book.CRS_history_dump(fname, fmode, tmode)
 
+    # write the composite reputational scores history to the output file in long format
+    def CRS_history_long_dump(self, fname, fmode, tmode):
+        self.block_indication_book.CRS_history_long_dump(fname, fmode, tmode)
+
+    # write the composite reputational scores history to a compact binary file
+    def CRS_history_binary_dump(self, fname, tmode):
+        self.block_indication_book.CRS_history_binary_dump(fname, tmode)
+
     # write the order_book's tape to the output file
     def ERS_dump(self, fname, fmode, tmode):
         self.block_indication_book.ERS_dump(fname, fmode, tmode)
 
-    # delete an order from the exchange
+    # delete a trader's order from the exchange. Whatever the trader has resting, in either book, is cancelled, so a
+    # trader whose last quote was a block indication has it taken out of the block indication book. If they have
+    # nothing resting, the cancel is still recorded against the given order
     def del_order(self, time, order, verbose):
+        location = self.get_location(order.trader_id)
+        if location != None:
+            del(self.locations[order.trader_id])
+            if isinstance(location[1], Block_Indication):
+                return self.block_indication_book.del_block_indication(time, location[1], verbose)
+            order = location[1]
         return self.order_book.del_order(time, order, verbose)
 
+    # delete a trader's block indication from the exchange
     def del_block_indication(self, time, order, verbose):
+        location = self.get_location(order.trader_id)
+        if location != None and isinstance(location[1], Block_Indication):
+            del(self.locations[order.trader_id])
+            order = location[1]
         return self.block_indication_book.del_block_indication(time, order, verbose)
 
     def execute_trades(self, time, price):
         return self.order_book.execute_trades(time, price)
 
+    # return the trades that would be made in the order book at the given time and price, without making them
+    def probe_trades(self, time, price):
+        return self.order_book.probe_trades(time, price)
+
+    # return the total quantity that would trade in the order book at the given price, without trading it
+    def probe_volume(self, price):
+        return self.order_book.probe_volume(price)
+
+    # return the block indication matches that would be made at the given price, without making them
+    def probe_block_indication_matches(self, price):
+        return self.block_indication_book.probe_block_indication_matches(price)
+
     # print the current orders in the orders dictionary
     def print_traders(self):
         self.order_book.print_traders()
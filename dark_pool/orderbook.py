@@ -1,15 +1,27 @@
 from orders import *
 from orderbook_half import *
+from quantity_index import *
+from tape import *
 
 # Orderbook for a single instrument: list of bids and list of asks
 class Orderbook:
 
-    def __init__(self):
-        self.buy_side = Orderbook_half('Buy')
-        self.sell_side = Orderbook_half('Sell')
-        self.tape = []
+    # book_half is the class used for each side of the book, either Orderbook_half or Orderbook_half_bisect
+    def __init__(self, book_half=Orderbook_half):
+        self.buy_side = book_half('Buy')
+        self.sell_side = book_half('Sell')
+        self.tape = Tape()
+        # the file the tape is streamed to, if it is being streamed, and the number of events the tape can hold
+        # before they are written to it
+        self.tape_stream = None
+        self.tape_buffer_size = 0
         self.order_id = 0  #unique ID code for each quote accepted onto the book
         self.traders = {}
+        # the engine used by execute_trades, either 'reference' or 'incremental'
+        self.matching_engine = 'reference'
+        # the incremental engine only builds its indexes when there are at least this many pairs of orders that can
+        # trade at the price. For smaller books it is quicker to check every pair
+        self.index_threshold = 1024
 
     # add an order to the order book
     def add_order(self, order, verbose):
@@ -43,6 +55,13 @@ class Orderbook:
         else:
             return False
 
+    # return the order a trader has resting in the order book, or None if they don't have one
+    def get_order(self, trader_id):
+        order = self.buy_side.traders.get(trader_id)
+        if order == None:
+            order = self.sell_side.traders.get(trader_id)
+        return order
+
     # delete all orders made by a trader
     def book_del(self, trader_id):
         self.buy_side.book_del(trader_id)
@@ -53,13 +72,13 @@ class Orderbook:
         # delete a trader's order from the exchange, update all internal records
         if order.otype == 'Buy':
             self.buy_side.book_del(order.trader_id)
-            cancel_record = { 'type': 'Cancel', 'time': time, 'order': order }
-            self.tape.append(cancel_record)
+            self.tape.append_cancel(time, order)
+            self.check_tape_stream()
 
         elif order.otype == 'Sell':
             self.sell_side.book_del(order.trader_id)
-            cancel_record = { 'type': 'Cancel', 'time': time, 'order': order }
-            self.tape.append(cancel_record)
+            self.tape.append_cancel(time, order)
+            self.check_tape_stream()
         else:
             # neither bid nor ask?
             sys.exit('bad order type in del_quote()')
@@ -112,12 +131,15 @@ class Orderbook:
 
 
 
-    # Find a match between a buy order and a sell order
-    def find_matching_orders(self, price):
+    # Find a match between a buy order and a sell order. By default every order in the book is looked at, but lists
+    # of the orders to look at, in book order, can be given instead
+    def find_matching_orders(self, price, buy_orders=None, sell_orders=None):
 
         # get the list of buy orders and sell orders
-        buy_orders = self.buy_side.get_orders()
-        sell_orders = self.sell_side.get_orders()
+        if buy_orders == None:
+            buy_orders = self.buy_side.get_orders()
+        if sell_orders == None:
+            sell_orders = self.sell_side.get_orders()
 
         # matching is buy-side friendly, so start with buys first
         for buy_order in buy_orders:
@@ -146,29 +168,27 @@ class Orderbook:
         else:
             trade_size = trade_info["buy_order"].quantity_remaining
 
-        # remove the orders from the order_book
-        self.buy_side.book_del(trade_info["buy_order"].trader_id)
-        self.sell_side.book_del(trade_info["sell_order"].trader_id)
-
         # subtract the trade quantity from each orders' quantity remaining
         trade_info["buy_order"].quantity_remaining -= trade_size
         trade_info["sell_order"].quantity_remaining -= trade_size
 
-        # re-add the the order with the leftover quantity
+        # update the order with the leftover quantity where it rests in the book, or remove it if it has been filled
         if trade_info["buy_order"].quantity_remaining > 0:
             # update the MES if necessary
             if trade_info["buy_order"].MES > trade_info["buy_order"].quantity_remaining:
                 trade_info["buy_order"].MES = trade_info["buy_order"].quantity_remaining
-            # add the order to the order_book list
-            self.buy_side.book_add(trade_info["buy_order"])
+            self.buy_side.book_update(trade_info["buy_order"])
+        else:
+            self.buy_side.book_del(trade_info["buy_order"].trader_id)
 
-        # re-add the order with the leftover quantity
+        # update the order with the leftover quantity where it rests in the book, or remove it if it has been filled
         if trade_info["sell_order"].quantity_remaining > 0:
             # update the MES if necessary
             if trade_info["sell_order"].MES > trade_info["sell_order"].quantity_remaining:
                 trade_info["sell_order"].MES = trade_info["sell_order"].quantity_remaining
-            # add the order to the order_book list
-            self.sell_side.book_add(trade_info["sell_order"])
+            self.sell_side.book_update(trade_info["sell_order"])
+        else:
+            self.sell_side.book_del(trade_info["sell_order"].trader_id)
 
         # create a record of the transaction 
         # BDS specifies whether the orders orginated from the block discovery service
@@ -182,16 +202,42 @@ class Orderbook:
             'BDS': trade_info["buy_order"].BDS and trade_info["sell_order"].BDS
         }
 
-        # add the record to the tape
-        self.tape.append(transaction_record)
+        # add the trade to the tape
+        self.tape.append_trade(time, transaction_record['price'], trade_size, transaction_record['buyer'],
+                               transaction_record['seller'], transaction_record['BDS'])
+        self.check_tape_stream()
 
         # return the transaction
         return transaction_record
 
 
+    # return the trades that execute_trades would make at the given time and price, without changing the order book.
+    # Only the orders that can trade at the price are looked at. Each one is stood in for by a Probe_Order, and the
+    # probe orders are put into a new order book of their own, in the same order, which then runs the same matching
+    # engine. The orders themselves are shared and never changed
+    def probe_trades(self, time, price):
+        probe = Orderbook()
+        probe.matching_engine = self.matching_engine
+        probe.index_threshold = self.index_threshold
+        for (side, probe_side) in [(self.buy_side, probe.buy_side), (self.sell_side, probe.sell_side)]:
+            for order in side.price_eligible_orders(price):
+                probe_side.book_add(Probe_Order(order))
+        return probe.execute_trades(time, price)
+
+    # return the total quantity that would trade at the given price, without changing the order book
+    def probe_volume(self, price):
+        return sum([trade['quantity'] for trade in self.probe_trades(0, price)])
+
+    # trades occur at the given time at the given price, using the matching engine selected for this order book
+    def execute_trades(self, time, price):
+        if self.matching_engine == 'incremental':
+            return self.execute_trades_incremental(time, price)
+        else:
+            return self.execute_trades_reference(time, price)
+
     # trades occur at the given time at the given price
     # keep making trades out of matched orders until no more matches can be found
-    def execute_trades(self, time, price):
+    def execute_trades_reference(self, time, price):
 
         # a list of all the trades made
         trades = []
@@ -215,22 +261,184 @@ class Orderbook:
         return trades
 
 
+    # trades occur at the given time at the given price between the given orders, which are the orders on each side
+    # that can trade at the price in book order. Every pair of them is checked in the same way as
+    # execute_trades_reference, so this makes the same trades without looking at the orders that can't trade. The lists
+    # are kept in step with the book: filled orders are taken out, and a partially filled order is moved after the
+    # orders with the same size and time, as book_update moves it
+    def execute_trades_pairwise(self, time, price, buy_orders, sell_orders):
+
+        # a list of all the trades made
+        trades = []
+
+        # find a match between a buy order a sell order
+        match_info = self.find_matching_orders(price, buy_orders, sell_orders)
+
+        # keep on going until no more matches can be found
+        while match_info != None:
+
+            # execute the trade with the matched orders
+            trade = self.execute_trade(time, match_info)
+
+            # add the trade information to the list of trades
+            trades.append(trade)
+
+            # keep the lists in step with the book
+            for (orders, order) in [(buy_orders, match_info["buy_order"]), (sell_orders, match_info["sell_order"])]:
+                position = orders.index(order)
+                del(orders[position])
+                if order.quantity_remaining > 0:
+                    while position < len(orders) and order_priority(orders[position]) == order_priority(order):
+                        position += 1
+                    orders.insert(position, order)
+
+            # find another match
+            match_info = self.find_matching_orders(price, buy_orders, sell_orders)
+
+        # return the list of trades
+        return trades
+
+    # find a match between a buy order and a sell order in the same way as find_matching_orders, but only look at the
+    # orders in the given indexes, which have already been checked against the price. The buy orders before the
+    # start position, and the buy orders in the cleared set, are already known not to match any sell order, so they
+    # are skipped. Buy orders which are found to have no match are added to the cleared set and included in the
+    # buy index. Returns the match (or None) and the position of the buy order that was matched
+    def find_matching_orders_incremental(self, price, buy_index, start, sell_index, cleared):
+
+        # matching is buy-side friendly, so start with buys first
+        buy_orders = buy_index.orders
+        for position in range(start, len(buy_orders)):
+            buy_order = buy_orders[position]
+            if buy_order == None or buy_order in cleared:
+                continue
+            # the first sell order which is big enough for the buy order's MES and whose MES the buy order is big
+            # enough for
+            sell_order = sell_index.first(buy_order.MES, buy_order.quantity_remaining)
+            if sell_order != None:
+                match_info = {
+                    "buy_order": buy_order,
+                    "sell_order": sell_order,
+                    "price": price
+                }
+                return [match_info, position]
+            # this buy order does not match any sell order
+            cleared.add(buy_order)
+            buy_index.include(buy_order)
+
+        # if no match can be found, return None
+        return [None, len(buy_orders)]
+
+    # trades occur at the given time at the given price. This produces the same trades as execute_trades_reference
+    # but remembers which buy orders have already been checked, so that after each trade only the orders changed
+    # by that trade are checked again. Each side is split once into the orders that can trade at the price and
+    # those that can't, and only the orders that can are ever paired up. Both sides are indexed by size, unless there
+    # are too few pairs of orders that can trade for the indexes to be worth building, in which case every pair of
+    # them is checked
+    def execute_trades_incremental(self, time, price):
+
+        # a list of all the trades made
+        trades = []
+
+        # the orders on each side which can trade at this price, in the same order as the book
+        buy_orders = self.buy_side.price_eligible_orders(price)
+        sell_orders = self.sell_side.price_eligible_orders(price)
+        if len(buy_orders) * len(sell_orders) < self.index_threshold:
+            return self.execute_trades_pairwise(time, price, buy_orders, sell_orders)
+
+        # index both sides. The buy index only includes the cleared buy orders, which are known not to match any of
+        # the sell orders in the book, so that the ones which match a sell order that has changed can be found quickly
+        buy_index = Quantity_Index(buy_orders, 'quantity_remaining', False)
+        sell_index = Quantity_Index(sell_orders, 'quantity_remaining')
+        cleared = set()
+
+        # find a match between a buy order a sell order
+        [match_info, start] = self.find_matching_orders_incremental(price, buy_index, 0, sell_index, cleared)
+
+        # keep on going until no more matches can be found
+        while match_info != None:
+
+            # execute the trade with the matched orders
+            trade = self.execute_trade(time, match_info)
+
+            # add the trade information to the list of trades
+            trades.append(trade)
+
+            # keep the indexes in step with the book
+            buy_order = match_info["buy_order"]
+            sell_order = match_info["sell_order"]
+            if buy_order.quantity_remaining > 0:
+                buy_index.update(buy_order)
+            else:
+                buy_index.remove(buy_order)
+            if sell_order.quantity_remaining > 0:
+                sell_index.update(sell_order)
+            else:
+                sell_index.remove(sell_order)
+
+            # only the two traded orders have changed. The buy order is not in the cleared set so it will be checked
+            # again anyway. If the sell order has quantity left over then its quantity remaining and MES have gone
+            # down, so it may now match cleared buy orders that it did not match before
+            if sell_order.quantity_remaining > 0:
+                buy_order = buy_index.first(sell_order.MES, sell_order.quantity_remaining)
+                while buy_order != None:
+                    cleared.remove(buy_order)
+                    buy_index.exclude(buy_order)
+                    start = min(start, buy_index.positions[buy_order])
+                    buy_order = buy_index.first(sell_order.MES, sell_order.quantity_remaining)
+
+            # find another match
+            [match_info, start] = self.find_matching_orders_incremental(price, buy_index, start, sell_index, cleared)
+
+        # return the list of trades
+        return trades
+
+
+    # write the trades on the tape to an open output file, one per line
+    def write_tape_trades(self, dumpfile):
+        # read the columns of the tape directly
+        tape = self.tape
+        for i in range(0, len(tape)):
+            if tape.event_types[i] == Tape.TRADE:
+                if tape.flags[i] & Tape.BDS_FLAG:
+                    BDS = "Yes"
+                else:
+                    BDS = ""
+                dumpfile.write('%.2f, %s, %s, %s, %s, %s\n' % (tape.times[i], tape.trader_ids[tape.buyers[i]],
+                    tape.trader_ids[tape.sellers[i]], tape.value(tape.quantities, i, Tape.INT_QUANTITY_FLAG),
+                    tape.value(tape.prices, i, Tape.INT_PRICE_FLAG), BDS))
+
     # write the tape to an output file
     def tape_dump(self, fname, fmode, tmode):
         dumpfile = open(fname, fmode)
         # write the title for each column
         dumpfile.write('time, buyer, seller, quantity, price, BDS\n')
         # write the information for each trade
-        for tapeitem in self.tape:
-            if tapeitem['type'] == 'Trade' :
-                if tapeitem['BDS']:
-                    BDS = "Yes"
-                else:
-                    BDS = ""
-                dumpfile.write('%.2f, %s, %s, %s, %s, %s\n' % (tapeitem['time'], tapeitem['buyer'], tapeitem['seller'], tapeitem['quantity'], tapeitem['price'], BDS))
+        self.write_tape_trades(dumpfile)
         dumpfile.close()
         if tmode == 'wipe':
-            self.tape = []
+            self.tape = Tape()
+
+    # start streaming the tape to an output file. Whenever the tape holds buffer_size events their trades are written
+    # to the file and the tape is emptied, so the tape never holds more than buffer_size events. The finished file is
+    # the same as the one tape_dump would have written
+    def start_tape_stream(self, fname, fmode, buffer_size):
+        self.tape_stream = open(fname, fmode)
+        self.tape_buffer_size = buffer_size
+        # write the title for each column
+        self.tape_stream.write('time, buyer, seller, quantity, price, BDS\n')
+
+    # if the tape is being streamed and is full, write its trades out and start a new tape
+    def check_tape_stream(self):
+        if self.tape_stream != None and len(self.tape) >= self.tape_buffer_size:
+            self.write_tape_trades(self.tape_stream)
+            self.tape = Tape()
+
+    # write out the rest of the tape and close the stream
+    def end_tape_stream(self):
+        self.write_tape_trades(self.tape_stream)
+        self.tape = Tape()
+        self.tape_stream.close()
+        self.tape_stream = None
 
     # print the current orders in the orders dictionary
     def print_traders(self):
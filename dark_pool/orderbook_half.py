@@ -1,29 +1,45 @@
 from orders import *
+from sorted_list import *
 
-# Orderbook_half is one side of the book: a list of bids or a list of asks, each sorted best-first
+# the priority of an order within one half of the book. Orders are sorted by size (the original quantity, largest
+# first) and then by time (earliest first), so a smaller key means a higher priority
+def order_priority(order):
+    return (-order.quantity, order.time)
+
+# Orderbook_half is one side of the book: a list of bids or a list of asks, each sorted best-first. The orders are kept
+# in a Sorted_List under a priority key made from their size and time, and each trader's key is kept as a handle on
+# their order, so that an order can be added, found and removed without scanning the others. Each key ends with a
+# sequence number which is increased for every order added, so orders with the same size and time stay in the order
+# they were added and every key is unique
 class Orderbook_half:
 
     def __init__(self, booktype):
         # booktype: bids or asks?
         self.booktype = booktype
-        # a dictionary containing all traders that currently have orders in this side of the order book and the 
-        # amount of orders they have
+        # a dictionary containing all traders that currently have orders in this side of the order book, mapped to
+        # their resting order
         self.traders = {}
-        # list of orders received, sorted by size and then time
-        self.orders = []
+        # a dictionary mapping the tid of each trader in this side of the book to the key of their order
+        self.trader_keys = {}
+        # the sequence number to be given to the next order added
+        self.sequence = 0
+        # the orders received, sorted by size and then time
+        self.sorted_orders = Sorted_List()
+
+    # the list of orders, sorted by size and then time
+    @property
+    def orders(self):
+        return self.sorted_orders.values()
+
+    # the priority key of an order added to this side of the book now
+    def next_key(self, order):
+        return (-order.quantity, order.time, self.sequence)
 
     # find the position to insert the order into the order_book list such that the order_book list maintains
-    # it's ordering of (size,time) (where size is the original quantity of the order)
+    # it's ordering of (size,time) (where size is the original quantity of the order). The new order has the highest
+    # sequence number, so it goes after any orders with the same size and time
     def find_order_position(self, order):
-        quantity = order.quantity
-        time = order.time
-        position = 0
-        for i in range(0,len(self.orders)):
-            if quantity > self.orders[i].quantity or (quantity == self.orders[i].quantity and time < self.orders[i].time):
-                break
-            else:
-                position += 1
-        return position
+        return self.sorted_orders.position(self.next_key(order))
 
     # add the order to the order_book list
     def book_add(self, order):
@@ -35,32 +51,42 @@ class Orderbook_half:
             response = 'Overwrite'
         else:
             response = 'Addition'
-        
-        # add the trader to the traders dictionary
-        self.traders[order.trader_id] = 1
+
+        # add the trader and their order to the traders dictionary
+        key = self.next_key(order)
+        self.sequence += 1
+        self.traders[order.trader_id] = order
+        self.trader_keys[order.trader_id] = key
 
         # add the order to order_book list
-        position = self.find_order_position(order)
-        self.orders.insert(position, order)
+        self.sorted_orders.add(key, order)
 
         # return whether this was an addition or an overwrite
         return response
 
-    # delete all orders made by the trader with the given tid
+    # delete the order made by the trader with the given tid
     def book_del(self, tid):
-        if self.traders.get(tid) != None:
-            
-            # delete all orders made by the trader
-            i = 0
-            while i < len(self.orders):
-                if self.orders[i].trader_id == tid:
-                    self.orders.pop(i)
-                    i -= 1
-                i += 1
-
-            # delete the trader from the traders dictinary
+        order = self.traders.get(tid)
+        if order != None:
+
+            # remove the trader's resting order from the list, which its key finds without searching
+            self.sorted_orders.remove(self.trader_keys[tid])
+
+            # delete the trader from the traders dictionaries
+            del(self.trader_keys[tid])
             del(self.traders[tid])
 
+    # keep the orders list sorted after the quantity remaining (and MES) of a resting order has been changed by a
+    # trade. The order is sorted by its original quantity and its time, so it stays where it is, unless it is
+    # followed by orders with the same size and time. Deleting and re-adding the order would put it after them, so
+    # in that case it is deleted and re-added
+    def book_update(self, order):
+        key = self.trader_keys[order.trader_id]
+        next_key = self.sorted_orders.key_after(key)
+        if next_key != None and next_key[:2] == key[:2]:
+            self.book_del(order.trader_id)
+            self.book_add(order)
+
     # check whether a given trader has an order in this half of the order book
     def trader_has_order(self, trader_id):
         if self.traders.get(trader_id) != None:
@@ -72,16 +98,80 @@ class Orderbook_half:
     def get_orders(self):
         return self.orders
 
+    # check whether an order on this side of the book can trade at the given price
+    def price_eligible(self, order, price):
+        if order.limit_price == None:
+            return True
+        elif self.booktype == 'Buy':
+            return order.limit_price >= price
+        else:
+            return order.limit_price <= price
+
+    # return the orders which can trade at the given price, in the same order as the orders list
+    def price_eligible_orders(self, price):
+        return [order for order in self.sorted_orders if self.price_eligible(order, price)]
+
     # return the dictionary of traders
     def get_traders(self):
         return self.traders
 
-    # print the current traders
+    # print the current traders and their orders
     def print_traders(self):
         for key in self.traders:
-            print("%s: %d" % (key, self.traders[key]))
+            print("%s: %s" % (key, self.traders[key]))
 
     # print the current orders
     def print_orders(self):
-        for order in self.orders:
-            print(order)
\ No newline at end of file
+        for order in self.sorted_orders:
+            print(order)
+
+
+# Orderbook_half_bisect is an alternative engine for one side of the book. The orders are kept in the same way as
+# Orderbook_half, and are also indexed by limit price in a second Sorted_List so that the orders which can trade at a
+# given price can be found without looking at the others
+class Orderbook_half_bisect(Orderbook_half):
+
+    def __init__(self, booktype):
+        Orderbook_half.__init__(self, booktype)
+        # the orders keyed by (limit price, priority key), so sorted by limit price. An order with no limit price can
+        # trade at any price, so it is given the limit price which is best for this side
+        self.price_index = Sorted_List()
+
+    # the limit price of an order as used in the price index
+    def index_price(self, order):
+        if order.limit_price != None:
+            return order.limit_price
+        elif self.booktype == 'Buy':
+            return float('inf')
+        else:
+            return float('-inf')
+
+    # add the order to the order_book list and to the price index
+    def book_add(self, order):
+        response = Orderbook_half.book_add(self, order)
+        self.price_index.add((self.index_price(order), self.trader_keys[order.trader_id]), order)
+        return response
+
+    # delete the order made by the trader with the given tid
+    def book_del(self, tid):
+        order = self.traders.get(tid)
+        if order != None:
+
+            # remove the order from the price index. This relies on the limit price of a resting order never being
+            # changed
+            self.price_index.remove((self.index_price(order), self.trader_keys[tid]))
+
+            Orderbook_half.book_del(self, tid)
+
+    # return the orders which can trade at the given price, in the same order as the orders list. The price index
+    # gives the eligible orders directly, and only those are sorted back into priority order
+    def price_eligible_orders(self, price):
+        if self.booktype == 'Buy':
+            eligible = self.price_index.items_between((price,))
+        else:
+            eligible = self.price_index.items_between(None, (price, (float('inf'),)))
+        # if every order is eligible then there is nothing to sort
+        if len(eligible) == len(self.price_index):
+            return self.orders
+        eligible = sorted([(price_key[1], order) for (price_key, order) in eligible])
+        return [order for (key, order) in eligible]
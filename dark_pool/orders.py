@@ -33,6 +33,27 @@ class Order:
             self.quantity, self.quantity_remaining, self.limit_price, self.MES)
 
 
+# A stand-in for a resting order, used to work out what would trade without changing the order book. It shares the
+# order's fixed details but has its own quantity remaining and MES, which are the only things a trade changes
+class Probe_Order:
+
+    def __init__(self, order):
+        self.order = order
+        self.id = order.id
+        self.time = order.time
+        self.trader_id = order.trader_id
+        self.otype = order.otype
+        self.quantity = order.quantity
+        self.limit_price = order.limit_price
+        self.MES = order.MES
+        self.BDS = order.BDS
+        self.quantity_remaining = order.quantity_remaining
+
+    def __str__(self):
+        return 'Probe: [ID=%d T=%5.2f %s %s Q=%s QR=%s P=%s MES=%s]' % (self.id, self.time, self.trader_id, self.otype,
+            self.quantity, self.quantity_remaining, self.limit_price, self.MES)
+
+
 # A block indication created by a trader for the exchange
 class Block_Indication:
 
@@ -0,0 +1,43 @@
+import heapq
+
+# Pending_Orders is the schedule of customer orders waiting to be issued. The orders are kept in a heap by issue
+# time, so the orders now due can be taken off without looking at the rest. Orders that fall due together are issued
+# in the order they were added, which is the order the list of pending orders used to be in. Iterating over it gives
+# the orders still pending in that order too. The same class is used by BSE.py and BSE2.py
+class Pending_Orders:
+
+    def __init__(self, orders=[]):
+        # heap entries are (issue time, position the order was added in, order)
+        self.heap = []
+        self.count = 0
+        for order in orders:
+            self.push(order)
+
+    def __len__(self):
+        return len(self.heap)
+
+    # add an order to the schedule
+    def push(self, order):
+        heapq.heappush(self.heap, (order.time, self.count, order))
+        self.count += 1
+
+    # the orders still pending, in the order they were added
+    def orders(self):
+        return [entry[2] for entry in sorted(self.heap, key=lambda entry: entry[1])]
+
+    def __iter__(self):
+        return iter(self.orders())
+
+    # the earliest issue time of the orders still pending, or None if there are none
+    def next_time(self):
+        if len(self.heap) == 0:
+            return None
+        return self.heap[0][0]
+
+    # remove and return the orders whose issue time is before the given time, in the order they were added
+    def pop_due(self, time):
+        due = []
+        while len(self.heap) > 0 and self.heap[0][0] < time:
+            due.append(heapq.heappop(self.heap))
+        due.sort(key=lambda entry: entry[1])
+        return [entry[2] for entry in due]
@@ -0,0 +1,128 @@
+from orderbook_half import *
+
+# Quantity_Index is a segment tree over a list of orders which is kept in the same order as the book. For each range
+# of the list it stores the largest quantity and the smallest MES of the orders in that range, so the first order
+# with a quantity of at least X and an MES of at most Y can be found without checking every order. An order with no
+# MES is stored with an MES of -infinity, as it will accept any size. Removed orders are left as empty slots.
+# Orders can also be excluded from searches while keeping their slot, so that a search only looks at some of them.
+#
+# The two bounds are kept separately, so a range can pass both checks because one order is big enough and a different
+# order has a small enough MES, without any single order passing both. The search then goes down into that range and
+# has to come back out. When only one of the bounds rules orders out, as when no order has an MES, a search looks at
+# O(log n) nodes, but in the worst case, with many orders that each fail one of the two bounds, it looks at O(n)
+# nodes. This is still no worse than checking every order in turn
+class Quantity_Index:
+
+    # quantity_attribute is the name of the order's quantity used for matching: 'quantity_remaining' for orders and
+    # 'quantity' for block indications. included says whether the orders start off included in searches
+    def __init__(self, orders, quantity_attribute, included=True):
+        self.quantity_attribute = quantity_attribute
+        # the orders in book order, with None in the slots of removed orders
+        self.orders = list(orders)
+        # the orders which are included in searches
+        if included:
+            self.included = set(self.orders)
+        else:
+            self.included = set()
+        # a dictionary mapping each order to its slot
+        self.positions = {}
+        # the number of leaves in the tree, a power of two
+        self.size = 1
+        while self.size < len(self.orders):
+            self.size *= 2
+        # the largest quantity and smallest MES below each node. Node 1 is the root and the children of node i are
+        # 2i and 2i+1. Empty slots can never be returned as their MES is +infinity
+        self.max_quantity = [float('-inf')] * (2 * self.size)
+        self.min_MES = [float('inf')] * (2 * self.size)
+        # the number of nodes looked at by the searches, and the number of orders that were checked against the
+        # bounds of a search
+        self.examined = 0
+        self.compared = 0
+
+        # fill in the leaves and then the rest of the tree
+        for i in range(0, len(self.orders)):
+            self.positions[self.orders[i]] = i
+            (self.max_quantity[self.size + i], self.min_MES[self.size + i]) = self.leaf_values(self.orders[i])
+        for node in range(self.size - 1, 0, -1):
+            self.max_quantity[node] = max(self.max_quantity[2 * node], self.max_quantity[2 * node + 1])
+            self.min_MES[node] = min(self.min_MES[2 * node], self.min_MES[2 * node + 1])
+
+    # the values stored in the tree for an order
+    def leaf_values(self, order):
+        if order == None or order not in self.included:
+            return (float('-inf'), float('inf'))
+        elif order.MES == None:
+            return (getattr(order, self.quantity_attribute), float('-inf'))
+        else:
+            return (getattr(order, self.quantity_attribute), order.MES)
+
+    # recalculate the values for a slot and all of the nodes above it
+    def set_slot(self, position):
+        node = self.size + position
+        (self.max_quantity[node], self.min_MES[node]) = self.leaf_values(self.orders[position])
+        node = node // 2
+        while node > 0:
+            self.max_quantity[node] = max(self.max_quantity[2 * node], self.max_quantity[2 * node + 1])
+            self.min_MES[node] = min(self.min_MES[2 * node], self.min_MES[2 * node + 1])
+            node = node // 2
+
+    # remove an order from the index
+    def remove(self, order):
+        position = self.positions.pop(order)
+        self.orders[position] = None
+        self.included.discard(order)
+        self.set_slot(position)
+
+    # include an order in searches
+    def include(self, order):
+        self.included.add(order)
+        self.set_slot(self.positions[order])
+
+    # exclude an order from searches, keeping its slot
+    def exclude(self, order):
+        self.included.discard(order)
+        self.set_slot(self.positions[order])
+
+    # update the index after the quantity or MES of an order has changed. book_update moves a partially filled order
+    # after any orders with the same size and time, so it is moved to the same place here
+    def update(self, order):
+        position = self.positions[order]
+        key = order_priority(order)
+        end = position
+        while end + 1 < len(self.orders) and (self.orders[end + 1] == None or
+                                              order_priority(self.orders[end + 1]) == key):
+            end += 1
+        # shift the orders in between back by one slot
+        for i in range(position, end):
+            self.orders[i] = self.orders[i + 1]
+            if self.orders[i] != None:
+                self.positions[self.orders[i]] = i
+            self.set_slot(i)
+        self.orders[end] = order
+        self.positions[order] = end
+        self.set_slot(end)
+
+    # return the first order with a quantity of at least min_quantity and an MES of at most max_MES, or None if
+    # there isn't one. min_quantity is None if there is no lower limit on the quantity
+    def first(self, min_quantity, max_MES):
+        if min_quantity == None:
+            min_quantity = float('-inf')
+        return self.search(1, min_quantity, max_MES)
+
+    # search the tree below the given node, going left first so that the first order in book order is found
+    def search(self, node, min_quantity, max_MES):
+        self.examined += 1
+        # a leaf holding an order which is included in searches is checked against the bounds
+        position = node - self.size
+        if position >= 0 and position < len(self.orders) and self.orders[position] in self.included:
+            self.compared += 1
+        # no order below this node can match
+        if self.max_quantity[node] < min_quantity or self.min_MES[node] > max_MES:
+            return None
+        # a leaf which passes both checks is a match
+        if node >= self.size:
+            return self.orders[node - self.size]
+        order = self.search(2 * node, min_quantity, max_MES)
+        if order == None:
+            order = self.search(2 * node + 1, min_quantity, max_MES)
+        return order
@@ -0,0 +1,131 @@
+import numpy
+
+# Reputation_Store holds the last 50 event reputational scores of every trader in one NumPy matrix, with a row for each
+# trader, rather than in an Event_Scores object per trader. It can be used in place of the dictionary of Event_Scores
+# in a Block_Indication_Book:
+#     block_indication_book.event_reputational_scores = Reputation_Store()
+# A book keeps its dictionary unless it is given a store, so only sessions which choose the store need NumPy.
+#
+# Each row is a ring buffer like Event_Scores. heads gives the column holding each trader's most recent score, and the
+# plain and weighted sums of each row are kept up to date as scores are added (see Event_Scores for how)
+#
+# The scores are kept in an int16, the same as in the binary composite reputational scores history. Scores worked out
+# by the book are between 0 and 100, but the initial reputational score is a setting which can be given any value, so
+# a score that doesn't fit raises a ValueError rather than wrapping around
+SCORE_MIN = -32768
+SCORE_MAX = 32767
+
+
+class Reputation_Store:
+
+    def __init__(self, size=50, capacity=64):
+        self.size = size
+        # the scores of each trader
+        self.matrix = numpy.zeros((capacity, size), dtype=numpy.int16)
+        # for each row: the column of the most recent score, the number of scores, and the two sums
+        self.heads = numpy.zeros(capacity, dtype=numpy.int64)
+        self.counts = numpy.zeros(capacity, dtype=numpy.int64)
+        self.totals = numpy.zeros(capacity, dtype=numpy.int64)
+        self.weighted_totals = numpy.zeros(capacity, dtype=numpy.int64)
+        # the trader ids in row order and a dictionary giving the row of each trader
+        self.trader_ids = []
+        self.rows = {}
+
+    # the number of traders in the store
+    def __len__(self):
+        return len(self.trader_ids)
+
+    # iterate over the trader ids, like a dictionary
+    def __iter__(self):
+        return iter(self.trader_ids)
+
+    def __contains__(self, trader_id):
+        return trader_id in self.rows
+
+    # the trader ids, like a dictionary
+    def keys(self):
+        return list(self.trader_ids)
+
+    # the scores of a trader, as a Reputation_Row which behaves like Event_Scores
+    def __getitem__(self, trader_id):
+        return Reputation_Row(self, self.rows[trader_id])
+
+    # give a trader a new row holding the given scores, most recent first. This is how the Block_Indication_Book adds
+    # a new trader, by assigning to the dictionary of event scores
+    def __setitem__(self, trader_id, scores):
+        row = self.rows.get(trader_id)
+        if row == None:
+            row = len(self.trader_ids)
+            if row == self.matrix.shape[0]:
+                self.grow()
+            self.trader_ids.append(trader_id)
+            self.rows[trader_id] = row
+        self.heads[row] = 0
+        self.counts[row] = 0
+        self.totals[row] = 0
+        self.weighted_totals[row] = 0
+        for score in reversed(list(scores)[:self.size]):
+            self.add(row, score)
+
+    # double the number of rows
+    def grow(self):
+        capacity = 2 * self.matrix.shape[0]
+        matrix = numpy.zeros((capacity, self.size), dtype=numpy.int16)
+        matrix[:self.matrix.shape[0]] = self.matrix
+        self.matrix = matrix
+        for name in ['heads', 'counts', 'totals', 'weighted_totals']:
+            column = numpy.zeros(capacity, dtype=numpy.int64)
+            column[:len(getattr(self, name))] = getattr(self, name)
+            setattr(self, name, column)
+
+    # add a new score to a row, dropping the oldest one if the row is full
+    def add(self, row, score):
+        score = int(score)
+        if score < SCORE_MIN or score > SCORE_MAX:
+            raise ValueError('reputational score %d does not fit in the reputation store' % score)
+        self.weighted_totals[row] += self.size * score - self.totals[row]
+        self.totals[row] += score
+        head = (self.heads[row] - 1) % self.size
+        if self.counts[row] == self.size:
+            self.totals[row] -= self.matrix[row, head]
+        else:
+            self.counts[row] += 1
+        self.matrix[row, head] = score
+        self.heads[row] = head
+
+
+# Reputation_Row is the view of one trader's scores in a Reputation_Store. It can be used in the same way as
+# Event_Scores
+class Reputation_Row(object):
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    # add a new score, dropping the oldest one if the row is full
+    def add(self, score):
+        self.store.add(self.row, score)
+
+    # the sum of the scores, each multiplied by its weighting
+    @property
+    def weighted_total(self):
+        return int(self.store.weighted_totals[self.row])
+
+    # the sum of the scores
+    @property
+    def total(self):
+        return int(self.store.totals[self.row])
+
+    def __len__(self):
+        return int(self.store.counts[self.row])
+
+    # the i-th most recent score
+    def __getitem__(self, i):
+        if i < 0 or i >= len(self):
+            raise IndexError('event score index out of range')
+        return int(self.store.matrix[self.row, (self.store.heads[self.row] + i) % self.store.size])
+
+    # iterate over the scores, most recent first
+    def __iter__(self):
+        for i in range(0, len(self)):
+            yield self[i]
@@ -0,0 +1,145 @@
+import numpy
+
+from orders import *
+
+# Batch generation of customer orders. customer_orders makes a replenishment cycle one trader at a time; this makes a
+# whole cycle at once with NumPy, from a seeded numpy.random.RandomState, and returns it as a structured array with a
+# row for each customer order. customer_orders only imports this module when the order schedule asks for the 'numpy'
+# generator.
+#
+# The order schedule os is in the same form as for customer_orders. The step modes are 'fixed', 'jittered' and
+# 'random', and the time modes are 'periodic', 'drip-fixed', 'drip-jitter' and 'drip-poisson'. Prices are clipped to
+# minprice and maxprice, which default to bse_sys_minprice and bse_sys_maxprice of dark_pool.py.
+
+# the columns of a batch. otype is BUY or SELL, and trader is the trader's number on its side, so trader 3 of the buy
+# side is B03
+SCHEDULE_DTYPE = numpy.dtype([('time', 'f8'), ('otype', 'i1'), ('trader', 'i4'), ('price', 'i8'), ('quantity', 'i8')])
+BUY = 0
+SELL = 1
+
+
+# the issue times of the orders of n_traders traders, relative to the start of the cycle
+def issue_times(n_traders, mode, interval, shuffle, fittointerval, rng):
+    interval = float(interval)
+    if n_traders < 1:
+        raise ValueError('n_traders < 1 in issue_times()')
+    elif n_traders == 1:
+        tstep = interval
+    else:
+        tstep = interval / (n_traders - 1)
+    steps = numpy.arange(n_traders) * tstep
+
+    if mode == 'periodic':
+        times = numpy.ones(n_traders) * interval
+    elif mode == 'drip-fixed':
+        times = steps
+    elif mode == 'drip-jitter':
+        times = steps + tstep * rng.random_sample(n_traders)
+    elif mode == 'drip-poisson':
+        times = numpy.cumsum(rng.exponential(interval / n_traders, n_traders))
+    else:
+        raise ValueError('unknown time-mode %s in issue_times()' % mode)
+
+    # squish the times so that the last arrival falls at the end of the interval
+    if fittointerval and times[-1] != interval:
+        times = interval * (times / times[-1])
+    # optionally randomly shuffle the times
+    if shuffle:
+        times = rng.permutation(times)
+    return times
+
+
+# the price ranges and step mode of the schedule in force at the given time. Like getschedmode in customer_orders,
+# if more than one schedule covers the time the last one is used
+def schedule_mode(time, schedules):
+    found = None
+    for sched in schedules:
+        if sched['from'] <= time and time < sched['to']:
+            found = (sched['price_ranges'], sched['stepmode'])
+    if found == None:
+        raise ValueError('time=%5.2f not within any timezone in os=%s' % (time, schedules))
+    return found
+
+
+# the prices of the orders of n_traders traders with the given issue times
+def order_prices(n_traders, sched, mode, times, minprice, maxprice, rng):
+
+    # the dynamic offsets of the first range, if it has any, are worked out for each issue time
+    if len(sched[0]) > 2:
+        offset_min = numpy.array([sched[0][2](t) for t in times], dtype=float)
+        if len(sched[0]) > 3:
+            offset_max = numpy.array([sched[0][3](t) for t in times], dtype=float)
+        else:
+            offset_max = offset_min
+    else:
+        offset_min = numpy.zeros(n_traders)
+        offset_max = offset_min
+
+    pmin = numpy.clip(offset_min + min(sched[0][0], sched[0][1]), minprice, maxprice)
+    pmax = numpy.clip(offset_max + max(sched[0][0], sched[0][1]), minprice, maxprice)
+    stepsize = (pmax - pmin) / max(n_traders - 1, 1)
+    steps = numpy.arange(n_traders)
+
+    if mode == 'fixed':
+        prices = pmin + (steps * stepsize).astype(numpy.int64)
+    elif mode == 'jittered':
+        halfstep = numpy.floor(stepsize / 2.0 + 0.5).astype(numpy.int64)
+        jitter = numpy.floor(rng.random_sample(n_traders) * (2 * halfstep + 1)).astype(numpy.int64) - halfstep
+        prices = pmin + (steps * stepsize).astype(numpy.int64) + jitter
+    elif mode == 'random':
+        # with more than one range, each order chooses one equiprobably
+        lows = numpy.array([min(r[0], r[1]) for r in sched])
+        highs = numpy.array([max(r[0], r[1]) for r in sched])
+        if len(sched) > 1:
+            choice = rng.randint(0, len(sched), n_traders)
+            low = numpy.clip(lows[choice], minprice, maxprice)
+            high = numpy.clip(highs[choice], minprice, maxprice)
+        else:
+            low = pmin
+            high = pmax
+        prices = low + numpy.floor(rng.random_sample(n_traders) * (high - low + 1))
+    else:
+        raise ValueError('unknown step mode %s' % mode)
+
+    return numpy.clip(prices, minprice, maxprice).astype(numpy.int64)
+
+
+# make a whole replenishment cycle of customer orders starting at the given time, buyers first and then sellers as in
+# customer_orders. Returns a structured array of SCHEDULE_DTYPE
+def generate_schedule(time, n_buyers, n_sellers, os, rng, shuffle=True, minprice=1, maxprice=1000):
+    batch = numpy.zeros(n_buyers + n_sellers, dtype=SCHEDULE_DTYPE)
+    quantity_min = os['quantity_range'][0]
+    quantity_max = os['quantity_range'][1]
+
+    for (otype, start, n, schedules) in [(BUY, 0, n_buyers, os['dem']), (SELL, n_buyers, n_sellers, os['sup'])]:
+        if n == 0:
+            continue
+        rows = batch[start:start + n]
+        rows['otype'] = otype
+        rows['trader'] = numpy.arange(n)
+        rows['time'] = time + issue_times(n, os['timemode'], os['interval'], shuffle, True, rng)
+        (sched, mode) = schedule_mode(time, schedules)
+        rows['price'] = order_prices(n, sched, mode, rows['time'], minprice, maxprice, rng)
+        rows['quantity'] = rng.randint(quantity_min, quantity_max + 1, n)
+
+    return batch
+
+
+# the trader id of a row of a batch
+def schedule_trader_id(row):
+    if row['otype'] == BUY:
+        return 'B%02d' % row['trader']
+    return 'S%02d' % row['trader']
+
+
+# turn a batch into Customer_Orders, for use with customer_orders and Pending_Orders
+def schedule_customer_orders(batch):
+    orders = []
+    for row in batch:
+        if row['otype'] == BUY:
+            otype = 'Buy'
+        else:
+            otype = 'Sell'
+        orders.append(Customer_Order(float(row['time']), schedule_trader_id(row), otype, int(row['price']),
+                                     int(row['quantity'])))
+    return orders
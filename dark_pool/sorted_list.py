@@ -0,0 +1,138 @@
+import bisect
+
+# Sorted_List keeps (key, value) entries sorted by key, where every key is unique. The entries are held in a list of
+# chunks, each sorted and holding between about load/2 and 2*load entries, along with the largest key in each chunk.
+# Finding an entry is a binary search over the chunks and then within one chunk, and adding or removing an entry only
+# moves the entries of that one chunk, so neither gets slower as the list grows in the way that inserting into or
+# deleting from one long list does. A chunk that grows past 2*load entries is split in two, and one that shrinks
+# below load/2 entries is merged with its neighbour
+class Sorted_List:
+
+    def __init__(self, load=512):
+        # the number of entries a chunk is split into
+        self.load = load
+        # the chunks of (key, value) entries, in key order
+        self.chunks = []
+        # the largest key in each chunk
+        self.maxes = []
+        # the total number of entries
+        self.length = 0
+
+    # the number of entries
+    def __len__(self):
+        return self.length
+
+    # the index of the chunk which holds the given key, or which it would be added to
+    def find_chunk(self, key):
+        i = bisect.bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            i -= 1
+        return i
+
+    # split a chunk in two if it has grown too big
+    def split_chunk(self, i):
+        chunk = self.chunks[i]
+        if len(chunk) > 2 * self.load:
+            self.chunks.insert(i + 1, chunk[self.load:])
+            del(chunk[self.load:])
+            self.maxes[i] = chunk[-1][0]
+            self.maxes.insert(i + 1, self.chunks[i + 1][-1][0])
+
+    # add an entry. The key must not already be in the list
+    def add(self, key, value):
+        if self.length == 0:
+            self.chunks = [[(key, value)]]
+            self.maxes = [key]
+        else:
+            i = self.find_chunk(key)
+            chunk = self.chunks[i]
+            # (key,) comes before (key, value) so this finds the position of the key whatever the value is
+            chunk.insert(bisect.bisect_left(chunk, (key,)), (key, value))
+            self.maxes[i] = chunk[-1][0]
+            self.split_chunk(i)
+        self.length += 1
+
+    # remove the entry with the given key and return its value
+    def remove(self, key):
+        i = self.find_chunk(key)
+        if i < 0:
+            raise KeyError(key)
+        chunk = self.chunks[i]
+        j = bisect.bisect_left(chunk, (key,))
+        if j == len(chunk) or chunk[j][0] != key:
+            raise KeyError(key)
+        value = chunk[j][1]
+        del(chunk[j])
+        self.length -= 1
+
+        if len(chunk) == 0:
+            del(self.chunks[i])
+            del(self.maxes[i])
+        else:
+            self.maxes[i] = chunk[-1][0]
+            # merge a small chunk into the one after it (or before it, if it is the last), then split the merged
+            # chunk again if it is now too big
+            if len(chunk) < self.load // 2 and len(self.chunks) > 1:
+                if i == len(self.chunks) - 1:
+                    i -= 1
+                self.chunks[i].extend(self.chunks[i + 1])
+                self.maxes[i] = self.maxes[i + 1]
+                del(self.chunks[i + 1])
+                del(self.maxes[i + 1])
+                self.split_chunk(i)
+        return value
+
+    # the key of the entry after the entry with the given key, or None if it is the last
+    def key_after(self, key):
+        i = self.find_chunk(key)
+        chunk = self.chunks[i]
+        j = bisect.bisect_left(chunk, (key,)) + 1
+        if j < len(chunk):
+            return chunk[j][0]
+        elif i + 1 < len(self.chunks):
+            return self.chunks[i + 1][0][0]
+        else:
+            return None
+
+    # the number of entries with keys less than the given key
+    def position(self, key):
+        if self.length == 0:
+            return 0
+        i = bisect.bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            return self.length
+        return sum([len(chunk) for chunk in self.chunks[:i]]) + bisect.bisect_left(self.chunks[i], (key,))
+
+    # the (key, value) entries with start <= key < end, in key order. With no start or no end, the entries go from
+    # the first or to the last
+    def items_between(self, start=None, end=None):
+        if self.length == 0:
+            return []
+        if start == None:
+            (i, j) = (0, 0)
+        else:
+            i = bisect.bisect_left(self.maxes, start)
+            if i == len(self.maxes):
+                return []
+            j = bisect.bisect_left(self.chunks[i], (start,))
+        items = []
+        while i < len(self.chunks):
+            chunk = self.chunks[i]
+            if end != None and not self.maxes[i] < end:
+                items.extend(chunk[j:bisect.bisect_left(chunk, (end,))])
+                break
+            items.extend(chunk[j:])
+            (i, j) = (i + 1, 0)
+        return items
+
+    # the keys, in order
+    def keys(self):
+        return [key for chunk in self.chunks for (key, value) in chunk]
+
+    # the values, in key order
+    def values(self):
+        return [value for chunk in self.chunks for (key, value) in chunk]
+
+    # iterate over the values in key order
+    def __iter__(self):
+        return iter(self.values())
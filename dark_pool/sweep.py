@@ -0,0 +1,207 @@
+from dark_pool import *
+
+import copy
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import random
+
+# Parameter sweeps run a market session for each cell of a design, where a cell gives a value to each of the
+# parameters being swept. The parameters are the venue settings of the block indication book and the trader settings
+# below. Every cell is run with the same seed, so that the cells differ only in their parameters.
+#
+# Each cell is run in a directory named by the hash of everything that determines its result: the parameters, the
+# rest of the configuration and the seed. When a cell is finished its results are written to result.json in its
+# directory, so a sweep which is interrupted, or run again with more cells, only runs the cells without results.
+
+# the parameters that can be swept. Venue parameters are settings of the block indication book, and trader
+# parameters are settings of every trader
+VENUE_PARAMETERS = ['MIV', 'RST', 'initial_reputational_score']
+TRADER_PARAMETERS = ['BI_threshold', 'QBO_fraction']
+
+
+# a grid design: every combination of the given values. values is a dictionary mapping each parameter to a list of
+# values. The cells are in order of the parameter names, with the last name changing fastest
+def grid_design(values):
+    names = sorted(values.keys())
+    return [dict(zip(names, combination)) for combination in itertools.product(*[values[name] for name in names])]
+
+
+# a random design of n_cells cells, drawn with the given seed. ranges is a dictionary mapping each parameter to either
+# a list of values to choose from or a (low, high) pair. A pair of integers gives whole numbers from low to high
+# inclusive and any other pair gives a uniform value between them
+def random_design(ranges, n_cells, seed=0):
+    rng = random.Random(seed)
+    names = sorted(ranges.keys())
+    cells = []
+    for i in range(0, n_cells):
+        cell = {}
+        for name in names:
+            values = ranges[name]
+            if isinstance(values, list):
+                cell[name] = rng.choice(values)
+            elif isinstance(values[0], (int, long)) and isinstance(values[1], (int, long)):
+                cell[name] = rng.randint(values[0], values[1])
+            else:
+                cell[name] = rng.uniform(values[0], values[1])
+        cells.append(cell)
+    return cells
+
+
+# split a cell into the venue settings for market_session and a copy of the trader specification with the trader
+# settings filled in
+def cell_settings(cell, trader_spec):
+    venue_settings = {}
+    cell_trader_spec = copy.deepcopy(trader_spec)
+    for name in cell:
+        if name in VENUE_PARAMETERS:
+            venue_settings[name] = cell[name]
+        elif name in TRADER_PARAMETERS:
+            cell_trader_spec[name] = cell[name]
+        else:
+            raise ValueError('unknown sweep parameter %s' % name)
+    return [venue_settings, cell_trader_spec]
+
+
+# the value hashed in place of something which can't be written as JSON. A function, such as an offset function in a
+# price range, is named by its module and name, which are the same every time the sweep is run; its repr holds its
+# address in memory, which isn't. A lambda has no name of its own, and anything else has no stable name, so they
+# can't be hashed
+def config_value(value):
+    name = getattr(value, '__name__', None)
+    module = getattr(value, '__module__', None)
+    if callable(value) and name != None and module != None and name != '<lambda>':
+        return '%s.%s' % (module, name)
+    raise ValueError('%r in a sweep configuration has no stable name to hash; use a function defined with def' % value)
+
+
+# the hash of a cell's configuration
+def config_hash(cell, starttime, endtime, trader_spec, order_schedule, seed):
+    config = {
+        'parameters': cell,
+        'starttime': starttime,
+        'endtime': endtime,
+        'trader_spec': trader_spec,
+        'order_schedule': order_schedule,
+        'seed': seed
+    }
+    return hashlib.sha1(json.dumps(config, sort_keys=True, default=config_value)).hexdigest()
+
+
+# the results of a finished cell, or None if it hasn't been finished
+def read_cell_result(cell_dir):
+    fname = os.path.join(cell_dir, 'result.json')
+    if not os.path.isfile(fname):
+        return None
+    result_file = open(fname)
+    result = json.load(result_file)
+    result_file.close()
+    return result
+
+
+# work out the results of a session from its output files: the number of trades, the volume traded, the volume traded
+# through the block discovery service and the average balance of the traders
+def session_results(cell_dir):
+    n_trades = 0
+    volume = 0.0
+    BDS_volume = 0.0
+    tape_file = open(os.path.join(cell_dir, 'transactions.csv'))
+    tape_file.readline()
+    for line in tape_file:
+        fields = [field.strip() for field in line.split(',')]
+        n_trades += 1
+        volume += float(fields[3])
+        if fields[5] == 'Yes':
+            BDS_volume += float(fields[3])
+    tape_file.close()
+
+    # the summary has the total balance and number of traders of each type, after the trial id and the time
+    summary_file = open(os.path.join(cell_dir, 'avg_balance_dark.csv'))
+    fields = [field.strip() for field in summary_file.read().splitlines()[1].split(',')]
+    summary_file.close()
+    balance = 0.0
+    n_traders = 0
+    i = 2
+    while fields[i] != 'N':
+        balance += float(fields[i + 1])
+        n_traders += int(fields[i + 2])
+        i += 4
+
+    return {'n_trades': n_trades, 'volume': volume, 'BDS_volume': BDS_volume, 'avg_balance': balance / n_traders}
+
+
+# run one cell of a sweep and write its results. The arguments are given as one list so that the cell can be run by a
+# process pool. The results are written to a temporary file which is then renamed, so result.json only exists once
+# the cell is finished
+def run_cell(args):
+    [cell, cell_hash, seed, cell_dir, starttime, endtime, trader_spec, order_schedule] = args
+    [venue_settings, cell_trader_spec] = cell_settings(cell, trader_spec)
+    run_trial([cell_hash[:12], seed, cell_dir, starttime, endtime, cell_trader_spec, order_schedule,
+               {'venue_settings': venue_settings}])
+
+    result = session_results(cell_dir)
+    result['parameters'] = cell
+    result['hash'] = cell_hash
+    result_file = open(os.path.join(cell_dir, 'result.json.tmp'), 'w')
+    json.dump(result, result_file, sort_keys=True)
+    result_file.close()
+    os.rename(os.path.join(cell_dir, 'result.json.tmp'), os.path.join(cell_dir, 'result.json'))
+    return result
+
+
+# run a sweep over the cells of a design, across a pool of processes. Cells which already have results in output_dir
+# are not run again. processes is the number of processes, by default the number of cores; with one process the cells
+# are run in this process. The results of every cell, in the order of the design, are written to
+# output_dir/sweep.csv and returned
+def run_sweep(design, starttime, endtime, trader_spec, order_schedule, output_dir='output/sweep', seed=0,
+              processes=None):
+
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    # work out each cell's directory and find the cells which still need to be run. A cell which appears in the
+    # design more than once is only run once
+    results = []
+    jobs = []
+    queued = set()
+    for cell in design:
+        cell_settings(cell, trader_spec)
+        cell_hash = config_hash(cell, starttime, endtime, trader_spec, order_schedule, seed)
+        cell_dir = os.path.join(output_dir, cell_hash)
+        result = read_cell_result(cell_dir)
+        if result == None and cell_hash not in queued:
+            jobs.append([cell, cell_hash, seed, cell_dir, starttime, endtime, trader_spec, order_schedule])
+            queued.add(cell_hash)
+        results.append(result)
+
+    # run the cells
+    if processes == 1:
+        new_results = [run_cell(job) for job in jobs]
+    elif len(jobs) > 0:
+        pool = multiprocessing.Pool(processes)
+        new_results = pool.map(run_cell, jobs)
+        pool.close()
+        pool.join()
+    else:
+        new_results = []
+
+    # fill in the results of the cells that were run
+    finished = dict([(result['hash'], result) for result in new_results])
+    for i in range(0, len(design)):
+        if results[i] == None:
+            results[i] = finished[config_hash(design[i], starttime, endtime, trader_spec, order_schedule, seed)]
+
+    # write the summary of the sweep
+    names = sorted(set([name for cell in design for name in cell]))
+    columns = ['n_trades', 'volume', 'BDS_volume', 'avg_balance']
+    dumpfile = open(os.path.join(output_dir, 'sweep.csv'), 'w')
+    dumpfile.write(', '.join(['hash'] + names + columns) + '\n')
+    for result in results:
+        row = [result['hash']] + [str(result['parameters'].get(name, '')) for name in names] + \
+              [str(result[column]) for column in columns]
+        dumpfile.write(', '.join(row) + '\n')
+    dumpfile.close()
+
+    return results
@@ -0,0 +1,133 @@
+import array
+
+# Tape is the record of the trades and cancellations on the order book. It is stored by column in typed arrays rather
+# than as a list of dictionaries, so each event only takes a few dozen bytes. Trader ids are stored once in a table and
+# each event refers to them by their index. Events are added with append_trade and append_cancel and read back as
+# dictionaries with record, records or by iterating over the tape
+class Tape:
+
+    # the codes used in the event type column
+    TRADE = 0
+    BUY_CANCEL = 1
+    SELL_CANCEL = 2
+
+    # the bits used in the flags column. The price and quantity columns hold floats, so a flag records whether the
+    # value was an integer, so that it can be given back as one. A cancelled order may have no limit price
+    BDS_FLAG = 1
+    INT_PRICE_FLAG = 2
+    INT_QUANTITY_FLAG = 4
+    NO_PRICE_FLAG = 8
+
+    def __init__(self):
+        self.event_types = array.array('b')
+        self.times = array.array('d')
+        self.prices = array.array('d')
+        self.quantities = array.array('d')
+        # for a trade these are the buyer and seller. For a cancellation the buyer column holds the trader who cancelled
+        # and the seller column holds the id of the cancelled order
+        self.buyers = array.array('l')
+        self.sellers = array.array('l')
+        self.flags = array.array('b')
+        # the table of trader ids and a dictionary giving the index of each one
+        self.trader_ids = []
+        self.trader_indexes = {}
+
+    # the number of events on the tape
+    def __len__(self):
+        return len(self.event_types)
+
+    # iterate over the events on the tape as dictionaries
+    def __iter__(self):
+        for i in range(0, len(self)):
+            yield self.record(i)
+
+    # return the index of a trader id in the table, adding it if it is new
+    def trader_index(self, trader_id):
+        index = self.trader_indexes.get(trader_id)
+        if index == None:
+            index = len(self.trader_ids)
+            self.trader_ids.append(trader_id)
+            self.trader_indexes[trader_id] = index
+        return index
+
+    # the flags for a price and a quantity
+    def value_flags(self, price, quantity):
+        flags = 0
+        if price == None:
+            flags |= self.NO_PRICE_FLAG
+        elif isinstance(price, (int, long)):
+            flags |= self.INT_PRICE_FLAG
+        if isinstance(quantity, (int, long)):
+            flags |= self.INT_QUANTITY_FLAG
+        return flags
+
+    # add an event to every column
+    def append(self, event_type, time, price, quantity, buyer, seller, flags):
+        self.event_types.append(event_type)
+        self.times.append(time)
+        if price == None:
+            self.prices.append(0.0)
+        else:
+            self.prices.append(price)
+        self.quantities.append(quantity)
+        self.buyers.append(buyer)
+        self.sellers.append(seller)
+        self.flags.append(flags)
+
+    # add a trade to the tape
+    def append_trade(self, time, price, quantity, buyer, seller, BDS):
+        flags = self.value_flags(price, quantity)
+        if BDS:
+            flags |= self.BDS_FLAG
+        self.append(self.TRADE, time, price, quantity, self.trader_index(buyer), self.trader_index(seller), flags)
+
+    # add the cancellation of an order to the tape. Only the details of the order are kept, not the order itself. The
+    # order may be a trader's last quote, which can also be a block indication, so its original quantity is used
+    def append_cancel(self, time, order):
+        if order.otype == 'Buy':
+            event_type = self.BUY_CANCEL
+        else:
+            event_type = self.SELL_CANCEL
+        self.append(event_type, time, order.limit_price, order.quantity, self.trader_index(order.trader_id), order.id,
+                    self.value_flags(order.limit_price, order.quantity))
+
+    # read a price or quantity back from its column
+    def value(self, column, i, int_flag):
+        if self.flags[i] & int_flag:
+            return int(column[i])
+        return column[i]
+
+    # return the event at position i as a dictionary. Trades have the same keys as the records returned by
+    # Orderbook.execute_trade
+    def record(self, i):
+        if self.event_types[i] == self.TRADE:
+            return {
+                'type': 'Trade',
+                'time': self.times[i],
+                'price': self.value(self.prices, i, self.INT_PRICE_FLAG),
+                'quantity': self.value(self.quantities, i, self.INT_QUANTITY_FLAG),
+                'buyer': self.trader_ids[self.buyers[i]],
+                'seller': self.trader_ids[self.sellers[i]],
+                'BDS': bool(self.flags[i] & self.BDS_FLAG)
+            }
+        if self.event_types[i] == self.BUY_CANCEL:
+            otype = 'Buy'
+        else:
+            otype = 'Sell'
+        if self.flags[i] & self.NO_PRICE_FLAG:
+            price = None
+        else:
+            price = self.value(self.prices, i, self.INT_PRICE_FLAG)
+        return {
+            'type': 'Cancel',
+            'time': self.times[i],
+            'order_id': self.sellers[i],
+            'trader_id': self.trader_ids[self.buyers[i]],
+            'otype': otype,
+            'quantity': self.value(self.quantities, i, self.INT_QUANTITY_FLAG),
+            'limit_price': price
+        }
+
+    # return a list of all of the events on the tape as dictionaries
+    def records(self):
+        return [self.record(i) for i in range(0, len(self))]
@@ -70,7 +70,7 @@ class Test_Integration(unittest.TestCase):
         self.assertEqual(exchange.order_book.sell_side.orders[0].__str__(), "Order: [ID=8 T=20.00 S03 Sell Q=345 QR=18 P=32 MES=18]")
         self.assertEqual(exchange.block_indication_book.composite_reputational_scores['B03'], 80)
         self.assertEqual(exchange.block_indication_book.composite_reputational_scores['S03'], 80)
-        self.assertEqual(exchange.order_book.tape, [{'price': 50.0, 'seller': 'S00', 'BDS': False, 'time': 100.0, 'buyer': 'B04', 'type': 'Trade', 'quantity': 11}, {'price': 50.0, 'seller': 'S01', 'BDS': False, 'time': 100.0, 'buyer': 'B04', 'type': 'Trade', 'quantity': 4}, {'price': 50.0, 'seller': 'S02', 'BDS': False, 'time': 100.0, 'buyer': 'B04', 'type': 'Trade', 'quantity': 12}, {'price': 50.0, 'seller': 'S03', 'BDS': True, 'time': 100.0, 'buyer': 'B03', 'type': 'Trade', 'quantity': 289}, {'price': 50.0, 'seller': 'S03', 'BDS': False, 'time': 100.0, 'buyer': 'B04', 'type': 'Trade', 'quantity': 38}])
+        self.assertEqual(exchange.order_book.tape.records(), [{'price': 50.0, 'seller': 'S00', 'BDS': False, 'time': 100.0, 'buyer': 'B04', 'type': 'Trade', 'quantity': 11}, {'price': 50.0, 'seller': 'S01', 'BDS': False, 'time': 100.0, 'buyer': 'B04', 'type': 'Trade', 'quantity': 4}, {'price': 50.0, 'seller': 'S02', 'BDS': False, 'time': 100.0, 'buyer': 'B04', 'type': 'Trade', 'quantity': 12}, {'price': 50.0, 'seller': 'S03', 'BDS': True, 'time': 20.0, 'buyer': 'B03', 'type': 'Trade', 'quantity': 289}, {'price': 50.0, 'seller': 'S03', 'BDS': False, 'time': 100.0, 'buyer': 'B04', 'type': 'Trade', 'quantity': 38}])
 
 
 
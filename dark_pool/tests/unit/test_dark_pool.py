@@ -1,6 +1,49 @@
 import unittest
 import dark_pool
+import sweep
+import subprocess
 import csv
+import shutil
+import tempfile
+
+# the reputation store, the volume curves and the schedule generator need NumPy, which is optional
+try:
+    import reputation_store
+    import volume_curve
+    import schedule_generator
+except ImportError:
+    reputation_store = None
+    volume_curve = None
+    schedule_generator = None
+
+# a market of 4 buyers and 4 sellers
+small_trader_spec = {'sellers': [('GVWY', 4)], 'buyers': [('GVWY', 4)], 'BI_threshold': 800}
+
+# an order schedule running to the given end time, with customer orders replenished every 10 seconds
+def drip_order_schedule(endtime):
+    return {'sup': [{'from': 0.0, 'to': endtime, 'price_ranges': [(25, 45)], 'stepmode': 'fixed'}],
+            'dem': [{'from': 0.0, 'to': endtime, 'price_ranges': [(55, 75)], 'stepmode': 'fixed'}],
+            'interval': 10, 'timemode': 'drip-fixed', 'quantity_range': [1, 1000]}
+
+# call a function without printing anything, as market sessions print the books as they go, and return its result
+def quietly(function, *args, **kwargs):
+    stdout = dark_pool.sys.stdout
+    dark_pool.sys.stdout = open(dark_pool.os.devnull, 'w')
+    try:
+        return function(*args, **kwargs)
+    finally:
+        dark_pool.sys.stdout.close()
+        dark_pool.sys.stdout = stdout
+
+# run a market session from time 0 in a new directory without printing it, and return the directory, which holds the
+# output files. session_args are passed on to market_session
+def run_quiet_session(endtime, trader_spec, order_schedule, **session_args):
+    directory = tempfile.mkdtemp()
+    dumpfile = open(directory + '/avg_balance_dark.csv', 'w')
+    quietly(dark_pool.market_session, 'test', 0.0, endtime, trader_spec, order_schedule, dumpfile, False,
+            output_dir=directory, **session_args)
+    dumpfile.close()
+    return directory
 
 ###############################################################################
 # Tests for the Order class
@@ -235,7 +278,7 @@ class Test_Orderbook_half(unittest.TestCase):
 
         # test
         self.assertEqual(orderbook_half.traders.keys(), ['B00'])
-        self.assertEqual(orderbook_half.traders['B00'], 1)
+        self.assertIs(orderbook_half.traders['B00'], orders[0])
         self.assertEqual(orderbook_half.orders[0].__str__(), "Order: [ID=-1 T=25.00 B00 Buy Q=5 QR=5 P=100 MES=3]")
 
     # testing that when that the order of orders in the order_book list is ordered by quantity then time
@@ -256,9 +299,9 @@ class Test_Orderbook_half(unittest.TestCase):
             orderbook_half.book_add(order)
 
         self.assertEqual(orderbook_half.traders.keys(), ['B01', 'B00', 'B02'])
-        self.assertEqual(orderbook_half.traders['B00'], 1)
-        self.assertEqual(orderbook_half.traders['B01'], 1)
-        self.assertEqual(orderbook_half.traders['B02'], 1)
+        self.assertIs(orderbook_half.traders['B00'], orders[0])
+        self.assertIs(orderbook_half.traders['B01'], orders[1])
+        self.assertIs(orderbook_half.traders['B02'], orders[2])
         self.assertEqual(orderbook_half.orders[0].__str__(), "Order: [ID=-1 T=35.00 B01 Buy Q=10 QR=10 P=100 MES=4]")
         self.assertEqual(orderbook_half.orders[1].__str__(), "Order: [ID=-1 T=45.00 B02 Buy Q=10 QR=10 P=110 MES=4]")
         self.assertEqual(orderbook_half.orders[2].__str__(), "Order: [ID=-1 T=25.00 B00 Buy Q=5 QR=5 P=100 MES=3]")
@@ -282,6 +325,7 @@ class Test_Orderbook_half(unittest.TestCase):
         # tests
         self.assertEqual(return_values, ['Addition', 'Addition', 'Overwrite'])
         self.assertEqual(orderbook_half.traders.keys(), ['B01', 'B00'])
+        self.assertIs(orderbook_half.traders['B00'], orders[2])
         self.assertEqual(orderbook_half.orders[0].__str__(), "Order: [ID=-1 T=35.00 B01 Buy Q=10 QR=10 P=221 MES=4]")
         self.assertEqual(orderbook_half.orders[1].__str__(), "Order: [ID=-1 T=45.00 B00 Buy Q=10 QR=10 P=112 MES=4]")
         self.assertEqual(len(orderbook_half.orders), 2)
@@ -309,6 +353,37 @@ class Test_Orderbook_half(unittest.TestCase):
         self.assertEqual(orderbook_half.orders[0].__str__(), "Order: [ID=-1 T=35.00 B01 Buy Q=10 QR=10 P=111 MES=4]")
 
 
+    def test_book_update_function(self):
+
+        for book_half in [dark_pool.Orderbook_half, dark_pool.Orderbook_half_bisect]:
+
+            # create the order book
+            orderbook_half = book_half("Buy")
+
+            # create some orders. The first two have the same size and time
+            orders = []
+            orders.append(dark_pool.Order(25.0, 'B00', 'Buy', 10, 100, None))
+            orders.append(dark_pool.Order(25.0, 'B01', 'Buy', 10, 100, None))
+            orders.append(dark_pool.Order(35.0, 'B02', 'Buy', 5, 100, None))
+            for order in orders:
+                orderbook_half.book_add(order)
+
+            # an order with no tie after it stays where it is
+            orders[2].quantity_remaining = 2
+            orderbook_half.book_update(orders[2])
+            self.assertEqual(orderbook_half.orders, [orders[0], orders[1], orders[2]])
+
+            # an order with a tie after it moves behind it, as if it had been deleted and re-added
+            orders[0].quantity_remaining = 4
+            orderbook_half.book_update(orders[0])
+            self.assertEqual(orderbook_half.orders, [orders[1], orders[0], orders[2]])
+            self.assertIs(orderbook_half.traders['B00'], orders[0])
+
+            # the last order of the tie stays where it is
+            orderbook_half.book_update(orders[0])
+            self.assertEqual(orderbook_half.orders, [orders[1], orders[0], orders[2]])
+
+
     def test_trader_has_order_function(self):
 
         # create the order book
@@ -331,6 +406,237 @@ class Test_Orderbook_half(unittest.TestCase):
         self.assertFalse(orderbook_half.trader_has_order('B03'))
         self.assertFalse(orderbook_half.trader_has_order('B04'))
 
+##################################################################################################
+# tests for the Sorted_List class
+
+class Test_Sorted_List(unittest.TestCase):
+
+    # test that a random sequence of additions and removals keeps the same entries as a plain sorted list. The chunks
+    # are kept small so that they are split and merged many times
+    def test_same_as_sorted_list(self):
+
+        # use a fixed seed so that the test is deterministic
+        rng = dark_pool.random.Random(11)
+        sorted_list = dark_pool.Sorted_List(4)
+        entries = []
+        for i in range(0, 2000):
+            if len(entries) > 0 and rng.random() < 0.45:
+                (key, value) = entries[rng.randint(0, len(entries) - 1)]
+                self.assertEqual(sorted_list.remove(key), value)
+                entries.remove((key, value))
+            else:
+                key = (rng.randint(0, 30), i)
+                sorted_list.add(key, 'V%d' % i)
+                entries.append((key, 'V%d' % i))
+                entries.sort()
+
+            self.assertEqual(len(sorted_list), len(entries))
+            self.assertEqual(sorted_list.keys(), [key for (key, value) in entries])
+            self.assertEqual(sorted_list.values(), [value for (key, value) in entries])
+            self.assertTrue(all([len(chunk) <= 8 for chunk in sorted_list.chunks]))
+            self.assertEqual(sorted_list.maxes, [chunk[-1][0] for chunk in sorted_list.chunks])
+
+            # look up a key which may or may not be in the list
+            key = (rng.randint(0, 30), rng.randint(0, i))
+            position = len([entry for entry in entries if entry[0] < key])
+            self.assertEqual(sorted_list.position(key), position)
+            self.assertEqual(sorted_list.items_between(key), entries[position:])
+            self.assertEqual(sorted_list.items_between(None, key), entries[:position])
+            self.assertEqual(sorted_list.items_between((10,), (20,)),
+                             [entry for entry in entries if entry[0] >= (10,) and entry[0] < (20,)])
+            if len(entries) > 0:
+                j = rng.randint(0, len(entries) - 1)
+                if j + 1 < len(entries):
+                    self.assertEqual(sorted_list.key_after(entries[j][0]), entries[j + 1][0])
+                else:
+                    self.assertEqual(sorted_list.key_after(entries[j][0]), None)
+
+    # test that removing a key which is not in the list raises a KeyError
+    def test_remove_function(self):
+        sorted_list = dark_pool.Sorted_List()
+        self.assertRaises(KeyError, sorted_list.remove, (1,))
+        sorted_list.add((1,), 'a')
+        self.assertRaises(KeyError, sorted_list.remove, (2,))
+        self.assertEqual(sorted_list.remove((1,)), 'a')
+        self.assertEqual(len(sorted_list), 0)
+
+##################################################################################################
+# tests for the Orderbook_half_bisect class
+
+class Test_Orderbook_half_bisect(unittest.TestCase):
+
+    def test_find_order_position_function(self):
+
+        # create the order book
+        orderbook_half = dark_pool.Orderbook_half_bisect("Buy")
+
+        # create some orders
+        orders = []
+        orders.append(dark_pool.Order(25.0, 'B00', 'Buy', 5, 100, 3))
+        orders.append(dark_pool.Order(35.0, 'B01', 'Buy', 10, 120, 4))
+        orders.append(dark_pool.Order(45.0, 'B02', 'Buy', 10, 90, 4))
+
+        # add the orders
+        for order in orders:
+            orderbook_half.book_add(order)
+
+        # test the positions are the same as those given by Orderbook_half
+        self.assertEqual(orderbook_half.find_order_position(dark_pool.Order(55.0, 'B03', 'Buy', 12, None, 4)), 0)
+        self.assertEqual(orderbook_half.find_order_position(dark_pool.Order(55.0, 'B03', 'Buy', 10, None, 4)), 2)
+        self.assertEqual(orderbook_half.find_order_position(dark_pool.Order(55.0, 'B03', 'Buy', 9, None, 4)), 2)
+        self.assertEqual(orderbook_half.find_order_position(dark_pool.Order(55.0, 'B03', 'Buy', 4, None, 4)), 3)
+        self.assertEqual(orderbook_half.find_order_position(dark_pool.Order(40.0, 'B03', 'Buy', 10, None, 4)), 1)
+        self.assertEqual(orderbook_half.find_order_position(dark_pool.Order(35.0, 'B03', 'Buy', 10, None, 4)), 1)
+
+    # test that a random sequence of additions, overwrites and deletions leaves both engines in the same order
+    def test_same_ordering_as_orderbook_half(self):
+
+        for booktype in ['Buy', 'Sell']:
+
+            # create one side of the book with each engine
+            reference = dark_pool.Orderbook_half(booktype)
+            orderbook_half = dark_pool.Orderbook_half_bisect(booktype)
+
+            # use a fixed seed so that the test is deterministic. Only a few quantities and times are used so that
+            # there are plenty of ties
+            rng = dark_pool.random.Random(7)
+            for i in range(0, 500):
+                tid = 'T%02d' % rng.randint(0, 40)
+                if rng.random() < 0.2:
+                    reference.book_del(tid)
+                    orderbook_half.book_del(tid)
+                else:
+                    limit_price = rng.choice([None, rng.randint(45, 55)])
+                    order = dark_pool.Order(float(rng.randint(0, 5)), tid, booktype, rng.randint(1, 4), limit_price, None)
+                    self.assertEqual(reference.book_add(order), orderbook_half.book_add(order))
+
+                self.assertEqual(orderbook_half.get_orders(), reference.get_orders())
+                self.assertEqual(orderbook_half.get_traders(), reference.get_traders())
+
+                # the orders which can trade at a price should be the same for both engines
+                price = rng.randint(45, 55)
+                self.assertEqual(orderbook_half.price_eligible_orders(price), reference.price_eligible_orders(price))
+
+            # the keys should be kept in step with the orders
+            self.assertEqual([key[:2] for key in orderbook_half.sorted_orders.keys()],
+                             [dark_pool.order_priority(order) for order in orderbook_half.orders])
+            self.assertEqual(sorted(orderbook_half.price_index.values()), sorted(orderbook_half.orders))
+
+    def test_book_del_function(self):
+
+        # create the order book
+        orderbook_half = dark_pool.Orderbook_half_bisect("Buy")
+
+        # create some orders with the same size and time
+        orders = []
+        orders.append(dark_pool.Order(25.0, 'B00', 'Buy', 5, 121, 3))
+        orders.append(dark_pool.Order(25.0, 'B01', 'Buy', 5, 111, 4))
+        orders.append(dark_pool.Order(25.0, 'B02', 'Buy', 5, 101, 4))
+
+        # add the orders
+        for order in orders:
+            orderbook_half.book_add(order)
+
+        # delete the middle order
+        orderbook_half.book_del('B01')
+
+        self.assertEqual(orderbook_half.orders, [orders[0], orders[2]])
+        self.assertEqual(len(orderbook_half.sorted_orders), 2)
+        self.assertFalse(orderbook_half.trader_has_order('B01'))
+
+        # deleting a trader without an order does nothing
+        orderbook_half.book_del('B01')
+        self.assertEqual(orderbook_half.orders, [orders[0], orders[2]])
+
+##################################################################################################
+# tests for the Quantity_Index class
+
+class Test_Quantity_Index(unittest.TestCase):
+
+    def test_first_function(self):
+
+        # create some orders, in book order
+        orders = []
+        orders.append(dark_pool.Order(25.0, 'S00', 'Sell', 10, 50, 8))
+        orders.append(dark_pool.Order(25.0, 'S01', 'Sell', 6, 50, None))
+        orders.append(dark_pool.Order(25.0, 'S02', 'Sell', 4, 50, 2))
+        quantity_index = dark_pool.Quantity_Index(orders, 'quantity_remaining')
+
+        # the first order which is big enough and whose MES is small enough
+        self.assertIs(quantity_index.first(None, 10), orders[0])
+        self.assertIs(quantity_index.first(None, 7), orders[1])
+        self.assertIs(quantity_index.first(7, 7), None)
+        self.assertIs(quantity_index.first(3, 3), orders[1])
+
+        # removed and excluded orders are not returned
+        quantity_index.remove(orders[1])
+        self.assertIs(quantity_index.first(3, 3), orders[2])
+        quantity_index.exclude(orders[2])
+        self.assertIs(quantity_index.first(3, 3), None)
+        quantity_index.include(orders[2])
+        self.assertIs(quantity_index.first(3, 3), orders[2])
+
+    def test_update_function(self):
+
+        # create some orders with the same size and time
+        orders = []
+        orders.append(dark_pool.Order(25.0, 'B00', 'Buy', 5, 50, None))
+        orders.append(dark_pool.Order(25.0, 'B01', 'Buy', 5, 50, None))
+        orders.append(dark_pool.Order(25.0, 'B02', 'Buy', 3, 50, None))
+        quantity_index = dark_pool.Quantity_Index(orders, 'quantity_remaining')
+
+        # an updated order moves to the end of the orders with the same size and time
+        quantity_index.update(orders[0])
+        self.assertEqual(quantity_index.orders, [orders[1], orders[0], orders[2]])
+        self.assertEqual(quantity_index.positions[orders[0]], 1)
+        self.assertIs(quantity_index.first(5, 0), orders[1])
+
+    def test_search_worst_case(self):
+
+        # every pair of orders has one big order with a large MES and one small order with a small MES, so every
+        # range passes both checks but no order does, and the search looks at every node of the tree
+        orders = []
+        for i in range(0, 8):
+            orders.append(dark_pool.Order(25.0, 'S%02d' % (2 * i), 'Sell', 10, 50, 9))
+            orders.append(dark_pool.Order(25.0, 'S%02d' % (2 * i + 1), 'Sell', 2, 50, 1))
+        quantity_index = dark_pool.Quantity_Index(orders, 'quantity_remaining')
+        self.assertIs(quantity_index.first(5, 5), None)
+        self.assertEqual(quantity_index.examined, 31)
+        self.assertEqual(quantity_index.compared, 16)
+
+        # when only the quantity rules orders out the search goes straight down to the order
+        quantity_index.examined = 0
+        self.assertIs(quantity_index.first(5, 9), orders[0])
+        self.assertEqual(quantity_index.examined, 5)
+
+##################################################################################################
+# tests for the Tape class
+
+class Test_Tape(unittest.TestCase):
+
+    def test_append_trade_function(self):
+
+        tape = dark_pool.Tape()
+        tape.append_trade(100.0, 50, 8, 'B01', 'S00', False)
+        tape.append_trade(101.0, 50.5, 2, 'B00', 'S00', True)
+
+        self.assertEqual(len(tape), 2)
+        self.assertEqual(tape.trader_ids, ['B01', 'S00', 'B00'])
+        self.assertEqual(tape.records(), [{'price': 50, 'seller': 'S00', 'BDS': False, 'time': 100.0, 'buyer': 'B01', 'type': 'Trade', 'quantity': 8},
+                                          {'price': 50.5, 'seller': 'S00', 'BDS': True, 'time': 101.0, 'buyer': 'B00', 'type': 'Trade', 'quantity': 2}])
+        # integer values are given back as integers
+        self.assertIsInstance(tape.record(0)['price'], int)
+        self.assertIsInstance(tape.record(0)['quantity'], int)
+
+    def test_append_cancel_function(self):
+
+        tape = dark_pool.Tape()
+        order = dark_pool.Order(25.0, 'B00', 'Buy', 5, None, 3)
+        order.id = 7
+        tape.append_cancel(30.0, order)
+
+        self.assertEqual(list(tape), [{'type': 'Cancel', 'time': 30.0, 'order_id': 7, 'trader_id': 'B00', 'otype': 'Buy', 'quantity': 5, 'limit_price': None}])
+
 ##################################################################################################
 # tests for the Orderbook class
 
@@ -340,7 +646,7 @@ class Test_Orderbook(unittest.TestCase):
 
         orderbook = dark_pool.Orderbook()
 
-        self.assertEqual(orderbook.tape, [])
+        self.assertEqual(orderbook.tape.records(), [])
         self.assertEqual(orderbook.order_id, 0)
         self.assertEqual(orderbook.buy_side.traders, {})
         self.assertEqual(orderbook.sell_side.traders, {})
@@ -616,7 +922,7 @@ class Test_Orderbook(unittest.TestCase):
         match_info = orderbook.find_matching_orders(50)
         orderbook.execute_trade(100.0, match_info)
 
-        self.assertEqual(orderbook.tape, [{'price': 50, 'seller': 'S00', 'BDS': False, 'time': 100.0, 'buyer': 'B01', 'type': 'Trade', 'quantity': 8}])
+        self.assertEqual(orderbook.tape.records(), [{'price': 50, 'seller': 'S00', 'BDS': False, 'time': 100.0, 'buyer': 'B01', 'type': 'Trade', 'quantity': 8}])
         self.assertEqual(len(orderbook.buy_side.orders), 1)
         self.assertEqual(orderbook.buy_side.orders[0].__str__(), "Order: [ID=0 T=25.00 B00 Buy Q=5 QR=5 P=56 MES=3]")
         self.assertEqual(len(orderbook.sell_side.orders), 1)
@@ -656,7 +962,268 @@ class Test_Orderbook(unittest.TestCase):
 
         # test the tape
         self.assertEqual(trades, [{'price': 50.0, 'seller': 'S00', 'BDS': False, 'time': 100.0, 'buyer': 'B01', 'type': 'Trade', 'quantity': 10}, {'price': 50.0, 'seller': 'S00', 'BDS': False, 'time': 100.0, 'buyer': 'B00', 'type': 'Trade', 'quantity': 1}, {'price': 50.0, 'seller': 'S03', 'BDS': False, 'time': 100.0, 'buyer': 'B00', 'type': 'Trade', 'quantity': 4}, {'price': 50.0, 'seller': 'S03', 'BDS': False, 'time': 100.0, 'buyer': 'B02', 'type': 'Trade', 'quantity': 2}, {'price': 50.0, 'seller': 'S02', 'BDS': False, 'time': 100.0, 'buyer': 'B04', 'type': 'Trade', 'quantity': 3}, {'price': 50.0, 'seller': 'S02', 'BDS': False, 'time': 100.0, 'buyer': 'B03', 'type': 'Trade', 'quantity': 3}])
-        self.assertEqual(exchange.order_book.tape, [{'price': 50.0, 'seller': 'S00', 'BDS': False, 'time': 100.0, 'buyer': 'B01', 'type': 'Trade', 'quantity': 10}, {'price': 50.0, 'seller': 'S00', 'BDS': False, 'time': 100.0, 'buyer': 'B00', 'type': 'Trade', 'quantity': 1}, {'price': 50.0, 'seller': 'S03', 'BDS': False, 'time': 100.0, 'buyer': 'B00', 'type': 'Trade', 'quantity': 4}, {'price': 50.0, 'seller': 'S03', 'BDS': False, 'time': 100.0, 'buyer': 'B02', 'type': 'Trade', 'quantity': 2}, {'price': 50.0, 'seller': 'S02', 'BDS': False, 'time': 100.0, 'buyer': 'B04', 'type': 'Trade', 'quantity': 3}, {'price': 50.0, 'seller': 'S02', 'BDS': False, 'time': 100.0, 'buyer': 'B03', 'type': 'Trade', 'quantity': 3}])
+        self.assertEqual(exchange.order_book.tape.records(), [{'price': 50.0, 'seller': 'S00', 'BDS': False, 'time': 100.0, 'buyer': 'B01', 'type': 'Trade', 'quantity': 10}, {'price': 50.0, 'seller': 'S00', 'BDS': False, 'time': 100.0, 'buyer': 'B00', 'type': 'Trade', 'quantity': 1}, {'price': 50.0, 'seller': 'S03', 'BDS': False, 'time': 100.0, 'buyer': 'B00', 'type': 'Trade', 'quantity': 4}, {'price': 50.0, 'seller': 'S03', 'BDS': False, 'time': 100.0, 'buyer': 'B02', 'type': 'Trade', 'quantity': 2}, {'price': 50.0, 'seller': 'S02', 'BDS': False, 'time': 100.0, 'buyer': 'B04', 'type': 'Trade', 'quantity': 3}, {'price': 50.0, 'seller': 'S02', 'BDS': False, 'time': 100.0, 'buyer': 'B03', 'type': 'Trade', 'quantity': 3}])
+
+    # test that the incremental matching engine makes the same trades as the reference engine
+    def test_execute_trades_incremental_function(self):
+
+        # use a fixed seed so that the test is deterministic
+        rng = dark_pool.random.Random(3)
+
+        for trial in range(0, 400):
+
+            # create an order book for each engine
+            reference = dark_pool.Orderbook()
+            incremental = dark_pool.Orderbook(dark_pool.Orderbook_half_bisect)
+            incremental.matching_engine = 'incremental'
+            # the books are small, so half of the time always use the indexes, and otherwise check every pair of the
+            # orders that can trade
+            if trial % 2 == 0:
+                incremental.index_threshold = 0
+
+            # uncross the order books several times, so that partially filled orders are left resting
+            for uncross in range(0, 4):
+
+                # add the same random orders to both order books. Few distinct sizes and times are used so that
+                # there are ties, and MES values are used so that not every pair of orders can match
+                for i in range(0, rng.randint(1, 10)):
+                    otype = rng.choice(['Buy', 'Sell'])
+                    tid = '%s%02d' % (otype[0], rng.randint(0, 15))
+                    quantity = rng.randint(1, 12)
+                    limit_price = rng.choice([None, rng.randint(40, 60)])
+                    MES = rng.choice([None, rng.randint(1, quantity)])
+                    time = float(rng.randint(0, 3))
+                    reference.add_order(dark_pool.Order(time, tid, otype, quantity, limit_price, MES), False)
+                    incremental.add_order(dark_pool.Order(time, tid, otype, quantity, limit_price, MES), False)
+
+                # uncross both order books
+                reference_trades = reference.execute_trades(100.0, 50)
+                incremental_trades = incremental.execute_trades(100.0, 50)
+
+                # test that the trades and the orders left in the book are the same
+                self.assertEqual(incremental_trades, reference_trades)
+                self.assertEqual([order.__str__() for order in incremental.buy_side.orders],
+                                 [order.__str__() for order in reference.buy_side.orders])
+                self.assertEqual([order.__str__() for order in incremental.sell_side.orders],
+                                 [order.__str__() for order in reference.sell_side.orders])
+
+    # test that with only a few orders that can trade, the incremental engine only checks pairs of those orders
+    def test_execute_trades_incremental_few_eligible(self):
+
+        # use a fixed seed so that the test is deterministic
+        rng = dark_pool.random.Random(4)
+
+        # create an order book for each engine with 300 orders on each side, of which 10 can trade at a price of 50
+        reference = dark_pool.Orderbook()
+        incremental = dark_pool.Orderbook(dark_pool.Orderbook_half_bisect)
+        incremental.matching_engine = 'incremental'
+        for i in range(0, 300):
+            for (otype, limit_price) in [('Buy', 49), ('Sell', 51)]:
+                tid = '%s%03d' % (otype[0], i)
+                quantity = rng.randint(1, 100)
+                if i % 30 == 0:
+                    limit_price = 50
+                MES = rng.randint(1, quantity)
+                reference.add_order(dark_pool.Order(float(i), tid, otype, quantity, limit_price, MES), False)
+                incremental.add_order(dark_pool.Order(float(i), tid, otype, quantity, limit_price, MES), False)
+
+        # count the pairs of orders checked
+        checked = []
+        check_match = incremental.check_match
+        def counted_check_match(buy_order, sell_order, price):
+            checked.append((buy_order, sell_order))
+            return check_match(buy_order, sell_order, price)
+        incremental.check_match = counted_check_match
+
+        # the trades are the same, and no more pairs are checked than there are pairs of eligible orders for each
+        # trade and once more at the end
+        trades = incremental.execute_trades(100.0, 50)
+        self.assertEqual(trades, reference.execute_trades(100.0, 50))
+        self.assertTrue(len(trades) > 0)
+        self.assertTrue(len(checked) <= 10 * 10 * (len(trades) + 1))
+        self.assertTrue(all([buy_order.limit_price == 50 and sell_order.limit_price == 50
+                             for (buy_order, sell_order) in checked]))
+
+    # test that probing an order book gives the trades execute_trades would make, without changing the order book
+    def test_probe_trades_function(self):
+
+        # use a fixed seed so that the test is deterministic
+        rng = dark_pool.random.Random(7)
+
+        for matching_engine in ['reference', 'incremental']:
+            for trial in range(0, 100):
+
+                order_book = dark_pool.Orderbook(dark_pool.Orderbook_half_bisect)
+                order_book.matching_engine = matching_engine
+                order_book.index_threshold = 0
+
+                # add some random orders, and leave partially filled orders resting
+                for uncross in range(0, 3):
+                    for i in range(0, rng.randint(1, 10)):
+                        otype = rng.choice(['Buy', 'Sell'])
+                        tid = '%s%02d' % (otype[0], rng.randint(0, 15))
+                        quantity = rng.randint(1, 12)
+                        limit_price = rng.choice([None, rng.randint(40, 60)])
+                        MES = rng.choice([None, rng.randint(1, quantity)])
+                        time = float(rng.randint(0, 3))
+                        order_book.add_order(dark_pool.Order(time, tid, otype, quantity, limit_price, MES), False)
+                    order_book.execute_trades(50.0, 50)
+
+                # probe at a few prices, then check that the order book and the tape haven't changed
+                buy_orders = [order.__str__() for order in order_book.buy_side.orders]
+                sell_orders = [order.__str__() for order in order_book.sell_side.orders]
+                tape_length = len(order_book.tape)
+                for price in [45, 55]:
+                    order_book.probe_trades(100.0, price)
+                probe_trades = order_book.probe_trades(100.0, 50)
+                self.assertEqual([order.__str__() for order in order_book.buy_side.orders], buy_orders)
+                self.assertEqual([order.__str__() for order in order_book.sell_side.orders], sell_orders)
+                self.assertEqual(len(order_book.tape), tape_length)
+
+                # test that the probe gives the trades that are then made
+                self.assertEqual(order_book.probe_volume(50), sum([trade['quantity'] for trade in probe_trades]))
+                self.assertEqual(probe_trades, order_book.execute_trades(100.0, 50))
+
+###############################################################################
+# tests for the Event_Scores class
+
+class Test_Event_Scores(unittest.TestCase):
+
+    def test_add_function(self):
+
+        # use a fixed seed so that the test is deterministic
+        rng = dark_pool.random.Random(7)
+
+        # keep a plain list of the scores alongside
+        event_scores = dark_pool.Event_Scores([80 for i in range(0,50)])
+        scores = [80 for i in range(0,50)]
+        for i in range(0, 200):
+            score = rng.choice([0, 50, float(rng.randint(50, 100))])
+            event_scores.add(score)
+            scores = ([score] + scores)[:50]
+
+            # the scores and the sums are the same as working them out from the list
+            self.assertEqual(list(event_scores), scores)
+            self.assertEqual(event_scores.total, sum(scores))
+            self.assertEqual(event_scores.weighted_total, sum([(50 - j) * scores[j] for j in range(0, 50)]))
+
+    def test_getitem_function(self):
+
+        event_scores = dark_pool.Event_Scores([3, 2, 1], 4)
+        event_scores.add(4)
+        event_scores.add(5)
+
+        self.assertEqual(len(event_scores), 4)
+        self.assertEqual(event_scores[0], 5)
+        self.assertEqual(event_scores[3], 2)
+        self.assertRaises(IndexError, event_scores.__getitem__, 4)
+
+###############################################################################
+# tests for the Reputation_Store class
+
+@unittest.skipIf(reputation_store == None, "NumPy is not installed")
+class Test_Reputation_Store(unittest.TestCase):
+
+    def test_same_scores_as_event_scores(self):
+
+        # use a fixed seed so that the test is deterministic
+        rng = dark_pool.random.Random(11)
+
+        # run the same random matches through a book using Event_Scores and a book using a Reputation_Store. Enough
+        # traders are used that the store has to grow
+        reference = dark_pool.Block_Indication_Book()
+        store = dark_pool.Block_Indication_Book()
+        store.event_reputational_scores = reputation_store.Reputation_Store(capacity=4)
+        for i in range(0, 300):
+            tid = 'T%02d' % rng.randint(0, 20)
+            BI = dark_pool.Block_Indication(100.0, tid, 'Buy', 1000, 50, 500)
+            QBO = dark_pool.Qualifying_Block_Order(100.0, tid, 'Buy', rng.randint(400, 1000), rng.choice([50, 60]), 500, 0)
+            for book in [reference, store]:
+                book.add_block_indication(dark_pool.Block_Indication(100.0, tid, 'Buy', 1000, 50, 500), False)
+                book.calculate_event_reputational_score(BI, QBO)
+            self.assertEqual(list(store.event_reputational_scores[tid]), list(reference.event_reputational_scores[tid]))
+            self.assertEqual(store.calculate_composite_reputational_score(tid),
+                             reference.calculate_composite_reputational_score(tid))
+
+        # the ERS file is the same
+        directory = tempfile.mkdtemp()
+        reference.ERS_dump(directory + '/reference.csv', 'w', 'keep')
+        store.ERS_dump(directory + '/store.csv', 'w', 'keep')
+        self.assertEqual(open(directory + '/store.csv').read(), open(directory + '/reference.csv').read())
+        shutil.rmtree(directory)
+
+    def test_score_range(self):
+
+        # an initial reputational score above 127 is kept as it is, and one which doesn't fit raises an error
+        block_indication_book = dark_pool.Block_Indication_Book()
+        block_indication_book.event_reputational_scores = reputation_store.Reputation_Store()
+        block_indication_book.initial_reputational_score = 200
+        block_indication_book.add_block_indication(dark_pool.Block_Indication(100.0, 'B00', 'Buy', 1000, 50, 500), False)
+        self.assertEqual(list(block_indication_book.event_reputational_scores['B00']), [200] * 50)
+        self.assertEqual(block_indication_book.calculate_composite_reputational_score('B00'), 200)
+        block_indication_book.initial_reputational_score = 40000
+        self.assertRaises(ValueError, block_indication_book.add_block_indication,
+                          dark_pool.Block_Indication(100.0, 'S00', 'Sell', 1000, 50, 500), False)
+
+###############################################################################
+# tests for the volume curves
+
+@unittest.skipIf(volume_curve == None, "NumPy is not installed")
+class Test_Volume_Curve(unittest.TestCase):
+
+    def test_order_book_volume_curve_function(self):
+
+        # use a fixed seed so that the test is deterministic
+        rng = dark_pool.random.Random(13)
+        prices = volume_curve.price_grid(30, 70)
+
+        for trial in range(0, 50):
+            for MES in [False, True]:
+
+                # create an order book with random orders, with or without MES values
+                order_book = dark_pool.Orderbook()
+                for i in range(0, rng.randint(1, 20)):
+                    otype = rng.choice(['Buy', 'Sell'])
+                    quantity = rng.randint(1, 12)
+                    order = dark_pool.Order(float(i), '%s%02d' % (otype[0], i), otype, quantity,
+                                            rng.choice([None, rng.randint(25, 75)]), None)
+                    if MES:
+                        order.MES = rng.choice([None, rng.randint(1, quantity)])
+                    order_book.add_order(order, False)
+
+                # without MES values the curve is the volume that would trade at each price, and with them it is an
+                # upper bound on it
+                volumes = volume_curve.order_book_volume_curve(order_book, prices)
+                for i in range(0, len(prices)):
+                    if MES:
+                        self.assertTrue(order_book.probe_volume(prices[i]) <= volumes[i])
+                    else:
+                        self.assertEqual(order_book.probe_volume(prices[i]), volumes[i])
+
+    def test_exchange_volume_curves_function(self):
+
+        # create an exchange with some orders and block indications
+        exchange = dark_pool.Exchange()
+        exchange.add_order(dark_pool.Order(10.0, 'B00', 'Buy', 5, 3, None), False)
+        exchange.add_order(dark_pool.Order(10.0, 'B01', 'Buy', 4, None, None), False)
+        exchange.add_order(dark_pool.Order(10.0, 'S00', 'Sell', 6, 2, None), False)
+        exchange.add_order(dark_pool.Order(10.0, 'S01', 'Sell', 3, 4, None), False)
+        exchange.add_block_indication(dark_pool.Block_Indication(10.0, 'B02', 'Buy', 1000, 2, None), False)
+        exchange.add_block_indication(dark_pool.Block_Indication(10.0, 'S02', 'Sell', 900, 2, None), False)
+
+        [prices, order_volumes, BI_volumes] = volume_curve.exchange_volume_curves(exchange, 1, 5)
+        self.assertEqual(list(prices), [1, 2, 3, 4, 5])
+        # demand is 9, 9, 9, 4, 4 and supply is 0, 6, 6, 9, 9
+        self.assertEqual(list(order_volumes), [0, 6, 6, 4, 4])
+        # demand is 1000, 1000, 0, 0, 0 and supply is 0, 900, 900, 900, 900
+        self.assertEqual(list(BI_volumes), [0, 900, 0, 0, 0])
+
+        # the block volume on offer takes no account of the MES, so a pair of block indications which can't be
+        # matched with each other still has volume on offer
+        exchange.add_block_indication(dark_pool.Block_Indication(10.0, 'B02', 'Buy', 1000, 2, 950), False)
+        self.assertEqual(exchange.probe_block_indication_matches(2), [])
+        self.assertEqual(list(volume_curve.block_indication_volume_on_offer(exchange.block_indication_book, prices)),
+                         [0, 900, 0, 0, 0])
 
 ###############################################################################
 # tests for the Block_Indication_Book class
@@ -699,8 +1266,8 @@ class Test_Block_Indication_Book(unittest.TestCase):
         self.assertEqual(block_indication_book.composite_reputational_scores['S00'], block_indication_book.initial_reputational_score)
 
         # check that an entry was created in the events_reputational_scores dictionary for the traders
-        self.assertEqual(block_indication_book.event_reputational_scores['B00'], [block_indication_book.initial_reputational_score for i in range(0,50)])
-        self.assertEqual(block_indication_book.event_reputational_scores['S00'], [block_indication_book.initial_reputational_score for i in range(0,50)])
+        self.assertEqual(list(block_indication_book.event_reputational_scores['B00']), [block_indication_book.initial_reputational_score for i in range(0,50)])
+        self.assertEqual(list(block_indication_book.event_reputational_scores['S00']), [block_indication_book.initial_reputational_score for i in range(0,50)])
 
     def test_add_block_indication_function_overwrite(self):
 
@@ -950,6 +1517,87 @@ class Test_Block_Indication_Book(unittest.TestCase):
         self.assertEqual(block_indication_book.matches[0]["buy_QBO"], None)
         self.assertEqual(block_indication_book.matches[0]["sell_QBO"], None)
 
+    # test that the single pass engine finds the same matches as the reference engine
+    def test_find_all_matching_block_indications_single_pass_function(self):
+
+        # use a fixed seed so that the test is deterministic
+        rng = dark_pool.random.Random(5)
+
+        for trial in range(0, 200):
+
+            # create a block indication book for each engine
+            reference = dark_pool.Block_Indication_Book()
+            single_pass = dark_pool.Block_Indication_Book(dark_pool.Orderbook_half_bisect)
+            single_pass.matching_engine = 'single_pass'
+
+            # add the same random block indications to both books
+            for i in range(0, rng.randint(1, 30)):
+                otype = rng.choice(['Buy', 'Sell'])
+                tid = '%s%02d' % (otype[0], i)
+                quantity = rng.randint(500, 1000)
+                limit_price = rng.choice([None, rng.randint(40, 60)])
+                MES = rng.choice([None, rng.randint(300, 900)])
+                time = float(rng.randint(0, 3))
+                reference.add_block_indication(dark_pool.Block_Indication(time, tid, otype, quantity, limit_price, MES), False)
+                single_pass.add_block_indication(dark_pool.Block_Indication(time, tid, otype, quantity, limit_price, MES), False)
+
+            # find all of the matches in both books
+            self.assertEqual(reference.find_all_matching_block_indications(50), None)
+            single_pass.find_all_matching_block_indications(50)
+
+            # test that the matches, the tapes and the block indications left in the book are the same
+            self.assertEqual(sorted(single_pass.matches.keys()), sorted(reference.matches.keys()))
+            for match_id in reference.matches.keys():
+                self.assertEqual(single_pass.matches[match_id]["buy_BI"].__str__(), reference.matches[match_id]["buy_BI"].__str__())
+                self.assertEqual(single_pass.matches[match_id]["sell_BI"].__str__(), reference.matches[match_id]["sell_BI"].__str__())
+            self.assertEqual([record["BI"].__str__() for record in single_pass.tape],
+                             [record["BI"].__str__() for record in reference.tape])
+            self.assertEqual([BI.__str__() for BI in single_pass.buy_side.orders], [BI.__str__() for BI in reference.buy_side.orders])
+            self.assertEqual([BI.__str__() for BI in single_pass.sell_side.orders], [BI.__str__() for BI in reference.sell_side.orders])
+
+        # test the number of pairs and index nodes examined. Neither sell block indication is big enough for the MES
+        # of B00, which is seen at the root of the index without examining any pairs, and then B01 matches S00 after
+        # looking at the root and one leaf, which is the only pair examined
+        block_indication_book = dark_pool.Block_Indication_Book()
+        block_indication_book.matching_engine = 'single_pass'
+        block_indication_book.add_block_indication(dark_pool.Block_Indication(100.0, 'B00', 'Buy', 1000, None, 800), False)
+        block_indication_book.add_block_indication(dark_pool.Block_Indication(100.0, 'B01', 'Buy', 900, None, None), False)
+        block_indication_book.add_block_indication(dark_pool.Block_Indication(100.0, 'S00', 'Sell', 700, None, None), False)
+        block_indication_book.add_block_indication(dark_pool.Block_Indication(100.0, 'S01', 'Sell', 600, None, None), False)
+        self.assertEqual(block_indication_book.find_all_matching_block_indications(50), 1)
+        self.assertEqual(block_indication_book.index_nodes_examined, 3)
+        self.assertEqual(block_indication_book.matches[0]["buy_BI"].trader_id, 'B01')
+        self.assertEqual(block_indication_book.matches[0]["sell_BI"].trader_id, 'S00')
+
+    def test_probe_block_indication_matches_function(self):
+
+        # create a block indication book with two pairs of block indications that match at a price of 50
+        block_indication_book = dark_pool.Block_Indication_Book()
+        block_indication_book.add_block_indication(dark_pool.Block_Indication(100.0, 'B00', 'Buy', 1000, None, 800), False)
+        block_indication_book.add_block_indication(dark_pool.Block_Indication(100.0, 'B01', 'Buy', 900, None, None), False)
+        block_indication_book.add_block_indication(dark_pool.Block_Indication(100.0, 'B02', 'Buy', 800, 45, None), False)
+        block_indication_book.add_block_indication(dark_pool.Block_Indication(100.0, 'S00', 'Sell', 850, None, None), False)
+        block_indication_book.add_block_indication(dark_pool.Block_Indication(100.0, 'S01', 'Sell', 600, None, None), False)
+
+        # probing gives the matches but leaves the book as it was
+        matches = block_indication_book.probe_block_indication_matches(50)
+        self.assertEqual([(match["buy_BI"].trader_id, match["sell_BI"].trader_id, match["quantity"]) for match in matches],
+                         [('B00', 'S00', 850), ('B01', 'S01', 600)])
+        self.assertEqual(len(block_indication_book.buy_side.orders), 3)
+        self.assertEqual(len(block_indication_book.sell_side.orders), 2)
+        self.assertEqual(block_indication_book.matches, {})
+
+        # the same matches are made by both engines
+        for matching_engine in ['reference', 'single_pass']:
+            book = dark_pool.Block_Indication_Book()
+            book.matching_engine = matching_engine
+            for BI in block_indication_book.buy_side.orders + block_indication_book.sell_side.orders:
+                book.add_block_indication(dark_pool.Block_Indication(BI.time, BI.trader_id, BI.otype, BI.quantity,
+                                                                     BI.limit_price, BI.MES), False)
+            book.find_all_matching_block_indications(50)
+            self.assertEqual([(book.matches[i]["buy_BI"].trader_id, book.matches[i]["sell_BI"].trader_id) for i in sorted(book.matches)],
+                             [('B00', 'S00'), ('B01', 'S01')])
+
     def test_get_block_indication_match_function(self):
         
         # create the block_indication_book
@@ -1033,7 +1681,7 @@ class Test_Block_Indication_Book(unittest.TestCase):
     def test_calculate_event_reputational_score_function(self):
         
         block_indication_book = dark_pool.Block_Indication_Book()
-        block_indication_book.event_reputational_scores['B00'] = []
+        block_indication_book.event_reputational_scores['B00'] = dark_pool.Event_Scores([])
 
         BI1 = dark_pool.Block_Indication(100.0, 'B00', 'Buy', 1024, 75, 500)
         QBO1 = dark_pool.Qualifying_Block_Order(100.0, 'B00', 'Buy', 900, 75, 500, 0)
@@ -1046,14 +1694,14 @@ class Test_Block_Indication_Book(unittest.TestCase):
 
         # test that the right value is calculated and the score is added to the list
         self.assertEqual(block_indication_book.calculate_event_reputational_score(BI1, QBO1), 90)
-        self.assertEqual(block_indication_book.event_reputational_scores['B00'], [90])
+        self.assertEqual(list(block_indication_book.event_reputational_scores['B00']), [90])
         self.assertEqual(block_indication_book.calculate_event_reputational_score(BI2, QBO2), 100)
-        self.assertEqual(block_indication_book.event_reputational_scores['B00'], [100,90])
+        self.assertEqual(list(block_indication_book.event_reputational_scores['B00']), [100,90])
         self.assertEqual(block_indication_book.calculate_event_reputational_score(BI3, QBO3), 98)
-        self.assertEqual(block_indication_book.event_reputational_scores['B00'], [98,100,90])
+        self.assertEqual(list(block_indication_book.event_reputational_scores['B00']), [98,100,90])
 
         # test that the list only contans the last 50 event reputational scores
-        block_indication_book.event_reputational_scores['B00'] = [block_indication_book.initial_reputational_score for i in range(0,50)]
+        block_indication_book.event_reputational_scores['B00'] = dark_pool.Event_Scores([block_indication_book.initial_reputational_score for i in range(0,50)])
         block_indication_book.calculate_event_reputational_score(BI1, QBO1)
         self.assertEqual(block_indication_book.event_reputational_scores['B00'][0], 90)
         self.assertEqual(len(block_indication_book.event_reputational_scores['B00']), 50)
@@ -1061,11 +1709,11 @@ class Test_Block_Indication_Book(unittest.TestCase):
     def test_calculate_composite_reputational_score_function(self):
         
         block_indication_book = dark_pool.Block_Indication_Book()
-        block_indication_book.event_reputational_scores['B00'] = [76 for i in range(0,50)]
+        block_indication_book.event_reputational_scores['B00'] = dark_pool.Event_Scores([76 for i in range(0,50)])
         self.assertEqual(block_indication_book.calculate_composite_reputational_score('B00'), 76)
-        block_indication_book.event_reputational_scores['B00'] = [100,85,0,50,100] + [70 for i in range(0,45)]
+        block_indication_book.event_reputational_scores['B00'] = dark_pool.Event_Scores([100,85,0,50,100] + [70 for i in range(0,45)])
         self.assertEqual(block_indication_book.calculate_composite_reputational_score('B00'), 69)
-        block_indication_book.event_reputational_scores['B00'] = [0,50,60,70,80,90,100] + [50 for i in range(0,43)]
+        block_indication_book.event_reputational_scores['B00'] = dark_pool.Event_Scores([0,50,60,70,80,90,100] + [50 for i in range(0,43)])
         self.assertEqual(block_indication_book.calculate_composite_reputational_score('B00'), 53)
 
 
@@ -1082,8 +1730,8 @@ class Test_Block_Indication_Book(unittest.TestCase):
         block_indication_book.matches[0]["sell_QBO"] = dark_pool.Qualifying_Block_Order(100.0, 'S00', 'Sell', 495, None, 500, 0)
 
         # create event reputational scores to traders
-        block_indication_book.event_reputational_scores['B00'] = [100 for i in range(0,50)]
-        block_indication_book.event_reputational_scores['S00'] = [100 for i in range(0,50)]
+        block_indication_book.event_reputational_scores['B00'] = dark_pool.Event_Scores([100 for i in range(0,50)])
+        block_indication_book.event_reputational_scores['S00'] = dark_pool.Event_Scores([100 for i in range(0,50)])
         block_indication_book.composite_reputational_scores_history['B00'] = [100 for i in range(0,50)]
         block_indication_book.composite_reputational_scores_history['S00'] = [100 for i in range(0,50)]
 
@@ -1091,8 +1739,8 @@ class Test_Block_Indication_Book(unittest.TestCase):
         block_indication_book.update_composite_reputational_scores(0,0)
 
         # perform the tests
-        self.assertEqual(block_indication_book.event_reputational_scores['B00'], [98] + [100 for i in range(0,49)])
-        self.assertEqual(block_indication_book.event_reputational_scores['S00'], [99] + [100 for i in range(0,49)])
+        self.assertEqual(list(block_indication_book.event_reputational_scores['B00']), [98] + [100 for i in range(0,49)])
+        self.assertEqual(list(block_indication_book.event_reputational_scores['S00']), [99] + [100 for i in range(0,49)])
         self.assertEqual(block_indication_book.composite_reputational_scores['B00'], 100)
         self.assertEqual(block_indication_book.composite_reputational_scores['S00'], 100)
 
@@ -1135,6 +1783,491 @@ class Test_Block_Indication_Book(unittest.TestCase):
     def test_tape_dump_function(self):
         return
 
+    def test_CRS_history_long_dump_function(self):
+
+        block_indication_book = dark_pool.Block_Indication_Book()
+        block_indication_book.composite_reputational_scores_history['S00'] = [(0, 80)]
+        block_indication_book.composite_reputational_scores_history['B00'] = [(0, 80), (12.5, 79.0), (20.25, 81.0)]
+
+        directory = tempfile.mkdtemp()
+        block_indication_book.CRS_history_long_dump(directory + '/CRS_history_long.csv', 'w', 'keep')
+        self.assertEqual(open(directory + '/CRS_history_long.csv').read(),
+                         'trader, time, score\nB00, 0.00, 80\nB00, 12.50, 79\nB00, 20.25, 81\nS00, 0.00, 80\n')
+        shutil.rmtree(directory)
+
+    def test_CRS_history_binary_dump_function(self):
+
+        block_indication_book = dark_pool.Block_Indication_Book()
+        block_indication_book.composite_reputational_scores_history['S00'] = [(0, 80)]
+        block_indication_book.composite_reputational_scores_history['B00'] = [(0, 80), (12.5, 79.0), (20.25, 81.0)]
+
+        # the history read back from the file is the same
+        directory = tempfile.mkdtemp()
+        block_indication_book.CRS_history_binary_dump(directory + '/CRS_history.bin', 'keep')
+        self.assertEqual(dark_pool.read_CRS_history_binary(directory + '/CRS_history.bin'),
+                         block_indication_book.composite_reputational_scores_history)
+
+        # once the history is streamed it is no longer all in memory, so the wide and binary dumps can't be written,
+        # whether the stream is still going or has finished. The long format dump is read back from the spill files
+        # while the stream is still going
+        block_indication_book.start_CRS_history_stream(directory + '/CRS_stream.csv', 'w', 1)
+        block_indication_book.add_to_CRS_history('B00', 30.0, 82)
+        for i in range(0, 2):
+            self.assertRaises(ValueError, block_indication_book.CRS_history_dump, directory + '/CRS.csv', 'w', 'keep')
+            self.assertRaises(ValueError, block_indication_book.CRS_history_binary_dump, directory + '/CRS.bin', 'keep')
+            if i == 0:
+                block_indication_book.CRS_history_long_dump(directory + '/CRS_long.csv', 'w', 'keep')
+                self.assertEqual(open(directory + '/CRS_long.csv').read(), 'trader, time, score\n'
+                                 'B00, 0.00, 80\nB00, 12.50, 79\nB00, 20.25, 81\nB00, 30.00, 82\nS00, 0.00, 80\n')
+                block_indication_book.end_CRS_history_stream()
+            else:
+                self.assertRaises(ValueError, block_indication_book.CRS_history_long_dump,
+                                  directory + '/CRS_long.csv', 'w', 'keep')
+        shutil.rmtree(directory)
+
+    # test that streaming the history with a long format file gives the same file as CRS_history_long_dump
+    def test_CRS_history_long_stream(self):
+
+        directory = tempfile.mkdtemp()
+        rng = dark_pool.random.Random(5)
+        streamed = dark_pool.Block_Indication_Book()
+        streamed.start_CRS_history_stream(directory + '/CRS_stream.csv', 'w', 7, directory + '/CRS_stream_long.csv')
+        in_memory = dark_pool.Block_Indication_Book()
+        for book in [streamed, in_memory]:
+            for trader in ['B00', 'B01', 'S00']:
+                book.composite_reputational_scores_history[trader] = []
+        for i in range(0, 100):
+            (trader, score) = (rng.choice(['B00', 'B01', 'S00']), rng.randint(0, 100))
+            streamed.add_to_CRS_history(trader, float(i), score)
+            in_memory.add_to_CRS_history(trader, float(i), score)
+        streamed.end_CRS_history_stream()
+        in_memory.CRS_history_long_dump(directory + '/CRS_long.csv', 'w', 'keep')
+        self.assertEqual(open(directory + '/CRS_stream_long.csv').read(), open(directory + '/CRS_long.csv').read())
+        shutil.rmtree(directory)
+
+###############################################################################
+# tests for the Uncross_Scheduler class
+
+class Test_Uncross_Scheduler(unittest.TestCase):
+
+    def test_due_function(self):
+
+        # the continuous mode uncrosses after every submission
+        scheduler = dark_pool.Uncross_Scheduler()
+        scheduler.start(0.0)
+        self.assertEqual(scheduler.due(0.5), False)
+        scheduler.submission()
+        self.assertEqual(scheduler.due(0.5), True)
+        scheduler.uncrossed(0.5)
+        self.assertEqual(scheduler.due(1.0), False)
+
+        # the periodic mode uncrosses every interval, whether or not there were submissions
+        scheduler = dark_pool.Uncross_Scheduler('periodic', interval=2.0)
+        scheduler.start(0.0)
+        scheduler.submission()
+        self.assertEqual(scheduler.due(1.9), False)
+        self.assertEqual(scheduler.due(2.0), True)
+        scheduler.uncrossed(2.1)
+        self.assertEqual(scheduler.next_uncross, 4.1)
+
+        # the random mode draws each interval from the range
+        scheduler = dark_pool.Uncross_Scheduler('random', interval_range=(1.0, 3.0), seed=1)
+        scheduler.start(10.0)
+        for i in range(0, 20):
+            self.assertTrue(11.0 <= scheduler.next_uncross <= 13.0)
+            scheduler.uncrossed(10.0)
+        self.assertEqual(scheduler.n_uncrosses, 20)
+
+        # the count mode uncrosses after the given number of submissions
+        scheduler = dark_pool.Uncross_Scheduler('count', submissions=3)
+        scheduler.start(0.0)
+        for i in range(0, 2):
+            scheduler.submission()
+            self.assertEqual(scheduler.due(0.0), False)
+        scheduler.submission()
+        self.assertEqual(scheduler.due(0.0), True)
+
+        self.assertRaises(ValueError, dark_pool.Uncross_Scheduler, 'hourly')
+
+    # test that the random mode gives the same uncross times for the same seed, whether the seed is given to the
+    # scheduler or to the random module
+    def test_random_mode_seed(self):
+
+        # the uncross times of a random schedule
+        def uncross_times(scheduler):
+            times = []
+            scheduler.start(0.0)
+            for i in range(0, 10):
+                times.append(scheduler.next_uncross)
+                scheduler.uncrossed(scheduler.next_uncross)
+            return times
+
+        self.assertEqual(uncross_times(dark_pool.Uncross_Scheduler('random', seed=3)),
+                         uncross_times(dark_pool.Uncross_Scheduler('random', seed=3)))
+        runs = []
+        for i in range(0, 2):
+            dark_pool.random.seed(3)
+            runs.append(uncross_times(dark_pool.Uncross_Scheduler('random')))
+        self.assertEqual(runs[0], runs[1])
+        dark_pool.random.seed(4)
+        self.assertNotEqual(uncross_times(dark_pool.Uncross_Scheduler('random')), runs[0])
+
+        # the other modes leave the random module alone
+        dark_pool.random.seed(3)
+        dark_pool.Uncross_Scheduler('periodic')
+        state = dark_pool.random.getstate()
+        dark_pool.random.seed(3)
+        self.assertEqual(dark_pool.random.getstate(), state)
+
+###############################################################################
+# tests for the Pending_Orders class
+
+class Test_Pending_Orders(unittest.TestCase):
+
+    def test_pop_due_function(self):
+
+        # orders which fall due together are issued in the order they were added, not in order of time
+        orders = []
+        orders.append(dark_pool.Customer_Order(3.0, 'B00', 'Buy', 50, 10))
+        orders.append(dark_pool.Customer_Order(1.0, 'B01', 'Buy', 50, 10))
+        orders.append(dark_pool.Customer_Order(5.0, 'S00', 'Sell', 50, 10))
+        orders.append(dark_pool.Customer_Order(2.0, 'S01', 'Sell', 50, 10))
+        pending = dark_pool.Pending_Orders(orders)
+        self.assertEqual(pending.pop_due(1.0), [])
+        self.assertEqual(pending.pop_due(3.5), [orders[0], orders[1], orders[3]])
+        self.assertEqual(len(pending), 1)
+        self.assertEqual(list(pending), [orders[2]])
+
+    def test_customer_orders_function(self):
+
+        # issue a schedule of customer orders to traders, the same way as the list of pending orders used to
+        traders = {}
+        for tid in ['B00', 'B01', 'S00', 'S01']:
+            traders[tid] = dark_pool.Trader_BDS_Giveaway('GVWY', tid, 0.00, 0)
+        traders['B01'].n_quotes = 1
+        pending = dark_pool.Pending_Orders()
+        pending.push(dark_pool.Customer_Order(3.0, 'B01', 'Buy', 50, 10))
+        pending.push(dark_pool.Customer_Order(1.0, 'S00', 'Sell', 50, 10))
+        pending.push(dark_pool.Customer_Order(6.0, 'B00', 'Buy', 50, 10))
+        [pending, cancellations] = dark_pool.customer_orders(4.0, -1.0, traders, {'n_buyers': 2, 'n_sellers': 2}, None,
+                                                               pending, False)
+        self.assertEqual(cancellations, ['B01'])
+        self.assertEqual(traders['S00'].customer_order.time, 1.0)
+        self.assertEqual([order.trader_id for order in pending], ['B00'])
+
+###############################################################################
+# tests for the schedule generator
+
+@unittest.skipIf(schedule_generator == None, "NumPy is not installed")
+class Test_Schedule_Generator(unittest.TestCase):
+
+    def order_schedule(self, stepmode, timemode):
+        supply_schedule = [{'from': 0.0, 'to': 600.0, 'price_ranges': [(25, 45)], 'stepmode': stepmode}]
+        demand_schedule = [{'from': 0.0, 'to': 600.0, 'price_ranges': [(55, 75)], 'stepmode': stepmode}]
+        return {'sup': supply_schedule, 'dem': demand_schedule, 'interval': 30, 'timemode': timemode,
+                'quantity_range': [1, 1000]}
+
+    def test_generate_schedule_function(self):
+
+        # without shuffling, the fixed modes give the same prices and times as customer_orders
+        rng = schedule_generator.numpy.random.RandomState(1)
+        batch = schedule_generator.generate_schedule(10.0, 20, 20, self.order_schedule('fixed', 'drip-fixed'), rng,
+                                                     shuffle=False)
+        self.assertEqual(batch.dtype, schedule_generator.SCHEDULE_DTYPE)
+        self.assertEqual(len(batch), 40)
+        self.assertEqual(list(batch['price'][:20]), [55 + int(i * 20.0 / 19) for i in range(0, 20)])
+        self.assertEqual(list(batch['price'][20:]), [25 + int(i * 20.0 / 19) for i in range(0, 20)])
+        for i in range(0, 20):
+            self.assertAlmostEqual(batch['time'][i], 10.0 + i * 30.0 / 19)
+        self.assertTrue(((batch['quantity'] >= 1) & (batch['quantity'] <= 1000)).all())
+
+        # every mode gives times within the interval and prices within the ranges, and the same seed gives the same
+        # batch
+        for stepmode in ['fixed', 'jittered', 'random']:
+            for timemode in ['periodic', 'drip-fixed', 'drip-jitter', 'drip-poisson']:
+                os = self.order_schedule(stepmode, timemode)
+                batch = schedule_generator.generate_schedule(0.0, 20, 20, os, schedule_generator.numpy.random.RandomState(2))
+                again = schedule_generator.generate_schedule(0.0, 20, 20, os, schedule_generator.numpy.random.RandomState(2))
+                self.assertEqual(batch.tobytes(), again.tobytes())
+                self.assertTrue(((batch['time'] >= 0.0) & (batch['time'] <= 30.0 + 1e-9)).all())
+                self.assertTrue(((batch['price'][:20] >= 54) & (batch['price'][:20] <= 76)).all())
+                self.assertTrue(((batch['price'][20:] >= 24) & (batch['price'][20:] <= 46)).all())
+                self.assertEqual(sorted(batch['trader'][:20]), list(range(0, 20)))
+
+        # the batch can be turned into customer orders
+        orders = schedule_generator.schedule_customer_orders(batch[[0, 20]])
+        self.assertEqual([(order.trader_id, order.otype) for order in orders], [('B%02d' % batch['trader'][0], 'Buy'),
+                                                                              ('S%02d' % batch['trader'][20], 'Sell')])
+        self.assertEqual(orders[1].price, batch['price'][20])
+
+    def test_customer_orders_function(self):
+
+        # with the numpy generator a whole cycle of customer orders is made at once, and the same seed gives the same
+        # orders
+        os = self.order_schedule('jittered', 'drip-poisson')
+        os['generator'] = 'numpy'
+        trader_stats = {'n_buyers': 5, 'n_sellers': 4}
+        cycles = []
+        for i in range(0, 2):
+            dark_pool.random.seed(6)
+            [pending, kills] = dark_pool.customer_orders(10.0, -1.0, {}, trader_stats, os, [], False)
+            cycles.append([order.__str__() for order in pending])
+            self.assertEqual(kills, [])
+        self.assertEqual(cycles[0], cycles[1])
+        self.assertEqual([order.trader_id for order in pending], ['B%02d' % i for i in range(0, 5)] +
+                                                                 ['S%02d' % i for i in range(0, 4)])
+        self.assertTrue(all([10.0 <= order.time <= 40.0 + 1e-9 for order in pending]))
+
+        # the orders are issued from the schedule as they fall due
+        traders = {}
+        dark_pool.populate_market({'sellers': [('GVWY', 4)], 'buyers': [('GVWY', 5)], 'BI_threshold': 800}, traders,
+                                  False, False)
+        due = len([order for order in pending if order.time < 25.0])
+        issued = []
+        [pending, kills] = dark_pool.customer_orders(25.0, -1.0, traders, trader_stats, os, pending, False, issued)
+        self.assertEqual(len(issued), due)
+        self.assertEqual(len(pending), 9 - due)
+
+        # a session can be run with it
+        directory = run_quiet_session(90.0, small_trader_spec, os, kernel='event')
+        self.assertTrue(len(open(directory + '/transactions.csv').read().splitlines()) > 1)
+        shutil.rmtree(directory)
+
+###############################################################################
+# tests for the Active_Traders class
+
+class Test_Active_Traders(unittest.TestCase):
+
+    def test_add_and_remove_functions(self):
+
+        active = dark_pool.Active_Traders()
+        for tid in ['B00', 'B01', 'S00', 'B01']:
+            active.add(tid)
+        self.assertEqual(len(active), 3)
+
+        # removing a trader moves the last one into its place
+        active.remove('B00')
+        self.assertEqual(active.trader_ids, ['S00', 'B01'])
+        self.assertEqual(active.positions, {'S00': 0, 'B01': 1})
+        self.assertFalse('B00' in active)
+
+        # only traders in the set are chosen
+        rng = dark_pool.random.Random(1)
+        self.assertEqual(set([active.choose(rng) for i in range(0, 50)]), set(['S00', 'B01']))
+
+###############################################################################
+# tests for the Event_Queue class
+
+class Test_Event_Queue(unittest.TestCase):
+
+    def test_pop_function(self):
+
+        # events come off in order of time, then kind, then the order they were added
+        events = dark_pool.Event_Queue()
+        events.push(2.0, dark_pool.Event_Queue.WAKE, 'B00')
+        events.push(1.0, dark_pool.Event_Queue.UNCROSS)
+        events.push(1.0, dark_pool.Event_Queue.WAKE, 'S00')
+        events.push(1.0, dark_pool.Event_Queue.WAKE, 'S01')
+        events.push(1.0, dark_pool.Event_Queue.ARRIVAL, 'B01')
+        self.assertEqual(len(events), 5)
+        self.assertEqual(events.next_time(), 1.0)
+        self.assertEqual(events.pop(), [1.0, dark_pool.Event_Queue.ARRIVAL, 'B01'])
+        self.assertEqual(events.pop(), [1.0, dark_pool.Event_Queue.WAKE, 'S00'])
+        self.assertEqual(events.pop(), [1.0, dark_pool.Event_Queue.WAKE, 'S01'])
+        self.assertEqual(events.pop(), [1.0, dark_pool.Event_Queue.UNCROSS, None])
+        self.assertEqual(events.pop(), [2.0, dark_pool.Event_Queue.WAKE, 'B00'])
+        self.assertEqual(events.next_time(), None)
+
+###############################################################################
+# tests for the session kernels
+
+class Test_Kernels(unittest.TestCase):
+
+    # a market of 4 buyers and 4 sellers whose customer orders are replenished every 10 seconds
+    order_schedule = drip_order_schedule(200.0)
+    trader_spec = small_trader_spec
+
+    # run a market session with the given kernel and seed, without printing it, and return the times of the trades
+    # on the tape
+    def session_trade_times(self, kernel, seed, endtime):
+        dark_pool.random.seed(seed)
+        directory = run_quiet_session(endtime, self.trader_spec, self.order_schedule, kernel=kernel)
+        times = [float(line.split(',')[0]) for line in open(directory + '/transactions.csv').read().splitlines()[1:]]
+        shutil.rmtree(directory)
+        return times
+
+    def test_event_kernel(self):
+
+        # a session run by the event kernel makes trades, in order of time, and stops before the end time
+        times = self.session_trade_times('event', 3, 60.0)
+        self.assertTrue(len(times) > 0)
+        self.assertEqual(times, sorted(times))
+        self.assertTrue(times[-1] < 60.0)
+
+        # run the kernel on its own to look at the tape. Customer orders replacing ones still being worked cancel the
+        # traders' quotes, and a new batch of customer orders is made every 10 seconds, so there are trades in every
+        # batch
+        dark_pool.random.seed(3)
+        exchange = dark_pool.Exchange(dark_pool.Orderbook_half_bisect)
+        traders = {}
+        trader_stats = dark_pool.populate_market(self.trader_spec, traders, True, False)
+        uncross_scheduler = dark_pool.Uncross_Scheduler()
+        uncross_scheduler.start(0.0)
+        self.assertEqual(dark_pool.run_events('test', 0.0, 60.0, exchange, traders, trader_stats, self.order_schedule,
+                                              uncross_scheduler, 1.0, False, False, False, False), 60.0)
+        records = exchange.order_book.tape.records()
+        self.assertTrue(len([record for record in records if record['type'] == 'Cancel']) > 0)
+        times = [record['time'] for record in records]
+        self.assertEqual(times, sorted(times))
+        self.assertTrue(times[-1] < 60.0)
+        trade_times = [record['time'] for record in records if record['type'] == 'Trade']
+        self.assertEqual(sorted(set([int(time // 10) for time in trade_times])), range(0, 6))
+
+    def test_step_functions(self):
+
+        # the first timestep at or after a time, and strictly after it, with times that don't divide exactly
+        rng = dark_pool.random.Random(8)
+        for i in range(0, 1000):
+            starttime = rng.choice([0.0, rng.uniform(0, 100)])
+            timestep = 1.0 / rng.randint(1, 50)
+            t = rng.choice([starttime + rng.randint(0, 500) * timestep, rng.uniform(starttime - 1, starttime + 50)])
+            step = dark_pool.step_at(t, starttime, timestep)
+            self.assertTrue(starttime + step * timestep >= t)
+            self.assertTrue(step == 0 or starttime + (step - 1) * timestep < t)
+            step = dark_pool.step_after(t, starttime, timestep)
+            self.assertTrue(starttime + step * timestep > t)
+            self.assertTrue(step == 0 or starttime + (step - 1) * timestep <= t)
+        self.assertEqual(dark_pool.step_at(1.0, 0.0, 1.0 / 3), 3)
+        self.assertEqual(dark_pool.step_after(1.0, 0.0, 1.0 / 3), 4)
+
+        # with no active traders there is no pick, with every trader active the pick is this timestep, and otherwise
+        # the number of timesteps to the pick averages (1 - p) / p for a pick probability of p
+        self.assertEqual(dark_pool.steps_to_pick(0, 8), None)
+        self.assertEqual(dark_pool.steps_to_pick(8, 8), 0)
+        dark_pool.random.seed(8)
+        picks = [dark_pool.steps_to_pick(2, 8) for i in range(0, 4000)]
+        self.assertTrue(min(picks) == 0)
+        self.assertAlmostEqual(sum(picks) / 4000.0, 3.0, delta=0.2)
+
+    def test_active_kernel(self):
+
+        # over the same seeds the active kernel makes about as many trades, and trades about as much, as the timestep
+        # kernel. The two kernels use the random numbers differently, so the sessions are not the same, and enough seeds
+        # are used for the totals to be close
+        totals = {}
+        for kernel in ['timestep', 'active']:
+            n_trades = 0
+            for seed in range(0, 16):
+                times = self.session_trade_times(kernel, seed, 200.0)
+                self.assertEqual(times, sorted(times))
+                self.assertTrue(times[-1] < 200.0)
+                n_trades += len(times)
+            totals[kernel] = n_trades
+        self.assertTrue(totals['timestep'] > 0)
+        self.assertAlmostEqual(totals['active'] / float(totals['timestep']), 1.0, delta=0.02)
+
+###############################################################################
+# tests for the trial runner
+
+class Test_Trial_Runner(unittest.TestCase):
+
+    def test_run_trials_function(self):
+
+        # run the same trials in this process and across a pool of processes, without printing the sessions
+        directory = tempfile.mkdtemp()
+        serial = quietly(dark_pool.run_trials, 3, 0.0, 30.0, small_trader_spec, drip_order_schedule(30.0),
+                         directory + '/serial', seed=4, processes=1)
+        parallel = quietly(dark_pool.run_trials, 3, 0.0, 30.0, small_trader_spec, drip_order_schedule(30.0),
+                           directory + '/parallel', seed=4, processes=2)
+
+        # each trial has its own directory and output files, which don't depend on how the trials were run
+        self.assertEqual(serial, [directory + '/serial/trial%04d' % trial for trial in range(1, 4)])
+        for trial in range(0, 3):
+            for fname in ['transactions.csv', 'CRS_history.csv', 'ERS.csv', 'avg_balance_dark.csv']:
+                self.assertEqual(open(serial[trial] + '/' + fname).read(), open(parallel[trial] + '/' + fname).read())
+
+        # the trials have different seeds, and the merged summary has a row for each trial in order
+        self.assertEqual(len(set(dark_pool.trial_seeds(4, 3))), 3)
+        summary = open(directory + '/parallel/avg_balance_dark.csv').read().splitlines()
+        self.assertEqual([line.split(',')[0] for line in summary[1::2]], ['trial0001', 'trial0002', 'trial0003'])
+        shutil.rmtree(directory)
+
+###############################################################################
+# tests for parameter sweeps
+
+# a dynamic offset for a price range
+def price_offset(t):
+    return int(10 * dark_pool.math.sin(t / 60.0))
+
+# the hash of a sweep cell whose order schedule has a dynamic offset
+def offset_config_hash():
+    order_schedule = drip_order_schedule(60.0)
+    order_schedule['sup'][0]['price_ranges'] = [(25, 45, price_offset)]
+    return sweep.config_hash({'RST': 55}, 0.0, 60.0, small_trader_spec, order_schedule, 2)
+
+class Test_Sweep(unittest.TestCase):
+
+    def test_config_hash_function(self):
+
+        # a schedule with an offset function hashes the same in another process, so its cells are found again when
+        # the sweep is run again
+        code = 'import sys; sys.path.insert(0, %r); import test_dark_pool; print(test_dark_pool.offset_config_hash())'
+        unit_directory = dark_pool.os.path.dirname(dark_pool.os.path.abspath(__file__))
+        output = subprocess.check_output([dark_pool.sys.executable, '-c', code % unit_directory],
+                                         cwd=dark_pool.os.path.dirname(dark_pool.os.path.abspath(sweep.__file__)))
+        self.assertEqual(output.strip(), offset_config_hash())
+
+        # a lambda has no stable name, so it can't be hashed
+        order_schedule = {'sup': [{'from': 0.0, 'to': 60.0, 'price_ranges': [(25, 45, lambda t: 0)]}]}
+        self.assertRaises(ValueError, sweep.config_hash, {}, 0.0, 60.0, {}, order_schedule, 0)
+
+    def test_designs(self):
+
+        # a grid has every combination, with the last parameter name changing fastest
+        self.assertEqual(sweep.grid_design({'RST': [50, 60], 'MIV': [500, 800]}),
+                         [{'MIV': 500, 'RST': 50}, {'MIV': 500, 'RST': 60}, {'MIV': 800, 'RST': 50},
+                          {'MIV': 800, 'RST': 60}])
+
+        # a random design draws whole numbers from integer ranges and chooses from lists
+        design = sweep.random_design({'MIV': (500, 900), 'QBO_fraction': (0.25, 1.0), 'RST': [50, 60]}, 20, seed=3)
+        self.assertEqual(design, sweep.random_design({'MIV': (500, 900), 'QBO_fraction': (0.25, 1.0), 'RST': [50, 60]},
+                                                     20, seed=3))
+        for cell in design:
+            self.assertTrue(isinstance(cell['MIV'], int) and 500 <= cell['MIV'] <= 900)
+            self.assertTrue(0.25 <= cell['QBO_fraction'] <= 1.0)
+            self.assertTrue(cell['RST'] in [50, 60])
+
+        self.assertRaises(ValueError, sweep.cell_settings, {'MES': 100}, {'BI_threshold': 800})
+
+    def test_run_sweep_function(self):
+
+        order_schedule = drip_order_schedule(60.0)
+        design = sweep.grid_design({'QBO_fraction': [0.5, 1.0], 'RST': [55]})
+
+        # run the sweep without printing the sessions. The second time the results are read back rather than run
+        # again, except for the cell whose results were removed as if the sweep had been interrupted
+        directory = tempfile.mkdtemp()
+        results = quietly(sweep.run_sweep, design, 0.0, 60.0, small_trader_spec, order_schedule, directory, seed=2,
+                          processes=1)
+        cell_dirs = [directory + '/' + result['hash'] for result in results]
+        dark_pool.os.remove(cell_dirs[1] + '/result.json')
+        dark_pool.os.remove(cell_dirs[0] + '/transactions.csv')
+        rerun = quietly(sweep.run_sweep, design, 0.0, 60.0, small_trader_spec, order_schedule, directory, seed=2,
+                        processes=1)
+
+        self.assertEqual(rerun, results)
+        self.assertFalse(dark_pool.os.path.exists(cell_dirs[0] + '/transactions.csv'))
+        self.assertTrue(dark_pool.os.path.exists(cell_dirs[1] + '/transactions.csv'))
+
+        # the cells have different configurations, and putting more of the OSR quantity into QBOs trades more
+        # through the block discovery service
+        self.assertNotEqual(results[0]['hash'], results[1]['hash'])
+        self.assertTrue(results[1]['BDS_volume'] > results[0]['BDS_volume'])
+        summary = open(directory + '/sweep.csv').read().splitlines()
+        self.assertEqual(summary[0], 'hash, QBO_fraction, RST, n_trades, volume, BDS_volume, avg_balance')
+        self.assertEqual(len(summary), 3)
+        shutil.rmtree(directory)
+
 ###############################################################################
 # tests for Exchange class
 
@@ -1146,7 +2279,7 @@ class Test_Exchange(unittest.TestCase):
         exchange = dark_pool.Exchange()
 
         # check the initialisation
-        self.assertEqual(exchange.order_book.tape, [])
+        self.assertEqual(exchange.order_book.tape.records(), [])
         self.assertEqual(exchange.order_book.order_id, 0)
         self.assertEqual(exchange.order_book.buy_side.traders, {})
         self.assertEqual(exchange.order_book.sell_side.traders, {})
@@ -1168,6 +2301,50 @@ class Test_Exchange(unittest.TestCase):
         self.assertEqual(len(exchange.order_book.buy_side.orders), 1)
         self.assertEqual(len(exchange.order_book.sell_side.orders), 1)
 
+    def test_get_location_function(self):
+
+        # create an exchange
+        exchange = dark_pool.Exchange()
+        exchange.block_indication_book.MIV = 300
+
+        # a block indication is found in the block indication book
+        block_indication = dark_pool.Block_Indication(65.0, 'B00', 'Buy', 350, None, None)
+        exchange.add_block_indication(block_indication, False)
+        self.assertEqual(exchange.get_location('B00'), (exchange.block_indication_book.buy_side, block_indication))
+
+        # an order from the same trader replaces it
+        order = dark_pool.Order(75.0, 'B00', 'Buy', 10, None, None)
+        exchange.add_order(order, False)
+        self.assertEqual(exchange.get_location('B00'), (exchange.order_book.buy_side, order))
+        self.assertFalse(exchange.block_indication_book.trader_has_block_indication('B00'))
+
+        # once the order has been filled the trader has no location
+        exchange.add_order(dark_pool.Order(85.0, 'S00', 'Sell', 10, None, None), False)
+        exchange.execute_trades(95.0, 50)
+        self.assertEqual(exchange.get_location('B00'), None)
+        self.assertEqual(exchange.get_location('S00'), None)
+        self.assertEqual(exchange.get_location('S01'), None)
+
+    def test_add_order_function_unchanged(self):
+
+        # create an exchange
+        exchange = dark_pool.Exchange()
+
+        # add an order and trade part of it
+        exchange.add_order(dark_pool.Order(25.0, 'B00', 'Buy', 10, 60, None), False)
+        exchange.add_order(dark_pool.Order(30.0, 'S00', 'Sell', 4, 40, None), False)
+        exchange.execute_trades(35.0, 50)
+
+        # resubmitting the rest of the order leaves the resting order as it is
+        self.assertEqual(exchange.add_order(dark_pool.Order(45.0, 'B00', 'Buy', 6, 60, None), False), [0, 'Unchanged'])
+        self.assertEqual(exchange.order_book.buy_side.orders[0].__str__(),
+                         "Order: [ID=0 T=25.00 B00 Buy Q=10 QR=6 P=60 MES=None]")
+
+        # an order with different terms replaces it
+        self.assertEqual(exchange.add_order(dark_pool.Order(55.0, 'B00', 'Buy', 6, 65, None), False), [2, 'Overwrite'])
+        self.assertEqual(exchange.order_book.buy_side.orders[0].__str__(),
+                         "Order: [ID=2 T=55.00 B00 Buy Q=6 QR=6 P=65 MES=None]")
+
     def test_add_order_function_overwrite_across_books(self):
 
         # create an exchange
@@ -1221,6 +2398,24 @@ class Test_Exchange(unittest.TestCase):
         self.assertEqual(len(exchange.block_indication_book.buy_side.orders), 1)
         self.assertEqual(len(exchange.block_indication_book.sell_side.orders), 1)
 
+    def test_add_block_indication_function_unchanged(self):
+
+        # create an exchange
+        exchange = dark_pool.Exchange()
+        exchange.block_indication_book.MIV = 300
+        exchange.add_block_indication(dark_pool.Block_Indication(65.0, 'B00', 'Buy', 350, 60, 100), False)
+
+        # resubmitting the same block indication leaves the resting one as it is
+        self.assertEqual(exchange.add_block_indication(dark_pool.Block_Indication(75.0, 'B00', 'Buy', 350, 60, 100), False),
+                         [0, 'Unchanged'])
+        self.assertEqual(exchange.block_indication_book.buy_side.orders[0].__str__(),
+                         "BI: [ID=0 T=65.00 B00 Buy Q=350 P=60 MES=100]")
+
+        # unless it would now be rejected
+        exchange.block_indication_book.composite_reputational_scores['B00'] = 10
+        self.assertEqual(exchange.add_block_indication(dark_pool.Block_Indication(85.0, 'B00', 'Buy', 350, 60, 100), False),
+                         [-1, 'Block Indication Rejected'])
+
     def test_add_block_indication_function_overwrite_across_books(self):
 
         # create an exchange
@@ -1301,6 +2496,197 @@ class Test_Exchange(unittest.TestCase):
         self.assertEqual(len(exchange.order_book.buy_side.orders), 1)
         self.assertEqual(len(exchange.order_book.sell_side.orders), 1)
 
+    # test that cancelling a trader whose last quote was a block indication takes it out of the block indication book
+    def test_del_order_function_block_indication(self):
+
+        # create an exchange
+        exchange = dark_pool.Exchange()
+        exchange.block_indication_book.MIV = 300
+
+        # the trader's order is replaced by a block indication, which is then cancelled
+        order = dark_pool.Order(25.0, 'B00', 'Buy', 5, None, 3)
+        BI = dark_pool.Block_Indication(35.0, 'B00', 'Buy', 350, None, None)
+        exchange.add_order(order, False)
+        exchange.add_block_indication(BI, False)
+        exchange.del_order(45.0, BI, False)
+
+        self.assertEqual(len(exchange.block_indication_book.buy_side.orders), 0)
+        self.assertEqual(len(exchange.order_book.buy_side.orders), 0)
+        self.assertEqual(exchange.get_location('B00'), None)
+        self.assertEqual(exchange.block_indication_book.tape, [{'type': 'Cancel', 'time': 45.0, 'BI': BI}])
+
+    # test that a new order on the other side of the order book replaces the trader's resting order, and that a
+    # rejected block indication leaves it where it is
+    def test_add_order_function_other_side(self):
+
+        # create an exchange
+        exchange = dark_pool.Exchange()
+        exchange.block_indication_book.MIV = 300
+
+        buy_order = dark_pool.Order(25.0, 'B00', 'Buy', 5, None, 3)
+        sell_order = dark_pool.Order(35.0, 'B00', 'Sell', 7, None, 3)
+        self.assertEqual(exchange.add_order(buy_order, False), [0, 'Addition'])
+        self.assertEqual(exchange.add_order(sell_order, False), [1, 'Overwrite'])
+        self.assertEqual(exchange.order_book.buy_side.orders, [])
+        self.assertEqual(exchange.order_book.sell_side.orders, [sell_order])
+
+        # the block indication is below the MIV
+        BI = dark_pool.Block_Indication(45.0, 'B00', 'Buy', 100, None, None)
+        self.assertEqual(exchange.add_block_indication(BI, False), [-1, 'Block Indication Rejected'])
+        self.assertEqual(exchange.order_book.sell_side.orders, [sell_order])
+        self.assertEqual(exchange.get_location('B00'), (exchange.order_book.sell_side, sell_order))
+
+
+    def test_match_block_indications_and_get_firm_orders_function(self):
+
+        # the exchange's deadline and the buyer's own deadline, which is used in place of the exchange's if it is set
+        for (QBO_deadline, buyer_QBO_deadline) in [(None, None), (1.0, None), (None, 1.0), (1.0, 5.0)]:
+
+            # create an exchange with two matching block indications. The buyer is slow to answer its OSR
+            exchange = dark_pool.Exchange()
+            exchange.QBO_deadline = QBO_deadline
+            traders = {}
+            traders['B00'] = dark_pool.Trader_BDS_Giveaway('GVWY', 'B00', 0.00, 0)
+            traders['S00'] = dark_pool.Trader_BDS_Giveaway('GVWY', 'S00', 0.00, 0)
+            traders['B00'].response_delay = 2.0
+            traders['B00'].QBO_deadline = buyer_QBO_deadline
+            missed = QBO_deadline == 1.0 and buyer_QBO_deadline == None or buyer_QBO_deadline == 1.0
+            exchange.add_block_indication(dark_pool.Block_Indication(10.0, 'B00', 'Buy', 1000, None, None), False)
+            exchange.add_block_indication(dark_pool.Block_Indication(10.0, 'S00', 'Sell', 1000, None, None), False)
+            [trades, resting] = exchange.match_block_indications_and_get_firm_orders(10.0, traders, 50)
+
+            # the match is settled during the uncross, so the scores are given at the time of the uncross
+            history = exchange.block_indication_book.composite_reputational_scores_history
+            self.assertEqual(history['B00'][-1][0], 10.0)
+            if not missed:
+                # the match waits for the buyer's QBO, and the firm orders made from both QBOs cross with each other.
+                # The trade is stamped with the time of the uncross, so that the tape stays in order of time
+                self.assertEqual(len(trades), 1)
+                self.assertEqual(trades[0]['time'], 10.0)
+                self.assertEqual(resting, False)
+                self.assertEqual(len(exchange.order_book.buy_side.orders), 0)
+                self.assertEqual(len(exchange.order_book.sell_side.orders), 0)
+            else:
+                # the buyer would miss the deadline, so is never sent the OSR. There are no firm orders and the buyer
+                # gets an event score of 0
+                self.assertEqual(traders['B00'].reputational_score, None)
+                self.assertNotEqual(traders['S00'].reputational_score, None)
+                self.assertEqual(exchange.block_indication_book.event_reputational_scores['B00'][0], 0)
+                self.assertNotEqual(exchange.block_indication_book.event_reputational_scores['S00'][0], 0)
+                self.assertEqual(len(exchange.order_book.buy_side.orders), 0)
+                self.assertEqual(len(exchange.order_book.sell_side.orders), 0)
+            self.assertEqual(exchange.block_indication_book.matches, {})
+
+        # with slow traders on both sides, trades in the order book at the next timestep still come after the
+        # matches on the tape
+        exchange = dark_pool.Exchange()
+        traders = {}
+        for i in range(0, 2):
+            traders['B%02d' % i] = dark_pool.Trader_BDS_Giveaway('GVWY', 'B%02d' % i, 0.00, 0)
+            traders['S%02d' % i] = dark_pool.Trader_BDS_Giveaway('GVWY', 'S%02d' % i, 0.00, 0)
+            traders['B%02d' % i].response_delay = 3.0 - i
+            exchange.add_block_indication(dark_pool.Block_Indication(10.0, 'B%02d' % i, 'Buy', 1000, None, None), False)
+            exchange.add_block_indication(dark_pool.Block_Indication(10.0, 'S%02d' % i, 'Sell', 1000, None, None), False)
+        exchange.match_block_indications_and_get_firm_orders(10.0, traders, 50)
+        exchange.add_order(dark_pool.Order(11.0, 'B02', 'Buy', 10, 60, None), False)
+        exchange.add_order(dark_pool.Order(11.0, 'S02', 'Sell', 10, 40, None), False)
+        exchange.execute_trades(11.0, 50)
+        times = [record['time'] for record in exchange.order_book.tape if record['type'] == 'Trade']
+        self.assertEqual(times, [10.0, 10.0, 11.0])
+
+    def test_cross_firm_orders_function(self):
+
+        # create an exchange with a resting order which would match the firm buy order
+        exchange = dark_pool.Exchange()
+        exchange.add_order(dark_pool.Order(5.0, 'S01', 'Sell', 600, None, None), False)
+
+        # cross a pair of firm orders of different sizes
+        buy_order = dark_pool.Order(20.0, 'B00', 'Buy', 900, None, 500)
+        sell_order = dark_pool.Order(20.0, 'S00', 'Sell', 700, None, 500)
+        buy_order.BDS = True
+        sell_order.BDS = True
+        exchange.add_order(buy_order, False)
+        exchange.add_order(sell_order, False)
+        trade = exchange.cross_firm_orders(20.0, buy_order, sell_order, 50)
+
+        # the firm orders trade with each other and not with the resting order, and the trade is recorded on the tape
+        # in the same way as by execute_trades
+        expected = {'type': 'Trade', 'time': 20.0, 'price': 50, 'quantity': 700, 'buyer': 'B00', 'seller': 'S00',
+                    'BDS': True}
+        self.assertEqual(trade, expected)
+        self.assertEqual(exchange.order_book.tape.records(), [expected])
+
+        # only the rest of the buy order is left in the order book
+        self.assertEqual(exchange.order_book.buy_side.orders, [buy_order])
+        self.assertEqual(buy_order.quantity_remaining, 200)
+        self.assertEqual(len(exchange.order_book.sell_side.orders), 1)
+
+        # firm orders which don't match each other are left in the order book
+        buy_order = dark_pool.Order(25.0, 'B02', 'Buy', 300, None, 400)
+        sell_order = dark_pool.Order(25.0, 'S02', 'Sell', 350, None, None)
+        exchange.add_order(buy_order, False)
+        exchange.add_order(sell_order, False)
+        self.assertEqual(exchange.cross_firm_orders(25.0, buy_order, sell_order, 50), None)
+        self.assertEqual(len(exchange.order_book.tape), 1)
+        self.assertEqual(len(exchange.order_book.sell_side.orders), 2)
+
+    def test_output_streams_function(self):
+
+        # write the output files both by streaming them and by dumping them at the end, and check they are the same
+        directory = tempfile.mkdtemp()
+        files = {}
+        for streamed in [True, False]:
+            exchange = dark_pool.Exchange()
+            exchange.block_indication_book.MIV = 300
+            if streamed:
+                exchange.start_output_streams(directory + '/tape_stream.csv', directory + '/CRS_stream.csv', 'w', 3)
+
+            # trades and cancellations on the order book
+            for i in range(0, 5):
+                exchange.add_order(dark_pool.Order(float(i), 'B%02d' % i, 'Buy', 10, 60, None), False)
+                exchange.add_order(dark_pool.Order(float(i), 'S%02d' % i, 'Sell', 4 + i, 40, None), False)
+                exchange.execute_trades(float(i), 50)
+            exchange.del_order(6.0, exchange.order_book.buy_side.orders[0], False)
+
+            # scores for traders with different numbers of scores
+            for i in range(0, 3):
+                exchange.add_block_indication(dark_pool.Block_Indication(7.0, 'T%02d' % i, 'Buy', 350, None, None), False)
+                for j in range(0, 2 * i):
+                    exchange.block_indication_book.add_to_CRS_history('T%02d' % i, 8.0 + j, 70 - j)
+
+            if streamed:
+                self.assertTrue(len(exchange.order_book.tape) < 3)
+                exchange.end_output_streams()
+                files['streamed'] = [directory + '/tape_stream.csv', directory + '/CRS_stream.csv']
+            else:
+                exchange.tape_dump(directory + '/tape_dump.csv', 'w', 'keep')
+                exchange.CRS_history_dump(directory + '/CRS_dump.csv', 'w', 'keep')
+                files['dumped'] = [directory + '/tape_dump.csv', directory + '/CRS_dump.csv']
+
+        for i in range(0, 2):
+            self.assertEqual(open(files['streamed'][i]).read(), open(files['dumped'][i]).read())
+        shutil.rmtree(directory)
+
+    def test_column_spill(self):
+
+        # put together more columns than can be open at once, so that they are merged in groups first. Columns with
+        # no values are left out
+        column_spill = dark_pool.Column_Spill(group_size=3)
+        for i in range(0, 10):
+            column_spill.append('T%02d' % i, ['%d-%d,' % (i, j) for j in range(0, i % 4)])
+        directory = tempfile.mkdtemp()
+        outfile = open(directory + '/columns.csv', 'w')
+        column_spill.write_columns(outfile, ',')
+        outfile.close()
+        column_spill.remove()
+
+        self.assertEqual(sorted(column_spill.counts.keys()), ['T01', 'T02', 'T03', 'T05', 'T06', 'T07', 'T09'])
+        self.assertEqual(open(directory + '/columns.csv').read().splitlines(),
+                         ['1-0,2-0,3-0,5-0,6-0,7-0,9-0,',
+                          ',2-1,3-1,,6-1,7-1,,',
+                          ',,3-2,,,7-2,,'])
+        shutil.rmtree(directory)
+
 ####################################################################################
 # tests for the Trader class
 
@@ -20,6 +20,9 @@ class Trader:
         self.quantity_remaining = 0    # the quantity that has currently been traded from the last quote
         self.BI_threshold = 1          # the quantity threshold which determines when a BI should be used
         self.reputational_score = None # the last notified reputational score of the trader.
+        self.response_delay = 0.0      # the simulated time the trader takes to answer an OSR with a QBO
+        self.QBO_deadline = None       # the time the exchange waits for this trader's QBO, None for the exchange's
+        self.QBO_fraction = 0.5        # the fraction of the OSR's quantity the trader puts in its QBO
 
 
     def __str__(self):
@@ -61,7 +64,9 @@ class Trader:
             profit = (transactionprice - self.customer_order.price) * trade['quantity']
         self.balance += profit
         self.n_trades += 1
-        self.profitpertime = self.balance/(trade['time'] - self.birthtime)
+        # a trade at the moment the trader was created has no time to spread the profit over
+        if trade['time'] > self.birthtime:
+            self.profitpertime = self.balance/(trade['time'] - self.birthtime)
 
         if verbose: print('%s profit=%d balance=%d profit/time=%d' % (outstr, profit, self.balance, self.profitpertime))
 
@@ -139,7 +144,7 @@ class Trader_BDS_Giveaway(Trader):
         # Update the traders reputationa score
         self.reputational_score = OSR.reputational_score
         
-        quantity = OSR.quantity * 0.5
+        quantity = OSR.quantity * self.QBO_fraction
         limit_price = OSR.limit_price
         MES = OSR.MES
 
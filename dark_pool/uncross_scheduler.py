@@ -0,0 +1,61 @@
+import random
+
+# Uncross_Scheduler decides when market_session uncrosses the exchange, that is when it matches the block indications
+# and executes the trades in the order book. Submissions between uncrosses are only added to the books, so the cost
+# of matching depends on the number of uncrosses rather than the number of submissions. The mode is one of:
+#     'continuous'  uncross after every submission, which is how the dark pool has always run
+#     'periodic'    uncross every interval seconds
+#     'random'      uncross after a random interval, drawn uniformly from interval_range each time
+#     'count'       uncross after every submissions submissions
+# The random intervals come from the scheduler's own random number generator, so that they don't change the random
+# numbers seen by the traders. With no seed, the 'random' mode seeds it with one number drawn from the random module
+# when the scheduler is created, so that a session seeded through the random module uncrosses at the same times each
+# time it is run. The other modes don't use it and draw nothing
+class Uncross_Scheduler:
+
+    def __init__(self, mode='continuous', interval=1.0, interval_range=(0.5, 1.5), submissions=1, seed=None):
+        if mode not in ['continuous', 'periodic', 'random', 'count']:
+            raise ValueError('unknown uncross mode %s' % mode)
+        self.mode = mode
+        self.interval = interval
+        self.interval_range = interval_range
+        self.submissions = submissions
+        if seed == None and mode == 'random':
+            seed = random.getrandbits(64)
+        self.rng = random.Random(seed)
+        # the number of submissions since the last uncross, the time of the next uncross and the number of uncrosses
+        self.pending = 0
+        self.next_uncross = None
+        self.n_uncrosses = 0
+
+    # start the schedule at the given time
+    def start(self, time):
+        self.pending = 0
+        self.n_uncrosses = 0
+        self.schedule(time)
+
+    # set the time of the next uncross, for the modes which uncross on a timetable
+    def schedule(self, time):
+        if self.mode == 'periodic':
+            self.next_uncross = time + self.interval
+        elif self.mode == 'random':
+            self.next_uncross = time + self.rng.uniform(self.interval_range[0], self.interval_range[1])
+
+    # record a submission to the exchange
+    def submission(self):
+        self.pending += 1
+
+    # check whether the exchange should be uncrossed at the given time
+    def due(self, time):
+        if self.mode == 'continuous':
+            return self.pending > 0
+        elif self.mode == 'count':
+            return self.pending >= self.submissions
+        else:
+            return time >= self.next_uncross
+
+    # record that the exchange has been uncrossed at the given time
+    def uncrossed(self, time):
+        self.pending = 0
+        self.n_uncrosses += 1
+        self.schedule(time)
@@ -0,0 +1,80 @@
+import numpy
+
+# Volume curves give the quantity that could trade at every candidate reference price at once, from the cumulative
+# demand and supply of a book. They are for looking at a book from outside a session, for example to chart where the
+# liquidity is, and nothing in a session calls them.
+#
+# The demand at a price is the quantity of the buy side that can trade at that price (no limit price, or a limit price
+# of at least the price), and the supply is the same for the sell side. The volume at a price is the smaller of the
+# two. When no order has an MES this is exactly the quantity execute_trades would trade at that price. An MES can
+# stop two orders from trading with each other, so otherwise the volume is an upper bound and Orderbook.probe_volume
+# gives the exact quantity at a single price.
+#
+# Block indications never trade themselves. They are matched in pairs, each pair only if both quantities meet the
+# other's MES, and only the QBOs sent afterwards become firm orders. So the curve for a block indication book is the
+# volume on offer: the smaller of the block quantity each side has on offer at a price, with no MES or pairing applied.
+# It is an upper bound on the block volume that could be matched at that price, not the volume that would trade.
+#
+# The defaults are the bse_sys_minprice and bse_sys_maxprice of dark_pool.py
+
+
+# the candidate prices, every whole price from minprice to maxprice
+def price_grid(minprice=1, maxprice=1000):
+    return numpy.arange(minprice, maxprice + 1)
+
+
+# the cumulative demand and supply at each of the prices, which must be sorted from lowest to highest.
+# quantity_attribute is the name of the quantity that can trade: 'quantity_remaining' for orders and 'quantity' for
+# block indications
+def demand_and_supply(buy_orders, sell_orders, prices, quantity_attribute):
+    n = len(prices)
+    demand = numpy.zeros(n + 1)
+    supply = numpy.zeros(n + 1)
+
+    for (orders, curve) in [(buy_orders, demand), (sell_orders, supply)]:
+        unlimited = sum([getattr(order, quantity_attribute) for order in orders if order.limit_price == None])
+        limited = [order for order in orders if order.limit_price != None]
+        limit_prices = numpy.array([order.limit_price for order in limited], dtype=float)
+        quantities = numpy.array([getattr(order, quantity_attribute) for order in limited], dtype=float)
+        if curve is demand:
+            # a buy order can trade at every price up to its limit price. Add its quantity at the highest of those
+            # prices and sum from the top down. Orders below every price go in the extra slot at the end, which is
+            # dropped
+            slots = numpy.searchsorted(prices, limit_prices, side='right') - 1
+            slots[slots < 0] = n
+            numpy.add.at(curve, slots, quantities)
+            curve[:n] = curve[:n][::-1].cumsum()[::-1]
+        else:
+            # a sell order can trade at every price from its limit price up. Add its quantity at the lowest of those
+            # prices and sum from the bottom up. Orders above every price land in the extra slot at the end
+            slots = numpy.searchsorted(prices, limit_prices, side='left')
+            numpy.add.at(curve, slots, quantities)
+            curve[:n] = curve[:n].cumsum()
+        curve[:n] += unlimited
+
+    return [demand[:n], supply[:n]]
+
+
+# the volume that could trade at each of the prices, given the buy and sell orders
+def volume_curve(buy_orders, sell_orders, prices, quantity_attribute):
+    [demand, supply] = demand_and_supply(buy_orders, sell_orders, prices, quantity_attribute)
+    return numpy.minimum(demand, supply)
+
+
+# the volume that could trade in an order book at each of the prices
+def order_book_volume_curve(order_book, prices):
+    return volume_curve(order_book.buy_side.orders, order_book.sell_side.orders, prices, 'quantity_remaining')
+
+
+# the block volume on offer in a block indication book at each of the prices
+def block_indication_volume_on_offer(block_indication_book, prices):
+    return volume_curve(block_indication_book.buy_side.orders, block_indication_book.sell_side.orders, prices,
+                        'quantity')
+
+
+# the volume curve of an exchange's order book and the block volume on offer in its block indication book over every
+# price from minprice to maxprice. Returns the prices and the two curves
+def exchange_volume_curves(exchange, minprice=1, maxprice=1000):
+    prices = price_grid(minprice, maxprice)
+    return [prices, order_book_volume_curve(exchange.order_book, prices),
+            block_indication_volume_on_offer(exchange.block_indication_book, prices)]